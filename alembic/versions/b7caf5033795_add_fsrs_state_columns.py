@@ -0,0 +1,102 @@
+"""Add FSRS state columns
+
+Revision ID: b7caf5033795
+Revises: cf5a6a0b7749
+Create Date: 2026-10-19 10:12:31.408113
+
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7caf5033795"
+down_revision: Union[str, None] = "cf5a6a0b7749"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# number of rows updated in one batch when copying data from JSON
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    op.add_column("fsrs", sa.Column("state", sa.Integer(), nullable=True))
+    op.add_column("fsrs", sa.Column("step", sa.Integer(), nullable=True))
+    op.add_column("fsrs", sa.Column("stability", sa.Float(), nullable=True))
+    op.add_column("fsrs", sa.Column("difficulty", sa.Float(), nullable=True))
+    op.add_column("fsrs", sa.Column("last_review", sa.DateTime(), nullable=True))
+    op.create_index("ix_fsrs_state", "fsrs", ["state"], unique=False)
+    op.create_index("ix_fsrs_stability", "fsrs", ["stability"], unique=False)
+    op.create_index("ix_fsrs_last_review", "fsrs", ["last_review"], unique=False)
+
+    # copy the existing data from the JSON to the new columns
+    fsrs_table = sa.table(
+        "fsrs",
+        sa.column("card_id", sa.String()),
+        sa.column("fsrs_data", sa.JSON()),
+        sa.column("state", sa.Integer()),
+        sa.column("step", sa.Integer()),
+        sa.column("stability", sa.Float()),
+        sa.column("difficulty", sa.Float()),
+        sa.column("last_review", sa.DateTime()),
+    )
+    update = (
+        sa.update(fsrs_table)
+        .where(fsrs_table.c.card_id == sa.bindparam("b_card_id"))
+        .values(
+            state=sa.bindparam("b_state"),
+            step=sa.bindparam("b_step"),
+            stability=sa.bindparam("b_stability"),
+            difficulty=sa.bindparam("b_difficulty"),
+            last_review=sa.bindparam("b_last_review", type_=sa.DateTime()),
+        )
+    )
+
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select(fsrs_table.c.card_id, fsrs_table.c.fsrs_data)
+    ).fetchall()
+    updates: list[dict] = []
+    for card_id, fsrs_data in rows:
+        if isinstance(fsrs_data, str):
+            fsrs_data = json.loads(fsrs_data)
+        last_review = fsrs_data.get("last_review")
+        updates.append(
+            {
+                "b_card_id": card_id,
+                "b_state": fsrs_data.get("state"),
+                "b_step": fsrs_data.get("step"),
+                "b_stability": fsrs_data.get("stability"),
+                "b_difficulty": fsrs_data.get("difficulty"),
+                # dates are stored in UTC without timezone
+                "b_last_review": (
+                    datetime.fromisoformat(last_review)
+                    .astimezone(timezone.utc)
+                    .replace(tzinfo=None)
+                    if last_review
+                    else None
+                ),
+            }
+        )
+        if len(updates) >= BATCH_SIZE:
+            connection.execute(update, updates)
+            updates = []
+    if updates:
+        connection.execute(update, updates)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_fsrs_last_review", table_name="fsrs")
+    op.drop_index("ix_fsrs_stability", table_name="fsrs")
+    op.drop_index("ix_fsrs_state", table_name="fsrs")
+    with op.batch_alter_table("fsrs", schema=None) as batch_op:
+        batch_op.drop_column("last_review")
+        batch_op.drop_column("difficulty")
+        batch_op.drop_column("stability")
+        batch_op.drop_column("step")
+        batch_op.drop_column("state")
@@ -0,0 +1,60 @@
+"""Add FSRS review log table
+
+Revision ID: d41e7a5c9f20
+Revises: b7caf5033795
+Create Date: 2026-10-19 11:02:47.215530
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d41e7a5c9f20"
+down_revision: Union[str, None] = "b7caf5033795"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "fsrs_review_log",
+        sa.Column("review_id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("card_id", sa.String(length=36), nullable=False),
+        sa.Column("rating", sa.Integer(), nullable=False),
+        sa.Column("review_datetime", sa.DateTime(), nullable=False),
+        sa.Column("review_duration", sa.Integer(), nullable=True),
+        sa.Column("prior_state", sa.Integer(), nullable=True),
+        sa.Column("prior_step", sa.Integer(), nullable=True),
+        sa.Column("prior_stability", sa.Float(), nullable=True),
+        sa.Column("prior_difficulty", sa.Float(), nullable=True),
+        sa.Column("prior_last_review", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["card_id"],
+            ["test_cards.card_id"],
+        ),
+        sa.PrimaryKeyConstraint("review_id"),
+    )
+    op.create_index(
+        "idx_review_log_card_datetime",
+        "fsrs_review_log",
+        ["card_id", "review_datetime"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_fsrs_review_log_review_datetime"),
+        "fsrs_review_log",
+        ["review_datetime"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_fsrs_review_log_review_datetime"), table_name="fsrs_review_log"
+    )
+    op.drop_index("idx_review_log_card_datetime", table_name="fsrs_review_log")
+    op.drop_table("fsrs_review_log")
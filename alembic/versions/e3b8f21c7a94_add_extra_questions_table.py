@@ -0,0 +1,36 @@
+"""Add extra questions table
+
+Revision ID: e3b8f21c7a94
+Revises: d41e7a5c9f20
+Create Date: 2026-10-19 14:21:05.512043
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e3b8f21c7a94"
+down_revision: Union[str, None] = "d41e7a5c9f20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "extra_questions",
+        sa.Column("card_id", sa.String(length=36), nullable=False),
+        sa.Column("questions", sa.JSON(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["card_id"],
+            ["test_cards.card_id"],
+        ),
+        sa.PrimaryKeyConstraint("card_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("extra_questions")
@@ -82,12 +82,11 @@ const TestFlashcards = () => {
         setTestStatus(status);
     };
 
-    const fetchNextCard = async () => {
+    const showNextCard = async (cardMessage: NextCardMessage) => {
         setShowCardInfo(false);
         setCheckResult(null);
         setShowAnswer(false);
         setCheckDetails(null);
-        const cardMessage: NextCardMessage = await api.getNextCard();
         if (cardMessage && cardMessage.test_card)
         {
             setCurrentCard(cardMessage.next_question);
@@ -98,6 +97,11 @@ const TestFlashcards = () => {
             await context.updateTestSessionStatus();
             navigate('/results');
         }
+    };
+
+    const fetchNextCard = async () => {
+        const cardMessage: NextCardMessage = await api.getNextCard();
+        await showNextCard(cardMessage);
         fetchTestStatus();
     };
 
@@ -206,10 +210,13 @@ const TestFlashcards = () => {
             return;
         }
 
+        // the answer is recorded and the next card received in one request,
+        // the backend records the result of the check shown to the user
         // if (result.answer_is_correct)
         // {
-        fetchTestStatus();
-        fetchNextCard();
+        const response = await api.answerAndNext(answers);
+        setTestStatus(response.status);
+        await showNextCard(response.next_card);
         // } else
         // {
         //     setTimeout(() => {
@@ -1,8 +1,70 @@
 import axios from 'axios';
-import { VocabEntry, KanjiEntry, RadicalEntry, QuestionEntry, TestAnswer, CardSource, NextCardMessage, TestStatusMessage, GeneratedImports, CardFilter, MultiCardEntry, StartTestRequest, TestResults, OnomatopoeiaCard, AnswerCheckResponse } from '../types/CardTypes';
+import { VocabEntry, KanjiEntry, RadicalEntry, QuestionEntry, TestAnswer, CardSource, NextCardMessage, TestStatusMessage, GeneratedImports, CardFilter, MultiCardEntry, StartTestRequest, TestResults, OnomatopoeiaCard, AnswerCheckResponse, AnswerNextResponse, SessionStartType, SessionBuildStatus } from '../types/CardTypes';
 
 const apiUrl = import.meta.env.VITE_APP_API_URL as string || "http://localhost:8000/api";
 
+// each device uses its own test session, the id is kept in local storage
+const getSessionId = (): string => {
+    let sessionId = localStorage.getItem("gakuSessionId");
+    if (sessionId === null) {
+        sessionId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+        localStorage.setItem("gakuSessionId", sessionId);
+    }
+    return sessionId;
+};
+axios.defaults.headers.common["X-Gaku-Session"] = getSessionId();
+
+// WebSocket channel for answering test questions,
+// REST is used while it is not connected
+let sessionChannel: WebSocket | null = null;
+let channelConnecting = false;
+let channelRequestId = 0;
+const channelRequests = new Map<number, (response: any) => void>();
+
+const openSessionChannel = () => {
+    const channelUrl = new URL(`${apiUrl}/test/ws`, window.location.href);
+    channelUrl.protocol = channelUrl.protocol === "https:" ? "wss:" : "ws:";
+    channelUrl.searchParams.set("session_id", getSessionId());
+    channelConnecting = true;
+    const channel = new WebSocket(channelUrl);
+    channel.onopen = () => {
+        sessionChannel = channel;
+        channelConnecting = false;
+    };
+    channel.onmessage = (event) => {
+        const response = JSON.parse(event.data);
+        const resolve = channelRequests.get(response.id);
+        channelRequests.delete(response.id);
+        resolve?.(response);
+    };
+    channel.onclose = () => {
+        sessionChannel = null;
+        channelConnecting = false;
+        // the requests could have been handled, so they are not repeated with REST
+        channelRequests.forEach((resolve, id) => resolve({ id, type: "error", detail: "Test session channel closed" }));
+        channelRequests.clear();
+    };
+};
+
+// sends request to the channel, resolves to null if the channel is not connected
+const sendChannelRequest = (request: object): Promise<any> => {
+    if (sessionChannel === null)
+    {
+        if (!channelConnecting)
+        {
+            openSessionChannel();
+        }
+        return Promise.resolve(null);
+    }
+    channelRequestId += 1;
+    const id = channelRequestId;
+    const channel = sessionChannel;
+    return new Promise((resolve) => {
+        channelRequests.set(id, resolve);
+        channel.send(JSON.stringify({ ...request, id }));
+    });
+};
+
 // card editor API methods
 const getCards = (): Promise<(VocabEntry | KanjiEntry | RadicalEntry | QuestionEntry | MultiCardEntry | OnomatopoeiaCard)[]> =>
     axios.get(`${apiUrl}/cards`).then((response) => response.data);
@@ -43,24 +105,47 @@ const deleteCardSourceLink = (card_id: string, source_id: string): Promise<{ sta
     axios.post(`${apiUrl}/cards/delete_source_link`, { card_id, source_id }).then((response) => response.data);
 
 // card testing API methods
-const startTestAll = (request: StartTestRequest) =>
-    axios.post(`${apiUrl}/test/start`, request).then((response) => response.data);
-const startTestNew = (request: StartTestRequest) =>
-    axios.post(`${apiUrl}/test/start_new`, request).then((response) => response.data);
+// test sessions are built in background, the progress is polled until the session is ready
+const buildTestSession = async (start_type: SessionStartType, start_request: StartTestRequest, time_since?: number): Promise<SessionBuildStatus> => {
+    let status: SessionBuildStatus = await axios.post(`${apiUrl}/test/build`, { start_type, start_request, time_since }).then((response) => response.data);
+    while (status.running)
+    {
+        await new Promise((resolve) => setTimeout(resolve, 300));
+        status = await axios.get(`${apiUrl}/test/build/${status.job_id}`).then((response) => response.data);
+    }
+    if (status.error !== null)
+    {
+        throw new Error(status.error);
+    }
+    return status;
+};
+const startTestAll = (request: StartTestRequest) => buildTestSession("ANY_STATE", request);
+const startTestNew = (request: StartTestRequest) => buildTestSession("NEW", request);
 const getNumNewCards = (request: CardFilter) => axios.post(`${apiUrl}/test/num_new`, request).then((response) => response.data);
-const startTestStudied = (request: StartTestRequest) =>
-    axios.post(`${apiUrl}/test/start_studied`, request).then((response) => response.data);
+const startTestStudied = (request: StartTestRequest) => buildTestSession("STUDIED", request);
 const getNumStudiedCards = (request: CardFilter): Promise<number> =>
     axios.post(`${apiUrl}/test/num_studied`, request).then((response) => response.data);
 const getNumAnyStateCards = (request: CardFilter) => axios.post(`${apiUrl}/test/num_any_state`, request).then((response) => response.data);
-const startTestDue = (request: StartTestRequest) =>
-    axios.post(`${apiUrl}/test/start_due`, request).then((response) => response.data);
+const startTestDue = (request: StartTestRequest) => buildTestSession("DUE", request);
 const getNumDueCards = (request: CardFilter) => axios.post(`${apiUrl}/test/num_due`, request).then((response) => response.data);
 const getNumRecentMistakesSince = (filter: CardFilter, time_since: number) => axios.post(`${apiUrl}/test/num_recent_mistakes_since`, { filter, time_since }).then((response) => response.data);
-const startTestRecentMistakes = (start_request: StartTestRequest, time_since: number) => axios.post(`${apiUrl}/test/start_recent_mistakes`, { start_request, time_since }).then((response) => response.data);
+const startTestRecentMistakes = (start_request: StartTestRequest, time_since: number) => buildTestSession("RECENT_MISTAKES", start_request, time_since);
 const getNextCard = (): Promise<NextCardMessage> => axios.get(`${apiUrl}/test/next`).then((response) => response.data);
 const checkAnswer = (answer: TestAnswer): Promise<AnswerCheckResponse> => axios.post(`${apiUrl}/test/check_answer`, { answer }).then((response) => response.data);
 const submitAnswer = (answer: TestAnswer): Promise<AnswerCheckResponse> => axios.post(`${apiUrl}/test/answer_question`, { answer }).then((response) => response.data);
+const answerAndNext = async (answer: TestAnswer): Promise<AnswerNextResponse> => {
+    const response = await sendChannelRequest({ type: "answer", answer });
+    if (response !== null)
+    {
+        if (response.type === "error")
+        {
+            throw new Error(response.detail);
+        }
+        return response;
+    }
+    // the channel is not connected, use REST
+    return axios.post(`${apiUrl}/test/answer_and_next`, { answer }).then((response) => response.data);
+};
 const getTestResults = (): Promise<TestResults> => axios.get(`${apiUrl}/test/results`).then((response) => response.data);
 const getTestStatus = (): Promise<TestStatusMessage> => axios.get(`${apiUrl}/test/status`).then((response) => response.data);
 const wrapUpTest = () => axios.get(`${apiUrl}/test/wrap_up`).then((response) => response.data);
@@ -99,6 +184,7 @@ export default {
     getNextCard,
     checkAnswer,
     submitAnswer,
+    answerAndNext,
     getTestResults,
     getTestStatus,
     getSources,
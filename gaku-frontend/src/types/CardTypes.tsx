@@ -219,6 +219,24 @@ interface AnswerCheckResponse {
     mistakes: { [key: string]: string[] }
 }
 
+interface AnswerNextResponse {
+    check_result: AnswerCheckResponse;
+    next_card: NextCardMessage;
+    status: TestStatusMessage;
+}
+
+type SessionStartType = "ANY_STATE" | "NEW" | "STUDIED" | "WEAKEST" | "DUE" | "RECENT_MISTAKES";
+
+interface SessionBuildStatus {
+    job_id: string;
+    session_id: string;
+    running: boolean;
+    stage: string;
+    num_cards: number;
+    num_questions: number;
+    error: string | null;
+}
+
 export type {
     VocabEntry,
     AnswerText,
@@ -244,6 +262,9 @@ export type {
     StartTestRequest,
     TestResults,
     AnswerCheckResponse,
+    AnswerNextResponse,
+    SessionStartType,
+    SessionBuildStatus,
 };
 
 export {
@@ -1,6 +1,7 @@
 """FastAPI service for testing japanese flashcards."""
 
 import argparse
+import asyncio
 import logging
 import os
 import sys
@@ -11,11 +12,22 @@ import urllib.request
 import webbrowser
 from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 from urllib.error import URLError
 
 import fastapi
-from fastapi import FastAPI, HTTPException, APIRouter
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    APIRouter,
+    Query,
+    Depends,
+    Header,
+    Cookie,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
@@ -28,8 +40,23 @@ from gaku.api_types import (
     StartTestRequest,
     CardFilter,
     AnswerCheckResponse,
+    AnswerNextResponse,
+    DueForecastRequest,
+    FSRSOptimizationStatus,
+    RescheduleRequest,
+    RescheduleReport,
+    SessionBuildRequest,
+    SessionBuildStatus,
+    WorkloadSimulationRequest,
+    WorkloadDay,
 )
 from gaku.gaku_manager import GakuManager
+from gaku.session_registry import DEFAULT_SESSION_ID
+from gaku.session_channel import (
+    ChannelRequestError,
+    decode_channel_message,
+    handle_channel_message,
+)
 from gaku.card_types import (
     CardSource,
     TestCardTypes,
@@ -76,8 +103,9 @@ async def startup_teardown(app: FastAPI) -> AsyncGenerator:
         The FastAPI app.
     """
     manager.load_test_session()
+    manager.session_registry.remove_old_sessions()
     yield
-    manager.save_test_session()
+    manager.save_test_sessions()
 
 
 app = FastAPI(lifespan=startup_teardown)
@@ -94,6 +122,23 @@ if os.getenv("API_DEV", "0") == "1":
     )
 
 
+def get_session_id(
+    x_gaku_session: Optional[str] = Header(default=None),
+    gaku_session: Optional[str] = Cookie(default=None),
+) -> str:
+    """Gets id of the client's test session.
+
+    The id is taken from the X-Gaku-Session header or the gaku_session cookie,
+    clients without it share the default session.
+    """
+    session_id = x_gaku_session or gaku_session or DEFAULT_SESSION_ID
+    try:
+        manager.session_registry.validate_session_id(session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return session_id
+
+
 class CardSourceLinkRequest(BaseModel):
     """Mapping for attaching source to card."""
 
@@ -144,6 +189,7 @@ async def add_card(card: dict) -> dict:
     logging.info(f"Creating card from: {card}")
     test_card = create_card_from_json(card)
     manager.db.add_card(test_card)
+    manager.update_extra_questions([test_card])
     logging.info(f"Added card: {test_card}")
     return {"status": "ok", "card_id": test_card.card_id}
 
@@ -164,6 +210,7 @@ async def edit_card(card: dict) -> dict:
     """
     updated_card = create_card_from_json(card)
     manager.db.update_card(updated_card)
+    manager.update_extra_questions([updated_card])
     logging.info(f"Updated card: {updated_card}")
     return {"status": "ok"}
 
@@ -273,29 +320,38 @@ async def delete_source(source: dict) -> dict:
 # - answer question
 # - finish test session
 # - get session status
+#
+# the handlers hold the threading lock of the session, so they are plain
+# functions run in the threadpool instead of blocking the event loop
 
 
 @api_router.post("/test/start")
-async def start_test(request: StartTestRequest) -> dict:
+def start_test(
+    request: StartTestRequest, session_id: str = Depends(get_session_id)
+) -> dict:
     """Start test session."""
     logging.info(f"Starting test session, params: {request}")
 
-    manager.start_test_session(request)
+    with manager.session_registry.lock(session_id):
+        manager.start_test_session(request, session_id)
     return {"status": "ok"}
 
 
 @api_router.post("/test/start_new")
-async def start_test_new(request: StartTestRequest) -> dict:
+def start_test_new(
+    request: StartTestRequest, session_id: str = Depends(get_session_id)
+) -> dict:
     """Start test session with new cards."""
     logging.info(f"Starting test session with new cards, params: {request}")
 
-    manager.start_test_session_new_cards(request)
+    with manager.session_registry.lock(session_id):
+        manager.start_test_session_new_cards(request, session_id)
     logging.info("Started test session with new cards")
     return {"status": "ok"}
 
 
 @api_router.post("/test/num_new")
-async def get_num_new(request: CardFilter) -> int:
+def get_num_new(request: CardFilter) -> int:
     """Get number of new cards.
 
     Parameters
@@ -314,16 +370,31 @@ async def get_num_new(request: CardFilter) -> int:
 
 
 @api_router.post("/test/start_studied")
-async def start_test_studied(request: StartTestRequest) -> dict:
+def start_test_studied(
+    request: StartTestRequest, session_id: str = Depends(get_session_id)
+) -> dict:
     """Starts test session with studied cards."""
     logging.info(f"Starting test session with studied cars, params: {request}")
 
-    manager.start_test_session(request)
+    with manager.session_registry.lock(session_id):
+        manager.start_test_session(request, session_id)
+    return {"status": "ok"}
+
+
+@api_router.post("/test/start_weakest")
+def start_test_weakest(
+    request: StartTestRequest, session_id: str = Depends(get_session_id)
+) -> dict:
+    """Starts test session with studied cards with lowest recall probability."""
+    logging.info(f"Starting test session with weakest cards, params: {request}")
+
+    with manager.session_registry.lock(session_id):
+        manager.start_test_session_weakest(request, session_id)
     return {"status": "ok"}
 
 
 @api_router.post("/test/num_studied")
-async def get_num_studied(request: CardFilter) -> int:
+def get_num_studied(request: CardFilter) -> int:
     """Gets a number matching studied cards."""
 
     num_studied = manager.db.get_num_studied_cards(request)
@@ -332,7 +403,7 @@ async def get_num_studied(request: CardFilter) -> int:
 
 
 @api_router.post("/test/num_any_state")
-async def get_num_any_state(request: CardFilter) -> int:
+def get_num_any_state(request: CardFilter) -> int:
     """Gets a number of cards matching filter independent of FSRS state.
 
     Parameters
@@ -348,19 +419,20 @@ async def get_num_any_state(request: CardFilter) -> int:
 
 
 @api_router.post("/test/start_due")
-async def start_test_due(request: StartTestRequest) -> dict:
+def start_test_due(
+    request: StartTestRequest, session_id: str = Depends(get_session_id)
+) -> dict:
     """Start test session with due cards."""
     logging.info(f"Starting test session with due cards, params: {request}")
 
-    manager.start_test_session_fsrs_due(
-        test_setup=request,
-    )
+    with manager.session_registry.lock(session_id):
+        manager.start_test_session_fsrs_due(test_setup=request, session_id=session_id)
     logging.info("Started test session with due cards")
     return {"status": "ok"}
 
 
 @api_router.post("/test/num_due")
-async def get_num_due(request: CardFilter) -> int:
+def get_num_due(request: CardFilter) -> int:
     """Get number of due cards."""
     num_due = manager.get_num_due_cards(request)
     logging.info(f"Number of due cards: {num_due}")
@@ -375,18 +447,47 @@ class RecentMistakesStartTest(BaseModel):
 
 
 @api_router.post("/test/start_recent_mistakes")
-async def start_test_recent_mistakes(request: RecentMistakesStartTest) -> dict:
+def start_test_recent_mistakes(
+    request: RecentMistakesStartTest, session_id: str = Depends(get_session_id)
+) -> dict:
     """Start test session with recent mistakes."""
     logging.info(f"Starting test session with recent mistakes, params: {request}")
 
-    manager.start_test_session_recent_mistakes(
-        test_setup=request.start_request,
-        timestamp=request.time_since,
-    )
+    with manager.session_registry.lock(session_id):
+        manager.start_test_session_recent_mistakes(
+            test_setup=request.start_request,
+            timestamp=request.time_since,
+            session_id=session_id,
+        )
     logging.info("Started test session with recent mistakes")
     return {"status": "ok"}
 
 
+@api_router.post("/test/build")
+def start_test_build(
+    request: SessionBuildRequest, session_id: str = Depends(get_session_id)
+) -> SessionBuildStatus:
+    """Starts building test session in background.
+
+    The progress is available from /test/build/{job_id}, the session
+    can be used when the build finishes.
+    """
+    logging.info(f"Starting test session build, params: {request}")
+    try:
+        return manager.start_test_session_build(request, session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@api_router.get("/test/build/{job_id}")
+def get_test_build(job_id: str) -> SessionBuildStatus:
+    """Gets progress of test session build."""
+    build_status = manager.get_test_session_build(job_id)
+    if build_status is None:
+        raise HTTPException(status_code=404, detail="Test session build not found")
+    return build_status
+
+
 class RecentMistakesFilter(BaseModel):
     """Filter for recent mistakes counting."""
 
@@ -395,7 +496,7 @@ class RecentMistakesFilter(BaseModel):
 
 
 @api_router.post("/test/num_recent_mistakes_since")
-async def get_num_recent_mistakes_since(request: RecentMistakesFilter) -> int:
+def get_num_recent_mistakes_since(request: RecentMistakesFilter) -> int:
     """Get recent mistakes stats."""
     logging.info(f"Getting recent mistakes stats, params: {request}")
     recent_mistakes = manager.db.mistakes_get_num_mistakes_since(
@@ -406,42 +507,49 @@ async def get_num_recent_mistakes_since(request: RecentMistakesFilter) -> int:
 
 
 @api_router.post("/test/practice_failed_cards")
-async def practice_failed_cards() -> dict:
+def practice_failed_cards(session_id: str = Depends(get_session_id)) -> dict:
     """Practice failed cards from the last test session."""
-    if manager.test_session is None:
-        raise HTTPException(status_code=400, detail="No test session exists.")
-    logging.info("Practicing failed cards")
-    manager.test_session.practice_failed_cards()
+    with manager.session_registry.lock(session_id):
+        test_session = manager.get_test_session(session_id)
+        if test_session is None:
+            raise HTTPException(status_code=400, detail="No test session exists.")
+        logging.info("Practicing failed cards")
+        test_session.practice_failed_cards()
     return {"status": "ok"}
 
 
 @api_router.post("/test/practice_all_cards")
-async def practice_all_cards() -> dict:
+def practice_all_cards(session_id: str = Depends(get_session_id)) -> dict:
     """Practice all cards from the last test session."""
-    if manager.test_session is None:
-        raise HTTPException(status_code=400, detail="No test session exists.")
-    logging.info("Practicing all cards")
-    manager.test_session.practice_all_cards()
+    with manager.session_registry.lock(session_id):
+        test_session = manager.get_test_session(session_id)
+        if test_session is None:
+            raise HTTPException(status_code=400, detail="No test session exists.")
+        logging.info("Practicing all cards")
+        test_session.practice_all_cards()
     return {"status": "ok"}
 
 
 @api_router.get("/test/session_active")
-async def get_session_active() -> dict:
+def get_session_active(session_id: str = Depends(get_session_id)) -> dict:
     """Get test session status."""
-    session_active = manager.get_session_active()
+    with manager.session_registry.lock(session_id):
+        session_active = manager.get_session_active(session_id)
     logging.info(f"Session active: {session_active}")
     return {"session_active": session_active}
 
 
 @api_router.get("/test/next")
-async def get_next_card() -> NextCardMessage:
+def get_next_card(session_id: str = Depends(get_session_id)) -> NextCardMessage:
     """Get next card."""
-    if manager.test_session is None:
-        raise HTTPException(status_code=400, detail="Test session not started")
-    next_card = manager.test_session.get_test_question()
-    if next_card.next_question is None:
-        # clear saved test session if current session is finished
-        manager.clear_saved_test_session()
+    with manager.session_registry.lock(session_id):
+        test_session = manager.get_test_session(session_id)
+        if test_session is None:
+            raise HTTPException(status_code=400, detail="Test session not started")
+        next_card = test_session.get_test_question()
+        if next_card.next_question is None:
+            # clear saved test session if current session is finished
+            manager.clear_saved_test_session(session_id)
     logging.info(f"Next card: {next_card}")
     return next_card
 
@@ -463,108 +571,180 @@ class AnswerMessage(BaseModel):
 
 
 @api_router.post("/test/check_answer")
-async def check_answer(answer_message: AnswerMessage) -> AnswerCheckResponse:
+def check_answer(
+    answer_message: AnswerMessage, session_id: str = Depends(get_session_id)
+) -> AnswerCheckResponse:
     """Check answer without answering it."""
-    if manager.test_session is None:
-        raise HTTPException(status_code=400, detail="Test session not started")
-    check_result = manager.test_session.check_answer(answer_message.answer)
+    with manager.session_registry.lock(session_id):
+        test_session = manager.get_test_session(session_id)
+        if test_session is None:
+            raise HTTPException(status_code=400, detail="Test session not started")
+        check_result = test_session.check_answer(answer_message.answer)
     logging.info(f"Answer check result: {check_result}")
     return check_result
 
 
 @api_router.post("/test/answer_question")
-async def answer_question(answer_message: AnswerMessage) -> AnswerCheckResponse:
+def answer_question(
+    answer_message: AnswerMessage, session_id: str = Depends(get_session_id)
+) -> AnswerCheckResponse:
     """Answer question."""
-    if manager.test_session is None:
-        raise HTTPException(status_code=400, detail="Test session not started")
-    check_result = manager.test_session.answer_question(answer_message.answer)
+    with manager.session_registry.lock(session_id):
+        test_session = manager.get_test_session(session_id)
+        if test_session is None:
+            raise HTTPException(status_code=400, detail="Test session not started")
+        check_result = test_session.answer_question(answer_message.answer)
     logging.info(f"Answer check result: {check_result}")
     return check_result
 
 
-@api_router.post("/test/mark_correct")
-async def mark_correct(answer: dict) -> dict:
-    """Mark question as correct."""
-    if manager.test_session is None:
-        raise HTTPException(status_code=400, detail="Test session not started")
+@api_router.post("/test/answer_and_next")
+def answer_and_next(
+    answer_message: AnswerMessage, session_id: str = Depends(get_session_id)
+) -> AnswerNextResponse:
+    """Answer question and get the next one with the session status."""
+    with manager.session_registry.lock(session_id):
+        test_session = manager.get_test_session(session_id)
+        if test_session is None:
+            raise HTTPException(status_code=400, detail="Test session not started")
+        response = test_session.answer_and_get_next(answer_message.answer)
+        if response.next_card.next_question is None:
+            # clear saved test session if current session is finished
+            manager.clear_saved_test_session(session_id)
+    logging.info(f"Answer check result: {response.check_result}")
+    logging.info(f"Next card: {response.next_card}")
+    return response
+
+
+@api_router.websocket("/test/ws")
+async def test_session_channel(
+    websocket: WebSocket,
+    session_id: Optional[str] = Query(default=None),
+    gaku_session: Optional[str] = Cookie(default=None),
+) -> None:
+    """Channel for answering questions of test session.
+
+    The messages are described in gaku.session_channel. Browsers cannot
+    set headers of WebSocket requests, so the session id is in the query.
+    """
+    session_id = session_id or gaku_session or DEFAULT_SESSION_ID
+    try:
+        manager.session_registry.validate_session_id(session_id)
+    except ValueError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
 
-    if manager.test_session.current_question is None:
-        raise HTTPException(status_code=400, detail="No current question")
+    await websocket.accept()
+    logging.info(f"Test session channel opened for session {session_id}")
+    try:
+        while True:
+            message = await websocket.receive_text()
+            # the session lock is a threading lock, it is not taken in the event loop
+            response = await asyncio.to_thread(
+                process_channel_message, session_id, message
+            )
+            await websocket.send_json(response)
+    except WebSocketDisconnect:
+        logging.info(f"Test session channel closed for session {session_id}")
 
-    # verify the answer ids and current question answer ids match
-    answer_ids = [
-        answer.answer_id
-        for group in manager.test_session.current_question.answers
-        for answer in group.answers
-    ]
-    response_ids = list(answer.keys())
-    if not set(answer_ids) == set(response_ids):
-        raise HTTPException(
-            status_code=400, detail="Answer ids do not match current question"
-        )
 
-    manager.test_session.mark_answer_correct(
-        manager.test_session.current_question.question_id
-    )
+def process_channel_message(session_id: str, message: str) -> dict:
+    """Handles message of the test session channel with the session locked."""
+    request = None
+    with manager.session_registry.lock(session_id):
+        # the channel stays open, so the client gets the error as a response
+        try:
+            request = decode_channel_message(message)
+            test_session = manager.get_test_session(session_id)
+            if test_session is None:
+                raise ChannelRequestError("Test session not started")
+            response = handle_channel_message(test_session, request)
+        except Exception as e:
+            if isinstance(e, ChannelRequestError):
+                detail = str(e)
+            else:
+                logging.exception("Test session channel request failed")
+                detail = "Internal error"
+            request_id = request.get("id") if isinstance(request, dict) else None
+            response = {"id": request_id, "type": "error", "detail": detail}
+        if "next_card" in response and response["next_card"]["next_question"] is None:
+            # clear saved test session if current session is finished
+            manager.clear_saved_test_session(session_id)
+    return response
+
+
+@api_router.post("/test/mark_correct")
+def mark_correct(
+    answer_message: AnswerMessage, session_id: str = Depends(get_session_id)
+) -> dict:
+    """Mark question as correct."""
+    with manager.session_registry.lock(session_id):
+        test_session = manager.get_test_session(session_id)
+        if test_session is None:
+            raise HTTPException(status_code=400, detail="Test session not started")
+        try:
+            question = test_session.get_answered_question(answer_message.answer)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        test_session.mark_answer_correct(question.question_id)
     logging.info("Marked answer as correct")
     return {"status": "ok"}
 
 
 @api_router.post("/test/mark_mistake")
-async def mark_mistake(answer: dict) -> dict:
+def mark_mistake(
+    answer_message: AnswerMessage, session_id: str = Depends(get_session_id)
+) -> dict:
     """Mark question as a mistake."""
-    if manager.test_session is None:
-        raise HTTPException(status_code=400, detail="Test session not started")
-
-    if manager.test_session.current_question is None:
-        raise HTTPException(status_code=400, detail="No current question")
-
-    # verify the answer ids and current question answer ids match
-    answer_ids = [
-        answer.answer_id
-        for group in manager.test_session.current_question.answers
-        for answer in group.answers
-    ]
-    response_ids = list(answer["answer"].keys())
-    if not set(answer_ids) == set(response_ids):
-        raise HTTPException(
-            status_code=400,
-            detail=f"Answer ids do not match current question, {answer_ids} != {response_ids}",
-        )
+    with manager.session_registry.lock(session_id):
+        test_session = manager.get_test_session(session_id)
+        if test_session is None:
+            raise HTTPException(status_code=400, detail="Test session not started")
+        try:
+            question = test_session.get_answered_question(answer_message.answer)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-    manager.test_session.mark_answer_mistake(
-        manager.test_session.current_question.question_id
-    )
+        test_session.mark_answer_mistake(question.question_id)
     logging.info("Marked answer as a mistake")
     return {"status": "ok"}
 
 
 @api_router.get("/test/results")
-async def get_test_results() -> dict:
+def get_test_results(session_id: str = Depends(get_session_id)) -> dict:
     """Get test results."""
-    if manager.test_session is None:
-        raise HTTPException(status_code=400, detail="Test session not started")
-    test_results = manager.test_session.get_test_results()
+    with manager.session_registry.lock(session_id):
+        test_session = manager.get_test_session(session_id)
+        if test_session is None:
+            raise HTTPException(status_code=400, detail="Test session not started")
+        test_results = test_session.get_test_results()
     logging.info(f"Test results: {test_results}")
     return test_results
 
 
 @api_router.get("/test/status")
-async def get_test_status() -> TestStatusMessage:
+def get_test_status(
+    session_id: str = Depends(get_session_id),
+) -> TestStatusMessage:
     """Get test status."""
-    if manager.test_session is None:
-        raise HTTPException(status_code=400, detail="Test session not started")
-    test_status = manager.test_session.get_session_status()
+    with manager.session_registry.lock(session_id):
+        test_session = manager.get_test_session(session_id)
+        if test_session is None:
+            raise HTTPException(status_code=400, detail="Test session not started")
+        test_status = test_session.get_session_status()
     logging.info(f"Test status: {test_status}")
     return test_status
 
 
 @api_router.get("/test/is_practice")
-async def get_is_practice() -> bool:
+def get_is_practice(session_id: str = Depends(get_session_id)) -> bool:
     """Get test status."""
-    if manager.test_session is None:
-        raise HTTPException(status_code=400, detail="Test session not started")
-    is_practice = not manager.test_session.mark_answers
+    with manager.session_registry.lock(session_id):
+        test_session = manager.get_test_session(session_id)
+        if test_session is None:
+            raise HTTPException(status_code=400, detail="Test session not started")
+        is_practice = not test_session.mark_answers
     logging.info(f"Is practice: {is_practice}")
     return is_practice
 
@@ -588,13 +768,62 @@ async def import_vocab_cards(import_data: ImportRequest) -> dict:
 
 # stats
 @api_router.get("/stats/num_due")
-async def get_num_due_stats() -> dict[int, int]:
+async def get_num_due_stats(
+    num_days: int = Query(default=5, ge=0, le=3650),
+    bucket_days: int = Query(default=1, ge=1, le=3650),
+) -> dict[int, int]:
     """Get due stats."""
-    due_stats = manager.get_num_upcoming_cards()
+    due_stats = manager.get_num_upcoming_cards(
+        num_days=num_days, bucket_days=bucket_days
+    )
     logging.info(f"Due stats: {due_stats}")
     return due_stats
 
 
+@api_router.post("/stats/num_due")
+async def get_num_due_stats_filtered(request: DueForecastRequest) -> dict[int, int]:
+    """Get due stats for cards matching the filter."""
+    due_stats = manager.get_num_upcoming_cards(
+        num_days=request.num_days,
+        bucket_days=request.bucket_days,
+        filter=request.filter,
+    )
+    logging.info(f"Due stats for filter {request.filter}: {due_stats}")
+    return due_stats
+
+
+@api_router.post("/stats/fsrs_states")
+async def get_fsrs_state_stats(request: CardFilter) -> dict[str, int]:
+    """Get number of studied cards in each FSRS state."""
+    state_stats = manager.db.get_fsrs_state_counts(request)
+    logging.info(f"FSRS state stats: {state_stats}")
+    return state_stats
+
+
+@api_router.get("/stats/stability_by_source")
+async def get_stability_by_source() -> dict[str, float]:
+    """Get average FSRS stability of studied cards by source id."""
+    stability_stats = manager.db.get_fsrs_stability_by_source()
+    logging.info(f"Stability by source: {stability_stats}")
+    return stability_stats
+
+
+@api_router.post("/stats/workload")
+def get_workload_simulation(
+    request: WorkloadSimulationRequest,
+) -> list[WorkloadDay]:
+    """Simulate daily review workload with new cards learned each day.
+
+    Plain function, so the simulation runs in the threadpool
+    instead of blocking the event loop.
+    """
+    workload = manager.simulate_workload(
+        new_cards_per_day=request.new_cards_per_day, num_days=request.num_days
+    )
+    logging.info(f"Simulated workload for {len(workload)} days")
+    return workload
+
+
 @api_router.get("/stats/num_recent_mistakes")
 async def get_num_recent_mistakes() -> dict[int, int]:
     """Get recent mistakes stats."""
@@ -603,6 +832,30 @@ async def get_num_recent_mistakes() -> dict[int, int]:
     return recent_mistakes
 
 
+# scheduling
+@api_router.post("/fsrs/optimize")
+async def start_fsrs_optimization() -> FSRSOptimizationStatus:
+    """Starts optimization of FSRS parameters from the review history."""
+    try:
+        return manager.start_fsrs_optimization()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@api_router.get("/fsrs/optimize")
+async def get_fsrs_optimization_status() -> FSRSOptimizationStatus:
+    """Gets progress of FSRS parameters optimization."""
+    return manager.get_fsrs_optimization_status()
+
+
+@api_router.post("/fsrs/reschedule")
+def reschedule_fsrs(request: RescheduleRequest) -> RescheduleReport:
+    """Reschedules all studied cards with the current scheduler."""
+    report = manager.reschedule_fsrs(dry_run=request.dry_run, resume=request.resume)
+    logging.info(f"Rescheduled {report.num_cards} cards, {report.num_changed} changed")
+    return report
+
+
 app.include_router(router=api_router)
 
 # add access to frontend
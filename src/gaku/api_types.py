@@ -1,5 +1,7 @@
 """Various data structures."""
 
+from datetime import datetime
+from enum import Enum
 from typing import Optional
 
 from pydantic import BaseModel, Field
@@ -135,6 +137,8 @@ class CheckResult(BaseModel):
 
     question: TestQuestion
     correct: bool
+    # mistakes by answer id
+    mistakes: dict[str, list[str]] = {}
 
 
 class CardSourceLink(BaseModel):
@@ -145,8 +149,257 @@ class CardSourceLink(BaseModel):
     source_id: str
 
 
+class ReviewLogEntry(BaseModel):
+    """Record of a FSRS review of a card.
+
+    Attributes
+    ----------
+    card_id : str
+        Id of the reviewed card.
+    rating : int
+        FSRS rating of the review.
+    review_datetime : datetime
+        Time of the review (UTC).
+    review_duration : Optional[int]
+        Duration of the review in milliseconds, if known.
+    prior_state : Optional[int]
+        FSRS state of the card before the review, None for new cards.
+    prior_step : Optional[int]
+        FSRS learning step of the card before the review.
+    prior_stability : Optional[float]
+        FSRS stability of the card before the review.
+    prior_difficulty : Optional[float]
+        FSRS difficulty of the card before the review.
+    prior_last_review : Optional[datetime]
+        Time of the previous review of the card (UTC).
+    """
+
+    card_id: str
+    rating: int
+    review_datetime: datetime
+    review_duration: Optional[int] = None
+    prior_state: Optional[int] = None
+    prior_step: Optional[int] = None
+    prior_stability: Optional[float] = None
+    prior_difficulty: Optional[float] = None
+    prior_last_review: Optional[datetime] = None
+
+
+class WorkloadSimulationRequest(BaseModel):
+    """Request for simulation of future review workload.
+
+    Attributes
+    ----------
+    new_cards_per_day : int
+        Number of new cards learned each day, at most 500.
+    num_days : int
+        Number of simulated days, starting today, at most a year.
+    """
+
+    # the simulation keeps arrays with all new cards of all simulated days
+    new_cards_per_day: int = Field(default=0, ge=0, le=500)
+    num_days: int = Field(default=90, ge=1, le=365)
+
+
+class WorkloadDay(BaseModel):
+    """Simulated review workload for one day.
+
+    Attributes
+    ----------
+    day : int
+        Day of the simulation, 0 is today.
+    num_due : int
+        Number of studied cards due for review.
+    num_new : int
+        Number of new cards learned.
+    num_reviews : int
+        Number of reviews including the repeated reviews
+        of new and forgotten cards.
+    review_minutes : float
+        Expected time spent by reviewing.
+    """
+
+    day: int
+    num_due: int
+    num_new: int
+    num_reviews: int
+    review_minutes: float
+
+
+class RescheduleRequest(BaseModel):
+    """Request for rescheduling all studied cards.
+
+    Attributes
+    ----------
+    dry_run : bool
+        If True, only report the changes without storing them.
+    resume : bool
+        If True, continue interrupted rescheduling with the same scheduler.
+    """
+
+    dry_run: bool = True
+    resume: bool = True
+
+
+class RescheduleReport(BaseModel):
+    """Result of rescheduling studied cards.
+
+    The due dates are counted by day, 0 is today including overdue cards.
+
+    Attributes
+    ----------
+    dry_run : bool
+        True if the changes were not stored.
+    resumed : bool
+        True if interrupted rescheduling was continued,
+        the report then covers only the cards processed after resuming.
+    num_cards : int
+        Number of processed cards.
+    num_changed : int
+        Number of cards with changed due date.
+    num_replayed : int
+        Number of cards with memory state recomputed from the review log.
+    due_before : dict[int, int]
+        Number of cards due on each day before rescheduling.
+    due_after : dict[int, int]
+        Number of cards due on each day after rescheduling.
+    """
+
+    dry_run: bool
+    resumed: bool = False
+    num_cards: int = 0
+    num_changed: int = 0
+    num_replayed: int = 0
+    due_before: dict[int, int] = {}
+    due_after: dict[int, int] = {}
+
+
+class FSRSOptimizationStatus(BaseModel):
+    """Status of FSRS parameters optimization.
+
+    Attributes
+    ----------
+    running : bool
+        True if the optimization is in progress.
+    progress : float
+        Progress of the optimization from 0 to 1.
+    num_reviews : int
+        Number of reviews used for the optimization.
+    loss : Optional[float]
+        Loss of the current parameters.
+    parameters : Optional[list[float]]
+        Optimized parameters, set when the optimization finishes.
+    error : Optional[str]
+        Error message if the optimization failed.
+    """
+
+    running: bool = False
+    progress: float = 0.0
+    num_reviews: int = 0
+    loss: Optional[float] = None
+    parameters: Optional[list[float]] = None
+    error: Optional[str] = None
+
+
 class AnswerCheckResponse(BaseModel):
     """Result of answer correctness check."""
 
     all_correct: bool
     mistakes: dict[str, list[str]]
+
+
+class AnswerNextResponse(BaseModel):
+    """Result of answered question together with the next question.
+
+    Attributes
+    ----------
+    check_result : AnswerCheckResponse
+        Result of the answer check.
+    next_card : NextCardMessage
+        The next question, empty if the session is finished.
+    status : TestStatusMessage
+        Status of the session after the answer.
+    """
+
+    check_result: AnswerCheckResponse
+    next_card: NextCardMessage
+    status: TestStatusMessage
+
+
+class SessionStartType(Enum):
+    """Selection of the cards of a test session."""
+
+    ANY_STATE = "ANY_STATE"
+    NEW = "NEW"
+    STUDIED = "STUDIED"
+    WEAKEST = "WEAKEST"
+    DUE = "DUE"
+    RECENT_MISTAKES = "RECENT_MISTAKES"
+
+
+class SessionBuildRequest(BaseModel):
+    """Request to build test session in background.
+
+    Attributes
+    ----------
+    start_type : SessionStartType
+        Selection of the cards for the session.
+    start_request : StartTestRequest
+        Configuration of the test.
+    time_since : Optional[int]
+        Timestamp since which the mistakes are used,
+        required for the recent mistakes sessions.
+    """
+
+    start_type: SessionStartType
+    start_request: StartTestRequest
+    time_since: Optional[int] = None
+
+
+class SessionBuildStatus(BaseModel):
+    """Status of test session built in background.
+
+    Attributes
+    ----------
+    job_id : str
+        Id of the build job.
+    session_id : str
+        Id of the built test session.
+    running : bool
+        True if the session is being built.
+    stage : str
+        Current step of the build: "loading_cards", "extra_questions",
+        "loading_questions" or "finished".
+    num_cards : int
+        Number of loaded cards.
+    num_questions : int
+        Number of questions of the session.
+    error : Optional[str]
+        Error message if the build failed.
+    """
+
+    job_id: str
+    session_id: str
+    running: bool = True
+    stage: str = "loading_cards"
+    num_cards: int = 0
+    num_questions: int = 0
+    error: Optional[str] = None
+
+
+class DueForecastRequest(BaseModel):
+    """Request for forecast of upcoming due cards.
+
+    Attributes
+    ----------
+    filter : CardFilter
+        Filter to limit the cards included in the forecast.
+    num_days : int
+        Number of days after today to include in the forecast.
+    bucket_days : int
+        Number of days grouped in one forecast entry.
+    """
+
+    filter: CardFilter = Field(default_factory=CardFilter)
+    num_days: int = Field(default=5, ge=0, le=3650)
+    bucket_days: int = Field(default=1, ge=1, le=3650)
@@ -1,16 +1,23 @@
 """Card related functionality."""
 
+import functools
+import hashlib
 import logging
 import random
+import threading
 import uuid
+from collections import OrderedDict
 from enum import Enum
-from typing import Optional, Union
+from typing import Callable, Optional, TypeVar, Union
 from pydantic import BaseModel, Field
 
 
 from .config import get_config
 from .question import AnswerType, AnswerText, Answer, AnswerGroup, TestQuestion
 
+# maximum number of generated test questions kept in memory
+QUESTION_CACHE_SIZE = 20000
+
 
 class CardSource(BaseModel):
     """Source of the card.
@@ -45,6 +52,87 @@ class BaseCard(BaseModel):
     note: str = ""
     hint: str = ""
 
+    def get_question_version(self) -> str:
+        """Gets version of the card data the generated questions are created from.
+
+        The version changes when the card is changed, custom questions
+        are not included as they are not generated.
+        """
+        card_data = self.model_dump_json(exclude={"custom_questions"})
+        return hashlib.sha256(card_data.encode("utf-8")).hexdigest()
+
+
+class QuestionCache:
+    """Least recently used cache of generated test questions.
+
+    The questions are keyed by card id, card version and kind of the question,
+    so changed cards get new questions. The cached questions are shared,
+    they must not be modified.
+    """
+
+    def __init__(self, max_size: int = QUESTION_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self.questions: OrderedDict[tuple[str, str, str], TestQuestion] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple[str, str, str]) -> Optional[TestQuestion]:
+        """Gets cached question, None if it is not cached."""
+        with self.lock:
+            question = self.questions.get(key)
+            if question is not None:
+                self.questions.move_to_end(key)
+            return question
+
+    def add(self, key: tuple[str, str, str], question: TestQuestion) -> None:
+        """Adds question to the cache, removes the least recently used questions."""
+        with self.lock:
+            self.questions[key] = question
+            self.questions.move_to_end(key)
+            while len(self.questions) > self.max_size:
+                self.questions.popitem(last=False)
+
+    def clear(self) -> None:
+        """Removes all cached questions."""
+        with self.lock:
+            self.questions.clear()
+
+
+QUESTION_CACHE = QuestionCache()
+
+CardT = TypeVar("CardT", bound=BaseCard)
+
+
+def memoized_question(
+    kind: str,
+) -> Callable[[Callable[[CardT], TestQuestion]], Callable[[CardT], TestQuestion]]:
+    """Memoizes test question generated by the decorated card method.
+
+    The generated question gets ids derived from its content and kind
+    and is stored in QUESTION_CACHE, the same question is returned
+    until the card is changed.
+
+    Parameters
+    ----------
+    kind: str
+        Kind of the question, distinguishes questions of the same card.
+    """
+
+    def decorator(
+        create_question: Callable[[CardT], TestQuestion],
+    ) -> Callable[[CardT], TestQuestion]:
+        @functools.wraps(create_question)
+        def get_question(card: CardT) -> TestQuestion:
+            key = (card.card_id, card.get_question_version(), kind)
+            question = QUESTION_CACHE.get(key)
+            if question is None:
+                question = create_question(card).with_content_ids(kind)
+                QUESTION_CACHE.add(key, question)
+            return question
+
+        return get_question
+
+    return decorator
+
 
 class VocabularyMeaningEntry(BaseModel):
     """Vocabulary meaning entry."""
@@ -67,6 +155,7 @@ class VocabCard(BaseCard):
     # TODO:
     # - add support for kanji and kanji test cards for vocabulary entries
 
+    @memoized_question("vocab_meanings")
     def get_meanings_test_question(self) -> TestQuestion:
         """Get test question for meanings.
 
@@ -111,6 +200,7 @@ class VocabCard(BaseCard):
             answers=[AnswerGroup(answers=meanings_answers)],
         )
 
+    @memoized_question("vocab_readings")
     def get_readings_test_question(self) -> TestQuestion:
         """Get test question for readings.
 
@@ -148,6 +238,18 @@ class VocabCard(BaseCard):
             ],
         )
 
+    def get_num_test_questions(self) -> int:
+        """Get number of test questions without creating them.
+
+        Raises
+        ------
+        ValueError
+            If there are no meanings to test.
+        """
+        if not any(meaning_entry.test_enabled for meaning_entry in self.meanings):
+            raise ValueError(f"No meanings to test for: {self}")
+        return 1 + bool(self.readings) + len(self.custom_questions)
+
     def get_test_questions(self) -> list[TestQuestion]:
         """Get test cards for the vocabulary entry.
 
@@ -180,6 +282,7 @@ class KanjiCard(BaseCard):
     meanings: list[AnswerText]
     radical_id: Optional[int]
 
+    @memoized_question("kanji_meanings")
     def get_meanings_test_question(self) -> TestQuestion:
         """Get test question for meanings.
 
@@ -205,6 +308,7 @@ class KanjiCard(BaseCard):
             ],
         )
 
+    @memoized_question("kanji_readings")
     def get_readings_test_question(self) -> TestQuestion:
         """Get test question for readings.
 
@@ -248,6 +352,10 @@ class KanjiCard(BaseCard):
             answers=[AnswerGroup(answers=kanji_readings_answers)],
         )
 
+    def get_num_test_questions(self) -> int:
+        """Get number of test questions without creating them."""
+        return 2 + len(self.custom_questions)
+
     def get_test_questions(self) -> list[TestQuestion]:
         """Get test cards for the kanji entry.
 
@@ -276,6 +384,14 @@ class RadicalCard(BaseCard):
     meanings: list[AnswerText]
     reading: str
 
+    def get_num_test_questions(self) -> int:
+        """Get number of test questions without creating them."""
+        return 1 + len(self.custom_questions)
+
+    def get_question_version(self) -> str:
+        """Gets version of the card data, includes the radical test configuration."""
+        return f"{super().get_question_version()}-{get_config().radicals_test_meaning}"
+
     def get_test_questions(self) -> list[TestQuestion]:
         """Get test cards for the radical entry.
 
@@ -286,6 +402,11 @@ class RadicalCard(BaseCard):
             Typically following cards are created:
             - Q: character, A: meanings
         """
+        return [self.get_radical_test_question()] + self.custom_questions
+
+    @memoized_question("radical")
+    def get_radical_test_question(self) -> TestQuestion:
+        """Get test question for the radical meanings and reading."""
         test_questions = []
         if get_config().radicals_test_meaning:
             test_questions.append(
@@ -303,19 +424,13 @@ class RadicalCard(BaseCard):
             )
         )
 
-        # create a card for the radical
-        test_cards = []
-        test_cards.append(
-            TestQuestion(
-                parent_id=self.card_id,
-                header="Radical",
-                question=self.writing,
-                answers=[AnswerGroup(answers=test_questions)],
-            )
+        return TestQuestion(
+            parent_id=self.card_id,
+            header="Radical",
+            question=self.writing,
+            answers=[AnswerGroup(answers=test_questions)],
         )
 
-        return test_cards + self.custom_questions
-
 
 class OnomatopoeiaDefinition(BaseModel):
     """Onomatopoeia definition."""
@@ -342,28 +457,34 @@ class OnomatopoeiaCard(BaseCard):
     kana_writing: list[str]
     definitions: list[OnomatopoeiaDefinition]
 
+    def get_num_test_questions(self) -> int:
+        """Get number of test questions without creating them."""
+        return 1
+
     def get_test_questions(self) -> list[TestQuestion]:
         """Creates test question for this Onomatopoeia card."""
+        return [self.get_meanings_test_question()]
 
-        return [
-            TestQuestion(
-                parent_id=self.card_id,
-                header="Onomatopoeia meaning",
-                question=", ".join(self.kana_writing),
-                answers=[
-                    AnswerGroup(
-                        answers=[
-                            Answer(
-                                answer_type=AnswerType.ROMAJI,
-                                header=f"{i+1}. meaning",
-                                answers=definition.equivalent,
-                            )
-                            for i, definition in enumerate(self.definitions)
-                        ]
-                    )
-                ],
-            )
-        ]
+    @memoized_question("onomatopoeia_meanings")
+    def get_meanings_test_question(self) -> TestQuestion:
+        """Creates test question for the meanings of the onomatopoeia."""
+        return TestQuestion(
+            parent_id=self.card_id,
+            header="Onomatopoeia meaning",
+            question=", ".join(self.kana_writing),
+            answers=[
+                AnswerGroup(
+                    answers=[
+                        Answer(
+                            answer_type=AnswerType.ROMAJI,
+                            header=f"{i+1}. meaning",
+                            answers=definition.equivalent,
+                        )
+                        for i, definition in enumerate(self.definitions)
+                    ]
+                )
+            ],
+        )
 
 
 class QuestionCard(BaseCard):
@@ -375,16 +496,23 @@ class QuestionCard(BaseCard):
     writing: str
     answers: list[Answer]
 
+    def get_num_test_questions(self) -> int:
+        """Get number of test questions without creating them."""
+        return 1 + len(self.custom_questions)
+
     def get_test_questions(self) -> list[TestQuestion]:
         """Creates test questions for this card."""
-        return [
-            TestQuestion(
-                parent_id=self.card_id,
-                header="Custom question",
-                question=self.writing,
-                answers=[AnswerGroup(answers=self.answers)],
-            )
-        ] + self.custom_questions
+        return [self.get_custom_test_question()] + self.custom_questions
+
+    @memoized_question("custom")
+    def get_custom_test_question(self) -> TestQuestion:
+        """Creates test question from the question and answers of this card."""
+        return TestQuestion(
+            parent_id=self.card_id,
+            header="Custom question",
+            question=self.writing,
+            answers=[AnswerGroup(answers=self.answers)],
+        )
 
 
 class MultiCard(BaseCard):
@@ -411,6 +539,23 @@ class MultiCard(BaseCard):
         """Generate writing from the card ids."""
         self.writing = " - ".join([card.writing for card in self.cards])
 
+    def get_num_test_questions(self) -> int:
+        """Get number of test questions without creating them.
+
+        Raises
+        ------
+        ValueError
+            If the multi card type is not supported or there are no questions.
+        """
+        if self.multicard_type == CardType.RADICAL:
+            return 1
+        if self.multicard_type not in [CardType.VOCABULARY, CardType.KANJI]:
+            raise ValueError(f"Multi card type {self.multicard_type} not supported")
+        num_questions = self.test_meanings + self.test_readings
+        if num_questions == 0:
+            raise ValueError(f"No questions for multi card: {self}")
+        return num_questions
+
     def get_test_questions(self) -> list[TestQuestion]:
         """Get test cards for the multi card.
 
@@ -448,10 +593,16 @@ class MultiCard(BaseCard):
                     raise ValueError(
                         f"Radical question with multiple answers: {radical_questions}"
                     )
-                answer_group = question.answers[0]
-                answer_group.header = card.writing
+                # the child questions are cached, so the group is copied
+                answer_group = question.answers[0].model_copy(
+                    update={"header": card.writing}
+                )
                 radical_multi_question.answers.append(answer_group)
 
+            # the ids are derived before shuffling, so they do not depend on the order
+            radical_multi_question = radical_multi_question.with_content_ids(
+                "multi_radical"
+            )
             # shuffle the order of the questions
             random.shuffle(radical_multi_question.answers)
             questions.append(radical_multi_question)
@@ -476,10 +627,12 @@ class MultiCard(BaseCard):
                         raise ValueError(
                             f"Vocab question with multiple answers: {card_question}"
                         )
-                    answer_group = card_question.answers[0]
-                    answer_group.header = card.writing
+                    answer_group = card_question.answers[0].model_copy(
+                        update={"header": card.writing}
+                    )
                     question.answers.append(answer_group)
 
+                question = question.with_content_ids("multi_meanings")
                 # shuffle the order of the questions
                 random.shuffle(question.answers)
                 logging.info(f"Meanings test question for multi card: {question}")
@@ -506,10 +659,12 @@ class MultiCard(BaseCard):
                             f"Vocab question with multiple answers: {card_question}"
                         )
 
-                    answer_group = card_question.answers[0]
-                    answer_group.header = card.writing
+                    answer_group = card_question.answers[0].model_copy(
+                        update={"header": card.writing}
+                    )
                     question.answers.append(answer_group)
 
+                question = question.with_content_ids("multi_readings")
                 # shuffle the order of the questions
                 random.shuffle(question.answers)
                 logging.info(f"Readings test question for multi card: {question}")
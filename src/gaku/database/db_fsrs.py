@@ -4,18 +4,104 @@ import json
 import logging
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Iterator, Optional
 
 import fsrs
 from sqlalchemy import (
+    insert,
     select,
+    update,
     func,
+    cast,
+    Integer,
 )
 from sqlalchemy.orm import (
     Session,
 )
 
 
-from .db_schema import DbManagerBase, FSRSTable
+from ..api_types import ReviewLogEntry
+from .db_schema import DbManagerBase, FSRSReviewLogTable, FSRSTable
+
+# maximum number of card ids in one IN query
+# SQLite limits the number of bound parameters in a single statement
+FSRS_QUERY_CHUNK_SIZE = 500
+
+
+def get_fsrs_columns(fsrs_card: fsrs.Card) -> dict:
+    """Creates values of FSRS table columns from FSRS card.
+
+    Parameters
+    ----------
+    fsrs_card: fsrs.Card
+        The FSRS card to get the values from.
+
+    Returns
+    -------
+    dict
+        Values for all FSRS table columns except the card id.
+    """
+    return {
+        "due_date": fsrs_card.due,
+        "fsrs_data": fsrs_card.to_dict(),
+        "state": fsrs_card.state.value,
+        "step": fsrs_card.step,
+        "stability": fsrs_card.stability,
+        "difficulty": fsrs_card.difficulty,
+        "last_review": fsrs_card.last_review,
+    }
+
+
+def to_db_datetime(date: Optional[datetime]) -> Optional[datetime]:
+    """Converts datetime to naive UTC datetime as stored in the database."""
+    if date is None or date.tzinfo is None:
+        return date
+    return date.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def get_review_log_entry(
+    card_id: str,
+    review_log: fsrs.ReviewLog,
+    prior_card: Optional[fsrs.Card] = None,
+) -> ReviewLogEntry:
+    """Creates review log entry from FSRS review log.
+
+    Parameters
+    ----------
+    card_id: str
+        Id of the reviewed card.
+    review_log: fsrs.ReviewLog
+        The FSRS review log.
+    prior_card: Optional[fsrs.Card]
+        FSRS state of the card before the review, None for cards
+        without any stored FSRS data.
+
+    Returns
+    -------
+    ReviewLogEntry
+        The review log entry.
+    """
+    entry = ReviewLogEntry(
+        card_id=card_id,
+        rating=review_log.rating.value,
+        review_datetime=review_log.review_datetime,
+        review_duration=review_log.review_duration,
+    )
+    if prior_card is not None:
+        entry.prior_state = prior_card.state.value
+        entry.prior_step = prior_card.step
+        entry.prior_stability = prior_card.stability
+        entry.prior_difficulty = prior_card.difficulty
+        entry.prior_last_review = prior_card.last_review
+    return entry
+
+
+def get_review_log_columns(entry: ReviewLogEntry) -> dict:
+    """Creates values of review log table columns from review log entry."""
+    columns = entry.model_dump()
+    columns["review_datetime"] = to_db_datetime(entry.review_datetime)
+    columns["prior_last_review"] = to_db_datetime(entry.prior_last_review)
+    return columns
 
 
 class FSRSManager(DbManagerBase):
@@ -38,29 +124,288 @@ class FSRSManager(DbManagerBase):
             logging.info(f"FSRS data found, returning: {fsrs_card.fsrs_data}")
             return fsrs.Card.from_dict(fsrs_card.fsrs_data)
 
-    def update_card_fsrs(self, card_id: str, fsrs_card: fsrs.Card) -> None:
-        """Updates FSRS card with new data, creates new if not exists."""
+    def get_fsrs_data_for_cards(self, card_ids: list[str]) -> dict[str, fsrs.Card]:
+        """Returns stored FSRS data for multiple cards at once.
+
+        The card ids are queried in chunks to stay within
+        the database limit for number of query parameters.
+
+        Parameters
+        ----------
+        card_ids: list[str]
+            Ids of the cards to get the FSRS data for.
+
+        Returns
+        -------
+        dict[str, fsrs.Card]
+            FSRS data by card id, cards without FSRS data are not included.
+        """
+        logging.info(f"Getting FSRS data for {len(card_ids)} cards")
+        unique_ids = list(dict.fromkeys(card_ids))
+        fsrs_cards: dict[str, fsrs.Card] = {}
+        with Session(self.engine) as session:
+            for chunk_start in range(0, len(unique_ids), FSRS_QUERY_CHUNK_SIZE):
+                chunk = unique_ids[chunk_start : chunk_start + FSRS_QUERY_CHUNK_SIZE]
+                fsrs_select = select(FSRSTable.card_id, FSRSTable.fsrs_data).where(
+                    FSRSTable.card_id.in_(chunk)
+                )
+                for card_id, fsrs_data in session.execute(fsrs_select):
+                    fsrs_cards[card_id] = fsrs.Card.from_dict(fsrs_data)
+
+        logging.info(f"Found FSRS data for {len(fsrs_cards)} cards")
+        return fsrs_cards
+
+    def get_fsrs_memory_states(self) -> tuple[list[str], list[float], list[float]]:
+        """Returns memory state of all studied cards.
+
+        Returns
+        -------
+        tuple[list[str], list[float], list[float]]
+            Card ids, FSRS stability of the cards and time of the last review
+            of the cards in days (julian day number).
+        """
+        memory_select = select(
+            FSRSTable.card_id,
+            FSRSTable.stability,
+            func.julianday(FSRSTable.last_review),
+        ).where(FSRSTable.stability.is_not(None), FSRSTable.last_review.is_not(None))
+        with Session(self.engine) as session:
+            rows = session.execute(memory_select).all()
+
+        if not rows:
+            return [], [], []
+        card_ids, stability, last_review = zip(*rows)
+        return list(card_ids), list(stability), list(last_review)
+
+    def get_fsrs_schedules(
+        self,
+    ) -> tuple[list[float], list[float], list[float], list[float]]:
+        """Returns memory state and schedule of all studied cards.
+
+        Returns
+        -------
+        tuple[list[float], list[float], list[float], list[float]]
+            FSRS stability, FSRS difficulty, due date and time of the last review
+            of the cards. The times are in days (julian day number).
+        """
+        schedule_select = select(
+            FSRSTable.stability,
+            FSRSTable.difficulty,
+            func.julianday(FSRSTable.due_date),
+            func.julianday(FSRSTable.last_review),
+        ).where(
+            FSRSTable.stability.is_not(None),
+            FSRSTable.difficulty.is_not(None),
+            FSRSTable.last_review.is_not(None),
+        )
+        with Session(self.engine) as session:
+            rows = session.execute(schedule_select).all()
+
+        if not rows:
+            return [], [], [], []
+        stability, difficulty, due, last_review = zip(*rows)
+        return list(stability), list(difficulty), list(due), list(last_review)
+
+    def get_average_review_duration(self) -> Optional[float]:
+        """Returns average duration of a review in milliseconds.
+
+        Returns
+        -------
+        Optional[float]
+            The average duration or None if no review has known duration.
+        """
+        with Session(self.engine) as session:
+            return session.scalar(
+                select(func.avg(FSRSReviewLogTable.review_duration)).where(
+                    FSRSReviewLogTable.review_duration.is_not(None)
+                )
+            )
+
+    def update_card_fsrs(
+        self,
+        card_id: str,
+        fsrs_card: fsrs.Card,
+        review_log: Optional[ReviewLogEntry] = None,
+    ) -> None:
+        """Updates FSRS card with new data, creates new if not exists.
+
+        Parameters
+        ----------
+        card_id: str
+            Id of the card to update.
+        fsrs_card: fsrs.Card
+            The new FSRS data of the card.
+        review_log: Optional[ReviewLogEntry]
+            Review which resulted in the new FSRS data. If given, it is
+            added to the review log in the same transaction as the update.
+        """
 
         logging.info(
             f"Updating FSRS for {card_id}, fsrs data: {fsrs_card}, new due date: {fsrs_card.due}"
         )
         with Session(self.engine) as session:
+            if review_log is not None:
+                session.execute(
+                    insert(FSRSReviewLogTable), [get_review_log_columns(review_log)]
+                )
             fsrs_card_db = (
                 session.query(FSRSTable).filter(FSRSTable.card_id == card_id).first()
             )
             if fsrs_card_db is None:
                 logging.info("No FSRS entry yet, creating it")
-                session.add(
-                    FSRSTable(
-                        card_id=card_id,
-                        due_date=fsrs_card.due,
-                        fsrs_data=fsrs_card.to_dict(),
+                session.add(FSRSTable(card_id=card_id, **get_fsrs_columns(fsrs_card)))
+            else:
+                for column, value in get_fsrs_columns(fsrs_card).items():
+                    setattr(fsrs_card_db, column, value)
+            session.commit()
+        self.fsrs_data_changed()
+
+    def get_review_logs(
+        self,
+        card_id: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        card_ids: Optional[list[str]] = None,
+    ) -> list[ReviewLogEntry]:
+        """Gets reviews from the review log ordered by review time.
+
+        Parameters
+        ----------
+        card_id: Optional[str]
+            If given, only reviews of this card are returned.
+        start: Optional[datetime]
+            If given, only reviews at or after this time are returned.
+        end: Optional[datetime]
+            If given, only reviews before this time are returned.
+        card_ids: Optional[list[str]]
+            If given, only reviews of these cards are returned.
+
+        Returns
+        -------
+        list[ReviewLogEntry]
+            The reviews. The times are in UTC.
+        """
+        log_select = select(FSRSReviewLogTable)
+        if card_id is not None:
+            log_select = log_select.where(FSRSReviewLogTable.card_id == card_id)
+        if card_ids is not None:
+            log_select = log_select.where(FSRSReviewLogTable.card_id.in_(card_ids))
+        if start is not None:
+            log_select = log_select.where(
+                FSRSReviewLogTable.review_datetime >= to_db_datetime(start)
+            )
+        if end is not None:
+            log_select = log_select.where(
+                FSRSReviewLogTable.review_datetime < to_db_datetime(end)
+            )
+        log_select = log_select.order_by(
+            FSRSReviewLogTable.review_datetime, FSRSReviewLogTable.review_id
+        )
+
+        review_logs: list[ReviewLogEntry] = []
+        with Session(self.engine) as session:
+            for review in session.scalars(log_select):
+                review_logs.append(
+                    ReviewLogEntry(
+                        card_id=review.card_id,
+                        rating=review.rating,
+                        review_datetime=review.review_datetime.replace(
+                            tzinfo=timezone.utc
+                        ),
+                        review_duration=review.review_duration,
+                        prior_state=review.prior_state,
+                        prior_step=review.prior_step,
+                        prior_stability=review.prior_stability,
+                        prior_difficulty=review.prior_difficulty,
+                        prior_last_review=(
+                            review.prior_last_review.replace(tzinfo=timezone.utc)
+                            if review.prior_last_review is not None
+                            else None
+                        ),
                     )
                 )
-            else:
-                fsrs_card_db.due_date = fsrs_card.due
-                fsrs_card_db.fsrs_data = fsrs_card.to_dict()
+        return review_logs
+
+    def iter_review_history(
+        self, batch_size: int = 10000
+    ) -> Iterator[list[tuple[str, int, float]]]:
+        """Streams the whole review log ordered by card and review time.
+
+        Parameters
+        ----------
+        batch_size: int
+            Number of reviews in one batch.
+
+        Yields
+        ------
+        list[tuple[str, int, float]]
+            Batch of reviews as (card id, rating, review time) tuples,
+            the review time is in days (julian day number).
+        """
+        history_select = select(
+            FSRSReviewLogTable.card_id,
+            FSRSReviewLogTable.rating,
+            func.julianday(FSRSReviewLogTable.review_datetime),
+        ).order_by(
+            FSRSReviewLogTable.card_id,
+            FSRSReviewLogTable.review_datetime,
+            FSRSReviewLogTable.review_id,
+        )
+        with Session(self.engine) as session:
+            result = session.execute(
+                history_select, execution_options={"yield_per": batch_size}
+            )
+            for batch in result.partitions():
+                yield [(card_id, rating, days) for card_id, rating, days in batch]
+
+    def get_fsrs_page(
+        self, after_card_id: Optional[str], page_size: int
+    ) -> dict[str, fsrs.Card]:
+        """Returns one page of FSRS data ordered by card id.
+
+        Parameters
+        ----------
+        after_card_id: Optional[str]
+            The page starts after this card id, None for the first page.
+        page_size: int
+            Maximum number of cards in the page.
+
+        Returns
+        -------
+        dict[str, fsrs.Card]
+            FSRS data by card id, empty if there are no more cards.
+        """
+        page_select = select(FSRSTable.card_id, FSRSTable.fsrs_data)
+        if after_card_id is not None:
+            page_select = page_select.where(FSRSTable.card_id > after_card_id)
+        page_select = page_select.order_by(FSRSTable.card_id).limit(page_size)
+        with Session(self.engine) as session:
+            return {
+                card_id: fsrs.Card.from_dict(fsrs_data)
+                for card_id, fsrs_data in session.execute(page_select)
+            }
+
+    def update_fsrs_cards(self, fsrs_cards: dict[str, fsrs.Card]) -> None:
+        """Updates FSRS data of existing cards in one transaction.
+
+        Parameters
+        ----------
+        fsrs_cards: dict[str, fsrs.Card]
+            New FSRS data by card id.
+        """
+        if not fsrs_cards:
+            return
+        logging.info(f"Updating FSRS data of {len(fsrs_cards)} cards")
+        with Session(self.engine) as session:
+            session.execute(
+                update(FSRSTable),
+                [
+                    {"card_id": card_id, **get_fsrs_columns(fsrs_card)}
+                    for card_id, fsrs_card in fsrs_cards.items()
+                ],
+            )
             session.commit()
+        self.fsrs_data_changed()
 
     def delete_card_fsrs(self, card_id: str) -> None:
         """Deletes FSRS data for a card id."""
@@ -72,6 +417,7 @@ class FSRSManager(DbManagerBase):
                 raise ValueError(f"FSRS card with id {card_id} not found")
             session.delete(fsrs_card_db)
             session.commit()
+        self.fsrs_data_changed()
 
     def get_fsrs_num_due_cards(self) -> int:
         """Get number of all cards with due date in the past."""
@@ -111,16 +457,12 @@ class FSRSManager(DbManagerBase):
 
         with Session(self.engine) as session:
             fsrs_db = [
-                FSRSTable(
-                    card_id=fsrs_id,
-                    due_date=fsrs_card.due,
-                    fsrs_data=fsrs_card.to_dict(),
-                )
+                FSRSTable(card_id=fsrs_id, **get_fsrs_columns(fsrs_card))
                 for fsrs_id, fsrs_card in fsrs_data.items()
             ]
             session.add_all(fsrs_db)
-
-            session
+            session.commit()
+        self.fsrs_data_changed()
 
     def get_num_due_by_date(self, date: datetime) -> int:
         """Gets number of all cards with due date in the past."""
@@ -131,3 +473,32 @@ class FSRSManager(DbManagerBase):
                 .scalar()
             )
         return due_cards_count
+
+    def get_num_due_by_day(self, start: datetime) -> dict[int, int]:
+        """Gets number of cards becoming due on each day.
+
+        Parameters
+        ----------
+        start: datetime
+            Start of the first day, typically start of the current day.
+
+        Returns
+        -------
+        dict[int, int]
+            Number of cards by day, 0 is the day starting at start.
+            Cards due before start are not included.
+        """
+        start_naive = to_db_datetime(start)
+        day = cast(
+            func.julianday(FSRSTable.due_date) - func.julianday(start_naive), Integer
+        )
+        day_select = (
+            select(day, func.count(FSRSTable.card_id))
+            .where(FSRSTable.due_date >= start_naive)
+            .group_by(day)
+        )
+        with Session(self.engine) as session:
+            return {
+                day_index: num_cards
+                for day_index, num_cards in session.execute(day_select)
+            }
@@ -1,14 +1,18 @@
 """Database functionality for learning data."""
 
+import logging
 from datetime import datetime, timezone, timedelta
+from typing import Optional
 
-from sqlalchemy import select, func
+import fsrs
+from sqlalchemy import select, func, cast, Integer
 from sqlalchemy.orm import Session
 
 from .db_schema import (
     TestCardsTable,
     FSRSTable,
     RecentMistakesTable,
+    CardSourceLinkTable,
 )
 from .db_sources import SourceManager
 from .db_fsrs import FSRSManager
@@ -32,18 +36,12 @@ class DbManager(SourceManager, FSRSManager, TestEntryManager, MistakesManager):
         Oldest cards are first.
         """
         with Session(self.engine) as session:
-            fsrs_select = (
-                select(FSRSTable.card_id)
+            card_select = (
+                select(TestCardsTable)
+                .join(FSRSTable, FSRSTable.card_id == TestCardsTable.card_id)
                 .filter(FSRSTable.due_date <= datetime.now(timezone.utc))
                 .order_by(FSRSTable.due_date)
             )
-            if filter.num_cards is not None and filter.num_cards > 0:
-                fsrs_select.limit(filter.num_cards)
-            fsrs_ids = [card_id for card_id in session.scalars(fsrs_select)]
-
-            card_select = select(TestCardsTable).filter(
-                TestCardsTable.card_id.in_(fsrs_ids)
-            )
             card_select = self.apply_card_filter_select(card_select, filter)
             return self.generate_cards_from_scalar(session.scalars(card_select))
 
@@ -54,13 +52,10 @@ class DbManager(SourceManager, FSRSManager, TestEntryManager, MistakesManager):
         filter.start_index = None
 
         with Session(self.engine) as session:
-            fsrs_select = select(FSRSTable.card_id).filter(
-                FSRSTable.due_date <= datetime.now(timezone.utc)
-            )
-            fsrs_ids = [card_id for card_id in session.scalars(fsrs_select)]
-
-            cards_select = select(TestCardsTable).filter(
-                TestCardsTable.card_id.in_(fsrs_ids)
+            cards_select = (
+                select(TestCardsTable.card_id)
+                .join(FSRSTable, FSRSTable.card_id == TestCardsTable.card_id)
+                .filter(FSRSTable.due_date <= datetime.now(timezone.utc))
             )
             cards_select = self.apply_card_filter_select(cards_select, filter)
 
@@ -72,6 +67,140 @@ class DbManager(SourceManager, FSRSManager, TestEntryManager, MistakesManager):
 
             return num_cards
 
+    def get_fsrs_state_counts(
+        self, filter: Optional[CardFilter] = None
+    ) -> dict[str, int]:
+        """Counts studied cards in each FSRS state.
+
+        Parameters
+        ----------
+        filter: Optional[CardFilter]
+            Card filter to limit the counted cards.
+
+        Returns
+        -------
+        dict[str, int]
+            Number of cards by FSRS state name (Learning, Review, Relearning).
+        """
+        state_select = select(FSRSTable.state, func.count(FSRSTable.card_id)).group_by(
+            FSRSTable.state
+        )
+        if filter is not None:
+            filter = filter.model_copy(update={"num_cards": None, "start_index": None})
+            state_select = self.apply_card_filter_select(
+                state_select.join(
+                    TestCardsTable, TestCardsTable.card_id == FSRSTable.card_id
+                ),
+                filter,
+            )
+
+        state_counts: dict[str, int] = {state.name: 0 for state in fsrs.State}
+        with Session(self.engine) as session:
+            for state, num_cards in session.execute(state_select):
+                if state is None:
+                    logging.warning(f"{num_cards} FSRS entries without state")
+                    continue
+                state_counts[fsrs.State(state).name] = num_cards
+
+        return state_counts
+
+    def get_fsrs_stability_by_source(self) -> dict[str, float]:
+        """Gets average FSRS stability of studied cards for each card source.
+
+        Returns
+        -------
+        dict[str, float]
+            Average stability in days by source id,
+            sources without studied cards are not included.
+        """
+        stability_select = (
+            select(CardSourceLinkTable.source_id, func.avg(FSRSTable.stability))
+            .join(FSRSTable, FSRSTable.card_id == CardSourceLinkTable.card_id)
+            .filter(FSRSTable.stability != None)  # noqa: E711
+            .group_by(CardSourceLinkTable.source_id)
+        )
+        with Session(self.engine) as session:
+            return {
+                source_id: float(avg_stability)
+                for source_id, avg_stability in session.execute(stability_select)
+            }
+
+    def get_due_forecast(
+        self,
+        start: datetime,
+        num_days: int,
+        bucket_days: int = 1,
+        filter: Optional[CardFilter] = None,
+    ) -> dict[int, int]:
+        """Counts cards that will become due in the upcoming days.
+
+        The cards are counted in one grouped query, each bucket
+        covers `bucket_days` days starting from the `start`.
+        Cards that are already due are not counted.
+
+        Parameters
+        ----------
+        start: datetime
+            Start of the first bucket (UTC), typically start of the current day.
+        num_days: int
+            Number of days after the first day to include in the forecast.
+        bucket_days: int
+            Number of days grouped in one bucket.
+        filter: Optional[CardFilter]
+            Card filter to limit the counted cards.
+
+        Returns
+        -------
+        dict[int, int]
+            Number of cards becoming due in each bucket, keys are bucket indexes.
+
+        Raises
+        ------
+        ValueError
+            If the number of days or the bucket size are not valid.
+        """
+        if num_days < 0:
+            raise ValueError(f"Number of days must not be negative, got {num_days}")
+        if bucket_days < 1:
+            raise ValueError(f"Bucket size must be at least 1 day, got {bucket_days}")
+
+        # the forecast includes the whole last day
+        num_buckets = (num_days + bucket_days) // bucket_days
+        # due dates are stored in UTC without timezone
+        start_naive = start.astimezone(timezone.utc).replace(tzinfo=None)
+        end_naive = start_naive + timedelta(days=num_buckets * bucket_days)
+
+        bucket = cast(
+            (func.julianday(FSRSTable.due_date) - func.julianday(start_naive))
+            / bucket_days,
+            Integer,
+        )
+        forecast_select = (
+            select(bucket, func.count(FSRSTable.card_id))
+            .filter(
+                FSRSTable.due_date > datetime.now(timezone.utc),
+                FSRSTable.due_date < end_naive,
+            )
+            .group_by(bucket)
+        )
+        if filter is not None:
+            # the limits would limit the buckets, not the cards
+            filter = filter.model_copy(update={"num_cards": None, "start_index": None})
+            forecast_select = self.apply_card_filter_select(
+                forecast_select.join(
+                    TestCardsTable, TestCardsTable.card_id == FSRSTable.card_id
+                ),
+                filter,
+            )
+
+        forecast: dict[int, int] = {index: 0 for index in range(num_buckets)}
+        with Session(self.engine) as session:
+            for bucket_index, num_cards in session.execute(forecast_select):
+                if bucket_index in forecast:
+                    forecast[bucket_index] = num_cards
+
+        return forecast
+
     def get_studied_cards(self, filter: CardFilter) -> list[TestCardTypes]:
         """Gets already studied cards, but ignoring current due status.
 
@@ -93,6 +222,31 @@ class DbManager(SourceManager, FSRSManager, TestEntryManager, MistakesManager):
 
             return self.generate_cards_from_scalar(session.scalars(studied_select))
 
+    def get_studied_card_ids(self, filter: CardFilter) -> list[str]:
+        """Gets ids of all studied cards matching the filter.
+
+        The number of cards and start index in the filter are ignored.
+
+        Parameters
+        ----------
+        filter: CardFilter
+            Card filter to select cards.
+
+        Returns
+        -------
+        list[str]
+            Ids of studied cards matching the filter.
+        """
+        filter = filter.model_copy(update={"num_cards": None, "start_index": None})
+        with Session(self.engine) as session:
+            studied_select = self.apply_card_filter_select(
+                select(TestCardsTable.card_id).join(
+                    FSRSTable, FSRSTable.card_id == TestCardsTable.card_id
+                ),
+                filter,
+            )
+            return list(session.scalars(studied_select))
+
     def get_num_studied_cards(self, filter: CardFilter) -> int:
         """Gets number of studied cards matching the filter.
 
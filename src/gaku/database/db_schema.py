@@ -11,6 +11,7 @@ from sqlalchemy import (
     create_engine,
     DateTime,
     Integer,
+    Float,
     Index,
 )
 from sqlalchemy.orm import (
@@ -27,6 +28,8 @@ class TableNames(Enum):
     CARD_SOURCE_LINK = "card_source_link"
     TEST_CARDS = "test_cards"
     FSRS = "fsrs"
+    FSRS_REVIEW_LOG = "fsrs_review_log"
+    EXTRA_QUESTIONS = "extra_questions"
 
 
 class Base(DeclarativeBase):
@@ -120,6 +123,67 @@ class FSRSTable(Base):
     due_date: Mapped[datetime] = mapped_column(DateTime(timezone=False), index=True)
     fsrs_data: Mapped[dict] = mapped_column(type_=JSON)
 
+    # copy of the fsrs_data fields, so they can be used in queries
+    state: Mapped[Optional[int]] = mapped_column(Integer, index=True)
+    step: Mapped[Optional[int]] = mapped_column(Integer)
+    stability: Mapped[Optional[float]] = mapped_column(Float, index=True)
+    difficulty: Mapped[Optional[float]] = mapped_column(Float)
+    last_review: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=False), index=True
+    )
+
+
+class FSRSReviewLogTable(Base):
+    """Append only log of FSRS reviews.
+
+    Each review adds new row with the rating and FSRS state of the card before the review.
+    """
+
+    __tablename__ = TableNames.FSRS_REVIEW_LOG.value
+
+    review_id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, autoincrement=True
+    )
+    card_id: Mapped[str] = mapped_column(
+        ForeignKey(f"{TableNames.TEST_CARDS.value}.card_id"),
+    )
+    rating: Mapped[int] = mapped_column(Integer)
+    review_datetime: Mapped[datetime] = mapped_column(
+        DateTime(timezone=False), index=True
+    )
+    # duration of the review in milliseconds
+    review_duration: Mapped[Optional[int]]
+
+    # FSRS state of the card before the review
+    prior_state: Mapped[Optional[int]]
+    prior_step: Mapped[Optional[int]]
+    prior_stability: Mapped[Optional[float]] = mapped_column(Float)
+    prior_difficulty: Mapped[Optional[float]] = mapped_column(Float)
+    prior_last_review: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=False)
+    )
+
+    __table_args__ = (
+        Index("idx_review_log_card_datetime", "card_id", "review_datetime"),
+    )
+
+
+class ExtraQuestionsTable(Base):
+    """Extra questions of cards created from other cards and the dictionary.
+
+    E.g. kanji meanings question for vocabulary is created from the kanji cards.
+    Empty list means the card has no extra questions. The row is deleted
+    when the card or a card the questions were created from changes.
+    """
+
+    __tablename__ = TableNames.EXTRA_QUESTIONS.value
+
+    card_id: Mapped[str] = mapped_column(
+        ForeignKey(f"{TableNames.TEST_CARDS.value}.card_id"),
+        primary_key=True,
+    )
+    questions: Mapped[list] = mapped_column(type_=JSON)
+
 
 class RecentMistakesTable(Base):
     """Table recording recent mistakes."""
@@ -143,7 +207,14 @@ class DbManagerBase:
         self.connection_uri = connection_uri
         debug = False
         self.engine = create_engine(connection_uri, echo=debug)
+        # incremented on every change of FSRS data
+        # used to find out if cached statistics are still valid
+        self.fsrs_data_version = 0
 
     def create_database(self) -> None:
         """Creates database."""
         Base.metadata.create_all(self.engine)
+
+    def fsrs_data_changed(self) -> None:
+        """Marks FSRS data as changed, invalidating cached statistics."""
+        self.fsrs_data_version += 1
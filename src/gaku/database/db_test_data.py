@@ -7,15 +7,20 @@ from pathlib import Path
 
 from sqlalchemy import (
     select,
+    delete,
+    or_,
     Integer,
     func,
     cast,
+    column,
+    values,
     String,
     Select,
 )
 from sqlalchemy.orm import (
     Session,
 )
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.engine import ScalarResult
 
 
@@ -24,11 +29,20 @@ from .db_schema import (
     CardSourceTable,
     CardSourceLinkTable,
     TestCardsTable,
+    FSRSReviewLogTable,
     FSRSTable,
+    ExtraQuestionsTable,
 )
 from ..api_types import CardFilter, CardSourceLink
 from .. import card_types
 
+# maximum number of card ids in one IN query
+CARD_QUERY_CHUNK_SIZE = 500
+# maximum number of kanji in one query for invalidation of extra questions
+KANJI_QUERY_CHUNK_SIZE = 100
+# maximum number of source links in one insert, each link uses 3 parameters
+LINK_INSERT_CHUNK_SIZE = 300
+
 
 class TestEntryManager(DbManagerBase):
     """Test data database manager."""
@@ -72,6 +86,7 @@ class TestEntryManager(DbManagerBase):
                     )
                 )
             session.add_all(cards_db)
+            self.invalidate_extra_questions(session, [], get_kanji_keys(cards))
 
             session.commit()
 
@@ -243,6 +258,13 @@ class TestEntryManager(DbManagerBase):
                 raise ValueError(
                     f"Card type {card.card_type.value} does not match the card type in the database {card_db.card_type}"
                 )
+            # the questions could be created from the old or the new card
+            self.invalidate_extra_questions(
+                session,
+                [card.card_id],
+                get_kanji_keys([card])
+                + ([card_db.key] if isinstance(card, card_types.KanjiCard) else []),
+            )
             card_db.key = card_key
             # card_db.dictionary_id = card.dictionary_id
             card_db.data = card.model_dump(mode="json")
@@ -250,7 +272,7 @@ class TestEntryManager(DbManagerBase):
 
     def delete_card(self, card_id: str) -> None:
         """Deletes a card with specified card id.
-        Also removes attached source links and FSRS data.
+        Also removes attached source links, FSRS data and review log.
         """
         with Session(self.engine) as session:
             # delete card
@@ -261,6 +283,15 @@ class TestEntryManager(DbManagerBase):
             )
             if card_db is None:
                 raise ValueError(f"Card with id {card_id} not found")
+            self.invalidate_extra_questions(
+                session,
+                [card_id],
+                (
+                    [card_db.key]
+                    if card_db.card_type == card_types.CardType.KANJI.value
+                    else []
+                ),
+            )
             session.delete(card_db)
 
             # delete card source links
@@ -270,8 +301,111 @@ class TestEntryManager(DbManagerBase):
 
             # delete fsrs data
             session.query(FSRSTable).filter(FSRSTable.card_id == card_id).delete()
+            session.query(FSRSReviewLogTable).filter(
+                FSRSReviewLogTable.card_id == card_id
+            ).delete()
 
             session.commit()
+        self.fsrs_data_changed()
+
+    def get_extra_questions(
+        self, card_ids: List[str]
+    ) -> dict[str, list[card_types.TestQuestion]]:
+        """Returns stored extra questions of the cards.
+
+        Parameters
+        ----------
+        card_ids: List[str]
+            Ids of the cards.
+
+        Returns
+        -------
+        dict[str, list[card_types.TestQuestion]]
+            Extra questions by card id, cards without stored questions are missing.
+        """
+        extra_questions: dict[str, list[card_types.TestQuestion]] = {}
+        with Session(self.engine) as session:
+            for chunk_start in range(0, len(card_ids), CARD_QUERY_CHUNK_SIZE):
+                chunk = card_ids[chunk_start : chunk_start + CARD_QUERY_CHUNK_SIZE]
+                for row in session.scalars(
+                    select(ExtraQuestionsTable).where(
+                        ExtraQuestionsTable.card_id.in_(chunk)
+                    )
+                ):
+                    extra_questions[row.card_id] = [
+                        card_types.TestQuestion.model_validate(question)
+                        for question in row.questions
+                    ]
+        return extra_questions
+
+    def store_extra_questions(
+        self, extra_questions: dict[str, list[card_types.TestQuestion]]
+    ) -> None:
+        """Stores extra questions of the cards, replacing the stored questions.
+
+        Parameters
+        ----------
+        extra_questions: dict[str, list[card_types.TestQuestion]]
+            Extra questions by card id, empty list if the card has none.
+        """
+        card_ids = list(extra_questions)
+        with Session(self.engine) as session:
+            for chunk_start in range(0, len(card_ids), CARD_QUERY_CHUNK_SIZE):
+                chunk = card_ids[chunk_start : chunk_start + CARD_QUERY_CHUNK_SIZE]
+                session.execute(
+                    delete(ExtraQuestionsTable).where(
+                        ExtraQuestionsTable.card_id.in_(chunk)
+                    )
+                )
+            session.add_all(
+                ExtraQuestionsTable(
+                    card_id=card_id,
+                    questions=[
+                        question.model_dump(mode="json") for question in questions
+                    ],
+                )
+                for card_id, questions in extra_questions.items()
+            )
+            session.commit()
+
+    def invalidate_extra_questions(
+        self, session: Session, card_ids: List[str], kanji_keys: List[str]
+    ) -> None:
+        """Deletes extra questions which could be created from changed cards.
+
+        Parameters
+        ----------
+        session: Session
+            Session in which the cards are changed.
+        card_ids: List[str]
+            Ids of the changed cards.
+        kanji_keys: List[str]
+            Kanji of the changed kanji cards, extra questions of vocabulary
+            containing them are deleted.
+        """
+        for chunk_start in range(0, len(card_ids), CARD_QUERY_CHUNK_SIZE):
+            chunk = card_ids[chunk_start : chunk_start + CARD_QUERY_CHUNK_SIZE]
+            session.execute(
+                delete(ExtraQuestionsTable).where(
+                    ExtraQuestionsTable.card_id.in_(chunk)
+                )
+            )
+        for chunk_start in range(0, len(kanji_keys), KANJI_QUERY_CHUNK_SIZE):
+            chunk = kanji_keys[chunk_start : chunk_start + KANJI_QUERY_CHUNK_SIZE]
+            vocab_ids = select(TestCardsTable.card_id).where(
+                TestCardsTable.card_type == card_types.CardType.VOCABULARY.value,
+                or_(
+                    *[
+                        TestCardsTable.key.contains(key, autoescape=True)
+                        for key in chunk
+                    ]
+                ),
+            )
+            session.execute(
+                delete(ExtraQuestionsTable).where(
+                    ExtraQuestionsTable.card_id.in_(vocab_ids)
+                )
+            )
 
     def get_card_source_link_highest_position(self, card_source_id: str) -> int:
         """Returns highest position of a card."""
@@ -338,6 +472,28 @@ class TestEntryManager(DbManagerBase):
             )
             return [card_types.VocabCard(**card.data) for card in cards]
 
+    def get_vocab_entries_by_keys(
+        self, keys: List[str]
+    ) -> dict[str, List[card_types.VocabCard]]:
+        """Returns Vocab cards for the keys, by their key.
+
+        Keys not found in the database are skipped.
+        """
+        cards: dict[str, List[card_types.VocabCard]] = {}
+        with Session(self.engine) as session:
+            for chunk_start in range(0, len(keys), CARD_QUERY_CHUNK_SIZE):
+                chunk = keys[chunk_start : chunk_start + CARD_QUERY_CHUNK_SIZE]
+                cards_select = select(TestCardsTable).where(
+                    TestCardsTable.key.in_(chunk),
+                    TestCardsTable.card_type == card_types.CardType.VOCABULARY.value,
+                )
+                for card_db in session.scalars(cards_select):
+                    cards.setdefault(card_db.key, []).append(
+                        card_types.VocabCard(**card_db.data)
+                    )
+
+        return cards
+
     def get_vocab_entry_by_dictionary_id(
         self, vocab: str, dictionary_id: Optional[int] = None
     ) -> Optional[card_types.VocabCard]:
@@ -402,6 +558,31 @@ class TestEntryManager(DbManagerBase):
 
             return card_types.create_card_from_json(card_data)
 
+    def get_cards_by_keys(
+        self, keys: List[str], card_type: card_types.CardType
+    ) -> dict[str, card_types.TestCardTypes]:
+        """Returns cards of the card type for the keys, by their key.
+
+        Keys not found in the database are skipped.
+        """
+        cards: dict[str, card_types.TestCardTypes] = {}
+        with Session(self.engine) as session:
+            for chunk_start in range(0, len(keys), CARD_QUERY_CHUNK_SIZE):
+                chunk = keys[chunk_start : chunk_start + CARD_QUERY_CHUNK_SIZE]
+                cards_select = select(TestCardsTable).where(
+                    TestCardsTable.key.in_(chunk),
+                    TestCardsTable.card_type == card_type.value,
+                )
+                for card_db in session.scalars(cards_select):
+                    card_data = card_db.data
+                    if card_db.data["card_type"] == card_types.CardType.MULTI_CARD:
+                        card_data = self.get_multi_card_data(card_db.data)
+                    cards.setdefault(
+                        card_db.key, card_types.create_card_from_json(card_data)
+                    )
+
+        return cards
+
     def get_card_by_card_id(self, card_id: str) -> Optional[card_types.TestCardTypes]:
         """Returns card for a specified card id."""
         with Session(self.engine) as session:
@@ -418,6 +599,41 @@ class TestEntryManager(DbManagerBase):
 
             return card_types.create_card_from_json(card_data)
 
+    def get_cards_by_ids(self, card_ids: List[str]) -> List[card_types.TestCardTypes]:
+        """Returns cards for specified card ids in the same order.
+
+        Card ids not found in the database are skipped.
+        """
+        cards: dict[str, card_types.TestCardTypes] = {}
+        with Session(self.engine) as session:
+            for chunk_start in range(0, len(card_ids), CARD_QUERY_CHUNK_SIZE):
+                chunk = card_ids[chunk_start : chunk_start + CARD_QUERY_CHUNK_SIZE]
+                cards_select = select(TestCardsTable).where(
+                    TestCardsTable.card_id.in_(chunk)
+                )
+                for card in self.generate_cards_from_scalar(
+                    session.scalars(cards_select)
+                ):
+                    cards[card.card_id] = card
+
+        return [cards[card_id] for card_id in card_ids if card_id in cards]
+
+    def get_existing_card_ids(self, card_ids: List[str]) -> set[str]:
+        """Returns the card ids that are in the database, one query per chunk."""
+        existing_card_ids: set[str] = set()
+        with Session(self.engine) as session:
+            for chunk_start in range(0, len(card_ids), CARD_QUERY_CHUNK_SIZE):
+                chunk = card_ids[chunk_start : chunk_start + CARD_QUERY_CHUNK_SIZE]
+                existing_card_ids.update(
+                    session.scalars(
+                        select(TestCardsTable.card_id).where(
+                            TestCardsTable.card_id.in_(chunk)
+                        )
+                    )
+                )
+
+        return existing_card_ids
+
     def get_card_source_ids(self, card_id: str) -> List[str]:
         """Provides list of source ids for a card."""
         with Session(self.engine) as session:
@@ -487,42 +703,65 @@ class TestEntryManager(DbManagerBase):
                     )
                 )
             session.add_all(cards_db)
+            self.invalidate_extra_questions(session, [], get_kanji_keys(cards))
             session.commit()
 
     def add_card_source_links(self, source_links: list[CardSourceLink]) -> None:
-        """Batch inserts card source links into the database."""
-        logging.info(f"Batch add source links: {source_links}")
-        with Session(self.engine) as session:
-            # dict[source_id, highest position]
-            positions: dict[str, int] = {}
-            new_links = []
-            for link in source_links:
-                exists = session.scalar(
-                    select(CardSourceLinkTable.card_id)
-                    .where(CardSourceLinkTable.card_id == link.card_id)
-                    .where(CardSourceLinkTable.source_id == link.source_id)
-                )
-                logging.info(f"Exists: {exists}")
-                if exists is None:
-                    if link.source_id not in positions:
-                        highest_position = self.get_card_source_link_highest_position(
-                            link.source_id
-                        )
-                        positions[link.source_id] = highest_position
+        """Batch inserts card source links into the database.
 
-                    positions[link.source_id] += 1
-                    logging.info(
-                        f"Adding new source link {link.source_id} for card:{link.card_id}"
+        Existing links are skipped. The new links of each source get positions
+        after the highest position of the source, in the order of the list.
+        The positions are assigned by the insert statement, so each chunk
+        of links is inserted with one statement.
+        """
+        logging.info(f"Batch add {len(source_links)} source links")
+        # duplicate links would leave gaps in the positions
+        unique_links = list(
+            dict.fromkeys((link.card_id, link.source_id) for link in source_links)
+        )
+        with Session(self.engine) as session:
+            for chunk_start in range(0, len(unique_links), LINK_INSERT_CHUNK_SIZE):
+                chunk = unique_links[chunk_start : chunk_start + LINK_INSERT_CHUNK_SIZE]
+                new_links = (
+                    values(
+                        column("link_order", Integer),
+                        column("card_id", String),
+                        column("source_id", String),
+                        name="new_links",
                     )
-                    new_links.append(
-                        CardSourceLinkTable(
-                            position=positions[link.source_id],
-                            card_id=link.card_id,
-                            source_id=link.source_id,
-                        )
+                    .data(
+                        [
+                            (link_order, card_id, source_id)
+                            for link_order, (card_id, source_id) in enumerate(chunk)
+                        ]
                     )
-
-            session.add_all(new_links)
+                    .cte("new_links")
+                )
+                highest_position = (
+                    select(func.max(CardSourceLinkTable.position))
+                    .where(CardSourceLinkTable.source_id == new_links.c.source_id)
+                    .scalar_subquery()
+                )
+                link_exists = (
+                    select(CardSourceLinkTable.card_id)
+                    .where(CardSourceLinkTable.card_id == new_links.c.card_id)
+                    .where(CardSourceLinkTable.source_id == new_links.c.source_id)
+                    .exists()
+                )
+                links_select = select(
+                    func.coalesce(highest_position, 0)
+                    + func.row_number().over(
+                        partition_by=new_links.c.source_id,
+                        order_by=new_links.c.link_order,
+                    ),
+                    new_links.c.card_id,
+                    new_links.c.source_id,
+                ).where(~link_exists)
+                session.execute(
+                    sqlite_insert(CardSourceLinkTable)
+                    .from_select(["position", "card_id", "source_id"], links_select)
+                    .on_conflict_do_nothing()
+                )
             session.commit()
 
     def apply_card_filter_select(
@@ -589,3 +828,8 @@ class TestEntryManager(DbManagerBase):
                 raise RuntimeError("Could not count the cards")
 
         return num_cards
+
+
+def get_kanji_keys(cards: Sequence[card_types.TestCardTypes]) -> List[str]:
+    """Provides keys of the kanji cards, used to find the linked vocabulary."""
+    return [card.writing for card in cards if isinstance(card, card_types.KanjiCard)]
@@ -30,6 +30,8 @@ from .card_types import OnomatopoeiaCard, OnomatopoeiaDefinition
 
 # new style Union using a pipe operator
 json_list = list[int] | list[str]
+# maximum number of values in one IN query, sqlite limits the number of parameters
+DICTIONARY_QUERY_CHUNK_SIZE = 500
 
 
 class DictionaryTableNames(Enum):
@@ -310,6 +312,42 @@ class DictionaryManager:
                 position_r=entry.position_r,
             )
 
+    def get_radicals_by_ids(self, radical_ids: list[int]) -> dict[int, Radical]:
+        """Gets radicals by radical ids with one query.
+
+        Parameters
+        ----------
+        radical_ids: list[int]
+            Radical ids to search for.
+
+        Returns
+        -------
+        dict[int, Radical]
+            The found Radical objects by their id.
+        """
+        if not radical_ids:
+            return {}
+
+        with Session(self.engine) as session:
+            entries = session.scalars(
+                select(RadicalDictionaryTable).where(
+                    RadicalDictionaryTable.id.in_(radical_ids)
+                )
+            )
+            return {
+                entry.id: Radical(
+                    id=entry.id,
+                    stroke=entry.stroke,
+                    radical=entry.radical,
+                    meaning=entry.meaning,
+                    reading_j=entry.reading_j,
+                    reading_r=entry.reading_r,
+                    position_j=entry.position_j,
+                    position_r=entry.position_r,
+                )
+                for entry in entries
+            }
+
     def get_num_radicals(self) -> int:
         """Get number of radicals in database.
 
@@ -364,6 +402,47 @@ class DictionaryManager:
                 nanori=kanji.nanori,
             )
 
+    def get_kanji_by_characters(self, characters: list[str]) -> dict[str, Kanji]:
+        """Gets kanji by characters with one query per chunk of characters.
+
+        Parameters
+        ----------
+        characters: list[str]
+            Kanji characters to search for.
+
+        Returns
+        -------
+        dict[str, Kanji]
+            The found Kanji objects by their character.
+        """
+        kanji_by_character: dict[str, Kanji] = {}
+        with Session(self.engine) as session:
+            for chunk_start in range(0, len(characters), DICTIONARY_QUERY_CHUNK_SIZE):
+                chunk = characters[
+                    chunk_start : chunk_start + DICTIONARY_QUERY_CHUNK_SIZE
+                ]
+                for kanji in session.scalars(
+                    select(KanjiDictionaryTable).where(
+                        KanjiDictionaryTable.literal.in_(chunk)
+                    )
+                ):
+                    kanji_by_character[kanji.literal] = Kanji(
+                        literal=kanji.literal,
+                        codepoints=kanji.codepoints,
+                        ucs_codepoint=kanji.ucs_codepoint,
+                        radicals=kanji.radicals,
+                        grade=kanji.grade,
+                        stroke_count=kanji.stroke_count,
+                        variants=kanji.variants,
+                        frequency=kanji.frequency,
+                        radical_names=kanji.radical_names,
+                        jlpt=kanji.jlpt,
+                        meanings=kanji.meanings,
+                        readings=kanji.readings,
+                        nanori=kanji.nanori,
+                    )
+        return kanji_by_character
+
     def get_vocabulary_by_id(self, dictionary_id: int) -> Optional[DictionaryEntry]:
         """Get vocabulary by dictionary id.
 
@@ -494,6 +573,169 @@ class DictionaryManager:
 
             return self.create_vocab_list(entries)
 
+    def get_vocabulary_by_ids(
+        self, dictionary_ids: list[int]
+    ) -> dict[int, DictionaryEntry]:
+        """Gets vocabulary entries by dictionary ids.
+
+        The writings and meanings of all the entries are read with
+        a few queries per chunk of ids instead of queries per entry.
+
+        Parameters
+        ----------
+        dictionary_ids: list[int]
+            Ids of the dictionary entries.
+
+        Returns
+        -------
+        dict[int, DictionaryEntry]
+            The found entries by their dictionary id.
+        """
+        entries: dict[int, DictionaryEntry] = {}
+        with Session(self.engine) as session:
+            for chunk_start in range(
+                0, len(dictionary_ids), DICTIONARY_QUERY_CHUNK_SIZE
+            ):
+                chunk = dictionary_ids[
+                    chunk_start : chunk_start + DICTIONARY_QUERY_CHUNK_SIZE
+                ]
+                for ent_seq in session.scalars(
+                    select(VocabDictionaryTable.ent_seq).where(
+                        VocabDictionaryTable.ent_seq.in_(chunk)
+                    )
+                ):
+                    entries[ent_seq] = DictionaryEntry(
+                        ent_seq=ent_seq,
+                        kanji_elements=[],
+                        reading_elements=[],
+                        meanings=[],
+                    )
+
+                for ent_seq, kanji_writing in session.execute(
+                    select(
+                        VocabKanjiWritingTable.ent_seq,
+                        VocabKanjiWritingTable.kanji_writing,
+                    )
+                    .where(VocabKanjiWritingTable.ent_seq.in_(chunk))
+                    .order_by(VocabKanjiWritingTable.id)
+                ):
+                    entries[ent_seq].kanji_elements.append(kanji_writing)
+
+                for ent_seq, kana_writing in session.execute(
+                    select(
+                        VocabKanaWritingTable.ent_seq,
+                        VocabKanaWritingTable.kana_writing,
+                    )
+                    .where(VocabKanaWritingTable.ent_seq.in_(chunk))
+                    .order_by(VocabKanaWritingTable.id)
+                ):
+                    entries[ent_seq].reading_elements.append(kana_writing)
+
+                # meanings of the meaning groups by the group id
+                meaning_groups: dict[int, VocabularyMeaning] = {}
+                for meanings_entry in session.scalars(
+                    select(VocabMeaningsTable)
+                    .where(VocabMeaningsTable.ent_seq.in_(chunk))
+                    .order_by(VocabMeaningsTable.id)
+                ):
+                    meaning_group = VocabularyMeaning(
+                        part_of_speech=meanings_entry.part_of_speech, meanings=[]
+                    )
+                    meaning_groups[meanings_entry.id] = meaning_group
+                    entries[meanings_entry.ent_seq].meanings.append(meaning_group)
+
+                for meanings_id, meaning in session.execute(
+                    select(VocabMeaningTable.meanings_id, VocabMeaningTable.meaning)
+                    .join(VocabMeaningsTable)
+                    .where(VocabMeaningsTable.ent_seq.in_(chunk))
+                    .order_by(VocabMeaningTable.id)
+                ):
+                    meaning_groups[meanings_id].meanings.append(meaning)
+
+        return entries
+
+    def get_vocabulary_by_kanji_writings(
+        self, writings: list[str]
+    ) -> dict[str, list[DictionaryEntry]]:
+        """Finds vocabulary entries for multiple kanji writings.
+
+        Batched version of get_vocabulary_by_kanji_writing.
+
+        Parameters
+        ----------
+        writings: list[str]
+            Kanji writings to search for.
+
+        Returns
+        -------
+        dict[str, list[DictionaryEntry]]
+            Matching entries by the writing, writings without entries are skipped.
+        """
+        entry_ids: dict[str, list[int]] = {}
+        with Session(self.engine) as session:
+            for chunk_start in range(0, len(writings), DICTIONARY_QUERY_CHUNK_SIZE):
+                chunk = writings[
+                    chunk_start : chunk_start + DICTIONARY_QUERY_CHUNK_SIZE
+                ]
+                for kanji_writing, ent_seq in session.execute(
+                    select(
+                        VocabKanjiWritingTable.kanji_writing,
+                        VocabKanjiWritingTable.ent_seq,
+                    )
+                    .where(VocabKanjiWritingTable.kanji_writing.in_(chunk))
+                    .order_by(VocabKanjiWritingTable.id)
+                ):
+                    entry_ids.setdefault(kanji_writing, []).append(ent_seq)
+
+        return self.get_vocabulary_for_writings(entry_ids)
+
+    def get_vocabulary_by_kana_writings(
+        self, readings: list[str]
+    ) -> dict[str, list[DictionaryEntry]]:
+        """Finds vocabulary entries for multiple kana writings.
+
+        Batched version of get_vocabulary_by_kana_writing.
+
+        Parameters
+        ----------
+        readings: list[str]
+            Kana writings to search for.
+
+        Returns
+        -------
+        dict[str, list[DictionaryEntry]]
+            Matching entries by the reading, readings without entries are skipped.
+        """
+        entry_ids: dict[str, list[int]] = {}
+        with Session(self.engine) as session:
+            for chunk_start in range(0, len(readings), DICTIONARY_QUERY_CHUNK_SIZE):
+                chunk = readings[
+                    chunk_start : chunk_start + DICTIONARY_QUERY_CHUNK_SIZE
+                ]
+                for kana_writing, ent_seq in session.execute(
+                    select(
+                        VocabKanaWritingTable.kana_writing,
+                        VocabKanaWritingTable.ent_seq,
+                    )
+                    .where(VocabKanaWritingTable.kana_writing.in_(chunk))
+                    .order_by(VocabKanaWritingTable.id)
+                ):
+                    entry_ids.setdefault(kana_writing, []).append(ent_seq)
+
+        return self.get_vocabulary_for_writings(entry_ids)
+
+    def get_vocabulary_for_writings(
+        self, entry_ids: dict[str, list[int]]
+    ) -> dict[str, list[DictionaryEntry]]:
+        """Reads the vocabulary entries for the entry ids of the writings."""
+        entries = self.get_vocabulary_by_ids(
+            list({ent_seq for ids in entry_ids.values() for ent_seq in ids})
+        )
+        return {
+            writing: [entries[ent_seq] for ent_seq in ids if ent_seq in entries]
+            for writing, ids in entry_ids.items()
+        }
+
     def get_vocabulary_by_meaning(self, meaning: str) -> list[DictionaryEntry]:
         """Finds vocabulary entries using provided meaning.
 
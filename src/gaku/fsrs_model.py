@@ -0,0 +1,102 @@
+"""Vectorized FSRS model.
+
+The functions compute the same values as the fsrs package scheduler, but for
+arrays of cards at once. The parameters can be one set of parameters
+or array of parameter sets with shape (number of sets, number of parameters),
+in which case the result has one row for each parameter set.
+"""
+
+import fsrs
+import numpy as np
+
+DECAY = fsrs.fsrs.DECAY
+FACTOR = fsrs.fsrs.FACTOR
+
+
+def weight(parameters: np.ndarray, index: int) -> np.ndarray:
+    """Returns a parameter in a shape which broadcasts with card arrays."""
+    return parameters[..., index : index + 1]
+
+
+def retrievability(elapsed_days: np.ndarray, stability: np.ndarray) -> np.ndarray:
+    """Probability of recall after elapsed days."""
+    return (1 + FACTOR * elapsed_days / stability) ** DECAY
+
+
+def next_interval(
+    stability: np.ndarray, desired_retention: float, maximum_interval: int
+) -> np.ndarray:
+    """Interval in days until the card is due for review."""
+    interval = np.round(stability / FACTOR * (desired_retention ** (1 / DECAY) - 1))
+    return np.clip(interval, 1, maximum_interval)
+
+
+def initial_stability(parameters: np.ndarray, rating: np.ndarray) -> np.ndarray:
+    """Stability after the first review."""
+    return np.maximum(parameters[..., rating - 1], 0.1)
+
+
+def initial_difficulty(parameters: np.ndarray, rating: np.ndarray) -> np.ndarray:
+    """Difficulty after the first review."""
+    return np.clip(
+        weight(parameters, 4) - np.exp(weight(parameters, 5) * (rating - 1)) + 1,
+        1.0,
+        10.0,
+    )
+
+
+def next_difficulty(
+    parameters: np.ndarray, difficulty: np.ndarray, rating: np.ndarray
+) -> np.ndarray:
+    """Difficulty after a review."""
+    easy_difficulty = initial_difficulty(parameters, np.array([fsrs.Rating.Easy.value]))
+    delta_difficulty = -weight(parameters, 6) * (rating - 3)
+    damped_difficulty = difficulty + (10.0 - difficulty) * delta_difficulty / 9.0
+    return np.clip(
+        weight(parameters, 7) * easy_difficulty
+        + (1 - weight(parameters, 7)) * damped_difficulty,
+        1.0,
+        10.0,
+    )
+
+
+def short_term_stability(
+    parameters: np.ndarray, stability: np.ndarray, rating: np.ndarray
+) -> np.ndarray:
+    """Stability after a review on the same day as the previous review."""
+    return stability * np.exp(
+        weight(parameters, 17) * (rating - 3 + weight(parameters, 18))
+    )
+
+
+def next_stability(
+    parameters: np.ndarray,
+    stability: np.ndarray,
+    difficulty: np.ndarray,
+    card_retrievability: np.ndarray,
+    rating: np.ndarray,
+) -> np.ndarray:
+    """Stability after a review on another day than the previous review."""
+    hard_penalty = np.where(
+        rating == fsrs.Rating.Hard.value, weight(parameters, 15), 1.0
+    )
+    easy_bonus = np.where(rating == fsrs.Rating.Easy.value, weight(parameters, 16), 1.0)
+    recall_stability = stability * (
+        1
+        + np.exp(weight(parameters, 8))
+        * (11 - difficulty)
+        * stability ** -weight(parameters, 9)
+        * (np.exp((1 - card_retrievability) * weight(parameters, 10)) - 1)
+        * hard_penalty
+        * easy_bonus
+    )
+    forget_stability = np.minimum(
+        weight(parameters, 11)
+        * difficulty ** -weight(parameters, 12)
+        * ((stability + 1) ** weight(parameters, 13) - 1)
+        * np.exp((1 - card_retrievability) * weight(parameters, 14)),
+        stability / np.exp(weight(parameters, 17) * weight(parameters, 18)),
+    )
+    return np.where(
+        rating == fsrs.Rating.Again.value, forget_stability, recall_stability
+    )
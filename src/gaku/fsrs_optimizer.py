@@ -0,0 +1,456 @@
+"""Optimization of FSRS scheduler parameters from the review log.
+
+The FSRS model is evaluated with NumPy for all reviews at once. The review
+histories of all cards are processed in lockstep - first reviews of all cards,
+then second reviews and so on - so the number of Python level iterations
+depends only on the length of the longest review history.
+"""
+
+import json
+import logging
+import math
+import multiprocessing
+import multiprocessing.queues
+from pathlib import Path
+from typing import Callable, Optional
+
+import fsrs
+import numpy as np
+
+from . import fsrs_model
+from .api_types import FSRSOptimizationStatus
+from .database.db_fsrs import FSRSManager
+
+# only the first reviews of each card are used, same as in fsrs package optimizer
+MAX_SEQUENCE_LENGTH = 64
+# with less reviews the optimized parameters are not reliable
+MIN_NUM_REVIEWS = 512
+
+NUM_ITERATIONS = 100
+LEARNING_RATE = 4e-2
+# approximate number of reviews in one mini batch
+MINI_BATCH_REVIEWS = 65536
+# number of iterations between evaluations of loss on all reviews
+EVALUATION_INTERVAL = 10
+# step used to compute the loss gradient by finite differences
+GRADIENT_STEP = 1e-5
+
+# minimal stability to avoid numerical issues
+STABILITY_MIN = 0.01
+# parameter bounds used by the fsrs package optimizer
+PARAMETERS_LOWER_BOUNDS = np.array(
+    [
+        STABILITY_MIN,
+        STABILITY_MIN,
+        STABILITY_MIN,
+        STABILITY_MIN,
+        1.0,
+        0.1,
+        0.1,
+        0.0,
+        0.0,
+        0.0,
+        0.01,
+        0.1,
+        0.01,
+        0.01,
+        0.01,
+        0.0,
+        1.0,
+        0.0,
+        0.0,
+    ]
+)
+PARAMETERS_UPPER_BOUNDS = np.array(
+    [
+        100.0,
+        100.0,
+        100.0,
+        100.0,
+        10.0,
+        4.0,
+        4.0,
+        0.75,
+        4.5,
+        0.8,
+        3.5,
+        5.0,
+        0.25,
+        0.9,
+        4.0,
+        1.0,
+        6.0,
+        2.0,
+        2.0,
+    ]
+)
+
+ProgressCallback = Callable[[int, int, float], None]
+
+
+class ReviewHistory:
+    """Review history of all cards prepared for vectorized computation.
+
+    The reviews are stored in step major order - first reviews of all cards,
+    then second reviews of cards with at least two reviews and so on. The cards
+    are ordered by number of reviews, so the cards reviewed in each step
+    are always the first cards.
+
+    Attributes
+    ----------
+    ratings: np.ndarray
+        FSRS rating of each review.
+    elapsed_days: np.ndarray
+        Number of whole days since previous review of the card,
+        -1 for the first reviews.
+    step_sizes: list[int]
+        Number of reviews in each step.
+    """
+
+    def __init__(
+        self, ratings: np.ndarray, elapsed_days: np.ndarray, step_sizes: list[int]
+    ) -> None:
+        self.ratings = ratings
+        self.elapsed_days = elapsed_days
+        self.step_sizes = step_sizes
+        # only reviews on another day than the previous review are used for loss
+        self.num_loss_reviews = int(np.count_nonzero(elapsed_days > 0))
+
+    @classmethod
+    def from_reviews(
+        cls, card_ids: np.ndarray, ratings: np.ndarray, review_days: np.ndarray
+    ) -> "ReviewHistory":
+        """Creates review history from reviews ordered by card and time.
+
+        Parameters
+        ----------
+        card_ids: np.ndarray
+            Id of the reviewed card for each review.
+        ratings: np.ndarray
+            FSRS rating of each review.
+        review_days: np.ndarray
+            Time of each review in days.
+
+        Returns
+        -------
+        ReviewHistory
+            Review history of the cards.
+        """
+        num_reviews = len(card_ids)
+        if num_reviews == 0:
+            return cls(np.empty(0, np.int64), np.empty(0), [])
+
+        new_card = np.empty(num_reviews, dtype=bool)
+        new_card[0] = True
+        new_card[1:] = card_ids[1:] != card_ids[:-1]
+        card_index = np.cumsum(new_card) - 1
+        card_starts = np.flatnonzero(new_card)
+        position = np.arange(num_reviews) - card_starts[card_index]
+
+        # julian days are floats, the tolerance avoids rounding down exact days
+        elapsed_days = np.floor(np.diff(review_days, prepend=review_days[0]) + 1e-6)
+        elapsed_days[new_card] = -1
+
+        used = position < MAX_SEQUENCE_LENGTH
+        card_index = card_index[used]
+        position = position[used]
+
+        # order the cards from the longest history so each step is a prefix
+        card_lengths = np.bincount(card_index)
+        card_rank = np.empty(len(card_lengths), dtype=np.int64)
+        card_rank[np.argsort(-card_lengths, kind="stable")] = np.arange(
+            len(card_lengths)
+        )
+        order = np.lexsort((card_rank[card_index], position))
+
+        return cls(
+            ratings=np.asarray(ratings)[used][order].astype(np.int64),
+            elapsed_days=elapsed_days[used][order],
+            step_sizes=np.bincount(position).tolist(),
+        )
+
+    @property
+    def num_cards(self) -> int:
+        """Number of cards in the history."""
+        return self.step_sizes[0] if self.step_sizes else 0
+
+    def select_cards(self, card_mask: np.ndarray) -> "ReviewHistory":
+        """Creates review history with only some of the cards.
+
+        Parameters
+        ----------
+        card_mask: np.ndarray
+            Boolean mask of the cards to keep, in the order of the cards
+            in this history (from the longest review history).
+
+        Returns
+        -------
+        ReviewHistory
+            Review history of the selected cards.
+        """
+        step_masks = [card_mask[:step_size] for step_size in self.step_sizes]
+        review_mask = np.concatenate(step_masks)
+        step_sizes = [int(np.count_nonzero(step_mask)) for step_mask in step_masks]
+        return ReviewHistory(
+            ratings=self.ratings[review_mask],
+            elapsed_days=self.elapsed_days[review_mask],
+            step_sizes=[step_size for step_size in step_sizes if step_size > 0],
+        )
+
+    @classmethod
+    def from_database(cls, db: FSRSManager) -> "ReviewHistory":
+        """Loads review history of all cards from the review log.
+
+        Parameters
+        ----------
+        db: FSRSManager
+            Database with the review log.
+
+        Returns
+        -------
+        ReviewHistory
+            Review history of the cards.
+        """
+        card_ids: list[np.ndarray] = []
+        ratings: list[np.ndarray] = []
+        review_days: list[np.ndarray] = []
+        for batch in db.iter_review_history():
+            batch_ids, batch_ratings, batch_days = zip(*batch)
+            card_ids.append(np.array(batch_ids, dtype=object))
+            ratings.append(np.array(batch_ratings, dtype=np.int64))
+            review_days.append(np.array(batch_days, dtype=np.float64))
+
+        if not card_ids:
+            return cls.from_reviews(np.empty(0, object), np.empty(0), np.empty(0))
+        return cls.from_reviews(
+            np.concatenate(card_ids),
+            np.concatenate(ratings),
+            np.concatenate(review_days),
+        )
+
+    def compute_loss(self, parameters: np.ndarray) -> np.ndarray:
+        """Computes the FSRS loss for one or more sets of parameters.
+
+        The loss is the mean binary cross entropy between the predicted
+        retrievability and whether the card was recalled, the same as
+        in the fsrs package optimizer.
+
+        Parameters
+        ----------
+        parameters: np.ndarray
+            FSRS parameters, either one set or array of parameter sets
+            with shape (number of sets, number of parameters).
+
+        Returns
+        -------
+        np.ndarray
+            Loss for each parameter set.
+        """
+        weights = np.atleast_2d(parameters)
+        num_sets = weights.shape[0]
+        total_loss = np.zeros(num_sets)
+        if self.num_loss_reviews == 0:
+            return total_loss
+
+        num_cards = self.step_sizes[0]
+        stability = np.empty((num_sets, num_cards))
+        difficulty = np.empty((num_sets, num_cards))
+
+        offset = 0
+        for step, step_size in enumerate(self.step_sizes):
+            rating = self.ratings[offset : offset + step_size]
+            if step == 0:
+                stability[:] = fsrs_model.initial_stability(weights, rating)
+                difficulty[:] = fsrs_model.initial_difficulty(weights, rating)
+                offset += step_size
+                continue
+
+            elapsed_days = self.elapsed_days[offset : offset + step_size]
+            offset += step_size
+            current_stability = stability[:, :step_size]
+            current_difficulty = difficulty[:, :step_size]
+
+            retrievability = fsrs_model.retrievability(elapsed_days, current_stability)
+
+            long_term = elapsed_days > 0
+            recalled = rating > fsrs.Rating.Again.value
+            predicted = np.clip(retrievability[:, long_term], 1e-7, 1 - 1e-7)
+            total_loss -= np.sum(
+                np.where(recalled[long_term], np.log(predicted), np.log(1 - predicted)),
+                axis=1,
+            )
+
+            next_stability = np.where(
+                long_term,
+                fsrs_model.next_stability(
+                    weights,
+                    current_stability,
+                    current_difficulty,
+                    retrievability,
+                    rating,
+                ),
+                fsrs_model.short_term_stability(weights, current_stability, rating),
+            )
+            stability[:, :step_size] = np.maximum(next_stability, STABILITY_MIN)
+            difficulty[:, :step_size] = fsrs_model.next_difficulty(
+                weights, current_difficulty, rating
+            )
+
+        return total_loss / self.num_loss_reviews
+
+
+def optimize_parameters(
+    history: ReviewHistory,
+    num_iterations: int = NUM_ITERATIONS,
+    progress_callback: Optional[ProgressCallback] = None,
+) -> tuple[list[float], float]:
+    """Finds FSRS parameters best fitting the review history.
+
+    Uses Adam optimizer with cosine annealing of the learning rate on random
+    mini batches of cards. The gradient is computed by finite differences,
+    the loss for all the shifted parameter sets is evaluated in one vectorized pass.
+
+    Parameters
+    ----------
+    history: ReviewHistory
+        The review history to fit.
+    num_iterations: int
+        Number of optimization iterations.
+    progress_callback: Optional[ProgressCallback]
+        Called after each iteration with the iteration number,
+        total number of iterations and loss of the last mini batch.
+
+    Returns
+    -------
+    tuple[list[float], float]
+        Best found parameters and their loss on the whole history.
+        The default parameters are returned if there are not enough reviews.
+    """
+    parameters = np.array(fsrs.fsrs.DEFAULT_PARAMETERS, dtype=np.float64)
+    best_parameters = parameters.copy()
+    best_loss = float(history.compute_loss(parameters)[0])
+    if history.num_loss_reviews < MIN_NUM_REVIEWS:
+        logging.info(
+            f"Not enough reviews for optimization: {history.num_loss_reviews}, using default parameters"
+        )
+        return best_parameters.tolist(), best_loss
+
+    num_parameters = len(parameters)
+    shifts = np.vstack([np.zeros(num_parameters), np.eye(num_parameters)])
+    shifts *= GRADIENT_STEP
+    first_moment = np.zeros(num_parameters)
+    second_moment = np.zeros(num_parameters)
+    beta_1, beta_2, epsilon = 0.9, 0.999, 1e-8
+
+    rng = np.random.default_rng(42)
+    batch_fraction = MINI_BATCH_REVIEWS / len(history.ratings)
+    for iteration in range(1, num_iterations + 1):
+        if batch_fraction < 1:
+            batch = history.select_cards(rng.random(history.num_cards) < batch_fraction)
+        else:
+            batch = history
+        losses = batch.compute_loss(parameters + shifts)
+
+        gradient = (losses[1:] - losses[0]) / GRADIENT_STEP
+        first_moment = beta_1 * first_moment + (1 - beta_1) * gradient
+        second_moment = beta_2 * second_moment + (1 - beta_2) * gradient**2
+        corrected_first = first_moment / (1 - beta_1**iteration)
+        corrected_second = second_moment / (1 - beta_2**iteration)
+        learning_rate = (
+            LEARNING_RATE
+            * (1 + math.cos(math.pi * (iteration - 1) / num_iterations))
+            / 2
+        )
+        parameters = parameters - learning_rate * corrected_first / (
+            np.sqrt(corrected_second) + epsilon
+        )
+        parameters = np.clip(
+            parameters, PARAMETERS_LOWER_BOUNDS, PARAMETERS_UPPER_BOUNDS
+        )
+
+        if iteration % EVALUATION_INTERVAL == 0 or iteration == num_iterations:
+            loss = float(history.compute_loss(parameters)[0])
+            logging.info(
+                f"FSRS optimization {iteration}/{num_iterations}, loss: {loss}"
+            )
+            if loss < best_loss:
+                best_loss = loss
+                best_parameters = parameters.copy()
+
+        if progress_callback is not None:
+            progress_callback(iteration, num_iterations, float(losses[0]))
+
+    return best_parameters.tolist(), best_loss
+
+
+def load_fsrs_scheduler(scheduler_file: Path) -> fsrs.Scheduler:
+    """Loads FSRS scheduler with optimized parameters.
+
+    Parameters
+    ----------
+    scheduler_file: Path
+        File with the stored scheduler.
+
+    Returns
+    -------
+    fsrs.Scheduler
+        The stored scheduler or default scheduler if the file does not exist.
+    """
+    if not scheduler_file.exists():
+        return fsrs.Scheduler()
+
+    with scheduler_file.open("r", encoding="utf-8") as f:
+        return fsrs.Scheduler.from_dict(json.load(f))
+
+
+def run_fsrs_optimization(
+    connection_uri: str,
+    scheduler_file: Path,
+    status_queue: multiprocessing.queues.Queue,
+    num_iterations: int = NUM_ITERATIONS,
+) -> None:
+    """Optimizes FSRS parameters and stores the resulting scheduler.
+
+    Meant to be run in a worker process, the progress is reported
+    by putting FSRSOptimizationStatus objects into the status queue.
+
+    Parameters
+    ----------
+    connection_uri: str
+        Connection to the database with the review log.
+    scheduler_file: Path
+        File where the scheduler with optimized parameters is stored.
+    status_queue: multiprocessing.queues.Queue
+        Queue for the progress reports.
+    num_iterations: int
+        Number of optimization iterations.
+    """
+    status = FSRSOptimizationStatus(running=True)
+    try:
+        history = ReviewHistory.from_database(FSRSManager(connection_uri))
+        status.num_reviews = history.num_loss_reviews
+        status_queue.put(status.model_copy())
+
+        def report_progress(iteration: int, num_iterations: int, loss: float) -> None:
+            status.progress = iteration / num_iterations
+            status.loss = loss
+            status_queue.put(status.model_copy())
+
+        parameters, loss = optimize_parameters(
+            history, num_iterations=num_iterations, progress_callback=report_progress
+        )
+
+        scheduler = load_fsrs_scheduler(scheduler_file)
+        scheduler.parameters = tuple(parameters)
+        with scheduler_file.open("w", encoding="utf-8") as f:
+            f.write(json.dumps(scheduler.to_dict(), indent=2))
+
+        status.parameters = parameters
+        status.loss = loss
+        status.progress = 1.0
+    except Exception as e:
+        logging.exception("FSRS optimization failed")
+        status.error = str(e)
+
+    status.running = False
+    status_queue.put(status)
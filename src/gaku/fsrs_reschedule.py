@@ -0,0 +1,176 @@
+"""Rescheduling of all studied cards with the active scheduler."""
+
+import json
+import logging
+from collections import Counter, defaultdict
+from copy import copy
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+import fsrs
+import numpy as np
+
+from . import fsrs_model
+from .api_types import RescheduleReport, ReviewLogEntry
+from .database.db_fsrs import FSRSManager
+
+# number of cards read and written in one transaction
+RESCHEDULE_PAGE_SIZE = 500
+
+
+def reschedule_card(
+    scheduler: fsrs.Scheduler,
+    fsrs_card: fsrs.Card,
+    review_logs: list[ReviewLogEntry],
+) -> tuple[fsrs.Card, bool]:
+    """Recomputes schedule of a card.
+
+    If the review log contains whole history of the card, the history is
+    replayed with the scheduler, so the memory state is recomputed with
+    its parameters. Otherwise the due date of cards in review is computed
+    from the stored memory state. Cards in learning keep their schedule.
+
+    Intervals are not fuzzed, so repeated rescheduling gives the same result.
+
+    Parameters
+    ----------
+    scheduler: fsrs.Scheduler
+        Scheduler used for the new schedule, fuzzing setting is ignored.
+    fsrs_card: fsrs.Card
+        Stored FSRS data of the card.
+    review_logs: list[ReviewLogEntry]
+        Reviews of the card ordered by review time.
+
+    Returns
+    -------
+    tuple[fsrs.Card, bool]
+        The rescheduled card and True if the history was replayed.
+    """
+    if review_logs and review_logs[0].prior_stability is None:
+        replay_scheduler = copy(scheduler)
+        replay_scheduler.enable_fuzzing = False
+        replayed_card = fsrs.Card(card_id=fsrs_card.card_id)
+        for review in review_logs:
+            replayed_card, _ = replay_scheduler.review_card(
+                replayed_card,
+                fsrs.Rating(review.rating),
+                review_datetime=review.review_datetime,
+            )
+        # the stored data could have been changed outside of reviews, e.g. by import
+        if replayed_card.last_review == fsrs_card.last_review:
+            return replayed_card, True
+
+    if (
+        fsrs_card.state != fsrs.State.Review
+        or fsrs_card.stability is None
+        or fsrs_card.last_review is None
+    ):
+        return fsrs_card, False
+
+    interval = fsrs_model.next_interval(
+        np.array(fsrs_card.stability),
+        scheduler.desired_retention,
+        scheduler.maximum_interval,
+    )
+    rescheduled_card = copy(fsrs_card)
+    rescheduled_card.due = fsrs_card.last_review + timedelta(days=int(interval))
+    return rescheduled_card, False
+
+
+def reschedule_cards(
+    db: FSRSManager,
+    scheduler: fsrs.Scheduler,
+    checkpoint_file: Path,
+    dry_run: bool = True,
+    resume: bool = True,
+    page_size: int = RESCHEDULE_PAGE_SIZE,
+) -> RescheduleReport:
+    """Reschedules all studied cards with the scheduler.
+
+    The cards are processed in pages ordered by card id. Each page
+    is written in its own transaction and the last written card id is stored
+    in the checkpoint file, so interrupted rescheduling can be resumed.
+
+    Parameters
+    ----------
+    db: FSRSManager
+        Database with the FSRS data.
+    scheduler: fsrs.Scheduler
+        Scheduler used for the new schedule.
+    checkpoint_file: Path
+        File storing the progress of the rescheduling.
+    dry_run: bool
+        If True, nothing is stored, only the report is created.
+    resume: bool
+        If True and the checkpoint is for the same scheduler,
+        the rescheduling continues after the last stored page.
+    page_size: int
+        Number of cards in one page.
+
+    Returns
+    -------
+    RescheduleReport
+        Report of the changes of the due dates.
+    """
+    report = RescheduleReport(dry_run=dry_run)
+    scheduler_data = scheduler.to_dict()
+
+    last_card_id: Optional[str] = None
+    if resume and not dry_run and checkpoint_file.exists():
+        with checkpoint_file.open("r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint["scheduler"] == scheduler_data:
+            last_card_id = checkpoint["last_card_id"]
+            report.resumed = True
+            logging.info(f"Resuming rescheduling after card {last_card_id}")
+
+    # count the due dates by days since start of today
+    today = (
+        datetime.now()
+        .replace(hour=0, minute=0, second=0, microsecond=0)
+        .astimezone(timezone.utc)
+    )
+
+    def due_day(fsrs_card: fsrs.Card) -> int:
+        return max((fsrs_card.due - today).days, 0)
+
+    due_before: Counter[int] = Counter()
+    due_after: Counter[int] = Counter()
+    while True:
+        fsrs_cards = db.get_fsrs_page(last_card_id, page_size)
+        if not fsrs_cards:
+            break
+
+        card_reviews: dict[str, list[ReviewLogEntry]] = defaultdict(list)
+        for review in db.get_review_logs(card_ids=list(fsrs_cards)):
+            card_reviews[review.card_id].append(review)
+
+        rescheduled_cards: dict[str, fsrs.Card] = {}
+        for card_id, fsrs_card in fsrs_cards.items():
+            rescheduled_card, replayed = reschedule_card(
+                scheduler, fsrs_card, card_reviews[card_id]
+            )
+            due_before[due_day(fsrs_card)] += 1
+            due_after[due_day(rescheduled_card)] += 1
+            report.num_replayed += replayed
+            if rescheduled_card.due != fsrs_card.due:
+                report.num_changed += 1
+            rescheduled_cards[card_id] = rescheduled_card
+        report.num_cards += len(fsrs_cards)
+        last_card_id = max(fsrs_cards)
+
+        if not dry_run:
+            db.update_fsrs_cards(rescheduled_cards)
+            with checkpoint_file.open("w", encoding="utf-8") as f:
+                json.dump(
+                    {"last_card_id": last_card_id, "scheduler": scheduler_data}, f
+                )
+        logging.info(f"Rescheduled {report.num_cards} cards")
+
+    if not dry_run and checkpoint_file.exists():
+        checkpoint_file.unlink()
+
+    report.due_before = dict(sorted(due_before.items()))
+    report.due_after = dict(sorted(due_after.items()))
+    return report
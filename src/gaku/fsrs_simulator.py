@@ -0,0 +1,154 @@
+"""Simulation of future review workload.
+
+All studied cards and the simulated new cards are kept in arrays
+and each simulated day reviews all the due cards at once.
+"""
+
+import fsrs
+import numpy as np
+
+from . import fsrs_model
+from .api_types import WorkloadDay
+
+# used when the review log has no review durations yet
+DEFAULT_REVIEW_SECONDS = 15.0
+# fixed seed, so the same data give the same forecast
+SIMULATION_SEED = 42
+
+
+def simulate_workload(
+    scheduler: fsrs.Scheduler,
+    stability: np.ndarray,
+    difficulty: np.ndarray,
+    due_days: np.ndarray,
+    last_review_days: np.ndarray,
+    new_cards_per_day: int,
+    num_days: int,
+    review_seconds: float = DEFAULT_REVIEW_SECONDS,
+) -> list[WorkloadDay]:
+    """Simulates reviews of studied cards and learning of new cards.
+
+    Each due card is recalled with probability given by its retrievability,
+    recalled cards are rated Good and forgotten cards Again. New cards
+    and forgotten cards go through the learning or relearning steps
+    of the scheduler on the same day. Interval fuzzing is not simulated.
+
+    Parameters
+    ----------
+    scheduler: fsrs.Scheduler
+        Scheduler whose parameters and settings are used.
+    stability: np.ndarray
+        FSRS stability of the studied cards.
+    difficulty: np.ndarray
+        FSRS difficulty of the studied cards.
+    due_days: np.ndarray
+        Due dates of the studied cards in days since the start of the simulation.
+    last_review_days: np.ndarray
+        Times of the last reviews in days since the start of the simulation.
+    new_cards_per_day: int
+        Number of new cards learned each day.
+    num_days: int
+        Number of simulated days.
+    review_seconds: float
+        Average duration of one review in seconds.
+
+    Returns
+    -------
+    list[WorkloadDay]
+        Simulated workload for each day.
+    """
+    parameters = np.array(scheduler.parameters, dtype=np.float64)
+    again = np.array(fsrs.Rating.Again.value)
+    good = np.array(fsrs.Rating.Good.value)
+    learning_reviews = max(1, len(scheduler.learning_steps))
+    relearning_reviews = len(scheduler.relearning_steps)
+
+    def schedule(card_stability: np.ndarray, day: int) -> np.ndarray:
+        return day + fsrs_model.next_interval(
+            card_stability, scheduler.desired_retention, scheduler.maximum_interval
+        )
+
+    # the new cards get their slots at the end of the arrays
+    num_studied = len(stability)
+    num_cards = num_studied + new_cards_per_day * num_days
+    card_stability = np.empty(num_cards)
+    card_stability[:num_studied] = stability
+    card_difficulty = np.empty(num_cards)
+    card_difficulty[:num_studied] = difficulty
+    card_due = np.full(num_cards, np.inf)
+    card_due[:num_studied] = due_days
+    card_last_review = np.zeros(num_cards)
+    card_last_review[:num_studied] = last_review_days
+
+    rng = np.random.default_rng(SIMULATION_SEED)
+    workload: list[WorkloadDay] = []
+    for day in range(num_days):
+        due = np.flatnonzero(card_due < day + 1)
+        num_reviews = len(due)
+        if len(due):
+            elapsed_days = np.maximum(np.floor(day - card_last_review[due]), 0)
+            due_stability = card_stability[due]
+            due_difficulty = card_difficulty[due]
+            retrievability = fsrs_model.retrievability(elapsed_days, due_stability)
+            rating = np.where(rng.random(len(due)) < retrievability, good, again)
+
+            due_stability = np.where(
+                elapsed_days > 0,
+                fsrs_model.next_stability(
+                    parameters, due_stability, due_difficulty, retrievability, rating
+                ),
+                fsrs_model.short_term_stability(parameters, due_stability, rating),
+            )
+            due_difficulty = fsrs_model.next_difficulty(
+                parameters, due_difficulty, rating
+            )
+
+            # forgotten cards are relearned on the same day
+            forgotten = rating == again
+            for _ in range(relearning_reviews):
+                due_stability[forgotten] = fsrs_model.short_term_stability(
+                    parameters, due_stability[forgotten], good
+                )
+                due_difficulty[forgotten] = fsrs_model.next_difficulty(
+                    parameters, due_difficulty[forgotten], good
+                )
+            num_reviews += relearning_reviews * int(np.count_nonzero(forgotten))
+
+            card_stability[due] = due_stability
+            card_difficulty[due] = due_difficulty
+            card_due[due] = schedule(due_stability, day)
+            card_last_review[due] = day
+
+        if new_cards_per_day:
+            new = slice(
+                num_studied + day * new_cards_per_day,
+                num_studied + (day + 1) * new_cards_per_day,
+            )
+            rating = np.full(new_cards_per_day, good)
+            new_stability = fsrs_model.initial_stability(parameters, rating)
+            new_difficulty = fsrs_model.initial_difficulty(parameters, rating)
+            for _ in range(learning_reviews - 1):
+                new_stability = fsrs_model.short_term_stability(
+                    parameters, new_stability, good
+                )
+                new_difficulty = fsrs_model.next_difficulty(
+                    parameters, new_difficulty, good
+                )
+            num_reviews += learning_reviews * new_cards_per_day
+
+            card_stability[new] = new_stability
+            card_difficulty[new] = new_difficulty
+            card_due[new] = schedule(new_stability, day)
+            card_last_review[new] = day
+
+        workload.append(
+            WorkloadDay(
+                day=day,
+                num_due=len(due),
+                num_new=new_cards_per_day,
+                num_reviews=num_reviews,
+                review_minutes=num_reviews * review_seconds / 60,
+            )
+        )
+
+    return workload
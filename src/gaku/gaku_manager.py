@@ -3,10 +3,17 @@
 import datetime
 import json
 import logging
+import multiprocessing
+import queue
 import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Sequence
 
+import numpy as np
 from alembic.config import Config
 from alembic import command
 
@@ -29,6 +36,12 @@ from .card_types import (
     AnswerText,
 )
 from .test_session import TestSession
+from .fsrs_optimizer import load_fsrs_scheduler, run_fsrs_optimization
+from .retrievability import RetrievabilityEngine, to_julian_day
+from .fsrs_simulator import simulate_workload, DEFAULT_REVIEW_SECONDS
+from .fsrs_reschedule import reschedule_cards
+from .load_balancer import DueLoadBalancer
+from .session_registry import SessionRegistry, DEFAULT_SESSION_ID
 from .dictionary import (
     RadicalDictionary,
     KanjiDictionary,
@@ -39,14 +52,26 @@ from .dictionary import (
     load_ono_dictionary,
 )
 from .db_dictionary import DictionaryManager
+from .import_resolver import ImportIndex, ImportResolver
 from .api_types import (
     GeneratedImports,
     ImportItem,
     StartTestRequest,
     CardFilter,
     CardSourceLink,
+    FSRSOptimizationStatus,
+    RescheduleReport,
+    SessionBuildRequest,
+    SessionBuildStatus,
+    SessionStartType,
+    WorkloadDay,
 )
 
+# maximum age of cached due forecast, cards become due during the day
+DUE_FORECAST_CACHE_SECONDS = 300
+# maximum number of cached due forecasts
+DUE_FORECAST_CACHE_SIZE = 16
+
 
 class GakuManager:
     """Manages all the Gaku functionality."""
@@ -101,7 +126,31 @@ class GakuManager:
             logging.info("Userdata found, checking for migrations")
             command.upgrade(alembic_cfg, "head")
 
-        self.test_session: Optional[TestSession] = None
+        # test sessions of the clients by session id
+        self.session_registry = SessionRegistry(
+            userdata_dir=self.userdata_dir, restore_session=self.restore_test_session
+        )
+        # scheduler with parameters optimized for the user's review history
+        self.fsrs_scheduler_file = self.userdata_dir / "fsrs_scheduler.json"
+        self.fsrs_scheduler = load_fsrs_scheduler(self.fsrs_scheduler_file)
+        # progress of interrupted rescheduling of all cards
+        self.fsrs_reschedule_file = self.userdata_dir / "fsrs_reschedule.json"
+        # only one rescheduling can use the progress file
+        self.fsrs_reschedule_lock = threading.Lock()
+        self.fsrs_optimization_process: Optional[multiprocessing.Process] = None
+        self.fsrs_optimization_queue: Optional[multiprocessing.Queue] = None
+        self.fsrs_optimization_status = FSRSOptimizationStatus()
+        # test sessions built in background by job id
+        self.session_builds: dict[str, SessionBuildStatus] = {}
+        self.session_builds_lock = threading.Lock()
+        self.retrievability_engine = RetrievabilityEngine(self.db)
+        self.due_load_balancer = DueLoadBalancer(self.db)
+        # cache for due forecasts - key is the forecast parameters
+        # value is (FSRS data version, creation time, forecast),
+        # the least recently used first
+        self.due_forecast_cache: OrderedDict[str, tuple[int, float, dict[int, int]]] = (
+            OrderedDict()
+        )
 
         self.db_dictionary_file = self.resource_dir / "dictionary.db"
         dictionary_exists = self.db_dictionary_file.exists()
@@ -142,6 +191,7 @@ class GakuManager:
         cards = [create_card_from_json(card["card_data"]) for card in cards_json]
 
         self.db.import_cards(cards)
+        self.update_extra_questions(cards)
 
     def export_cards_to_file(self, export_file: Path) -> None:
         """Exports cards from database to file."""
@@ -170,118 +220,365 @@ class GakuManager:
             )
         return None
 
-    def add_extra_questions(self, card: TestCardTypes) -> None:
-        """Generates extra questions for the cards.
+    def create_extra_questions(
+        self, cards: Sequence[TestCardTypes]
+    ) -> dict[str, list[TestQuestion]]:
+        """Creates extra questions for the cards.
 
-        The cards are created as follows:
-        - Vocab: add kanji meanings question
-        - Kanji: add radical question
+        The questions are created as follows:
+        - Vocab: kanji meanings question
+        - Kanji: radical question
         - Radical: no extra questions
         - MultiCard: no extra questions
-        """
-        # TODO: precompute the questions and make them available in the card
-        if isinstance(card, VocabCard):
-            kanji_cards, _new_kanji_cards = self.get_kanji_cards(card.writing)
 
-            if not kanji_cards:
-                return
-            answers: list[Answer] = []
-            for kanji_card in kanji_cards:
-                answers.append(
-                    Answer(
-                        answer_type=AnswerType.ROMAJI,
-                        header=f"Kanji {kanji_card.writing} meaning",
-                        answers=kanji_card.meanings,
-                    )
+        The kanji cards and dictionary radicals linked to all the cards
+        are fetched at once, so the number of queries does not grow
+        with the number of cards.
+
+        Parameters
+        ----------
+        cards: Sequence[TestCardTypes]
+            Cards to create the questions for.
+
+        Returns
+        -------
+        dict[str, list[TestQuestion]]
+            Extra questions of the vocab and kanji cards by card id.
+        """
+        vocab_cards = [card for card in cards if isinstance(card, VocabCard)]
+        kanji_cards = [card for card in cards if isinstance(card, KanjiCard)]
+        kanji_keys = list(
+            dict.fromkeys(char for card in vocab_cards for char in card.writing)
+        )
+        linked_kanji = {
+            key: kanji_card
+            for key, kanji_card in self.db.get_cards_by_keys(
+                kanji_keys, CardType.KANJI
+            ).items()
+            if isinstance(kanji_card, KanjiCard)
+        }
+        radical_ids = list(
+            dict.fromkeys(
+                card.radical_id for card in kanji_cards if card.radical_id is not None
+            )
+        )
+        radicals = self.dictionary.get_radicals_by_ids(radical_ids)
+
+        extra_questions: dict[str, list[TestQuestion]] = {}
+        for vocab_card in vocab_cards:
+            extra_questions[vocab_card.card_id] = []
+            answers: list[Answer] = [
+                Answer(
+                    answer_type=AnswerType.ROMAJI,
+                    header=f"Kanji {linked_kanji[char].writing} meaning",
+                    answers=linked_kanji[char].meanings,
                 )
-            card.custom_questions.append(
+                for char in vocab_card.writing
+                if char in linked_kanji
+            ]
+            if not answers:
+                continue
+            extra_questions[vocab_card.card_id].append(
                 TestQuestion(
-                    parent_id=card.card_id,
+                    parent_id=vocab_card.card_id,
                     header="Kanji meanings for vocab",
-                    question=card.writing,
+                    question=vocab_card.writing,
+                    # cards of words not found in the dictionary have no meanings
                     hint=", ".join(
-                        [meaning.answer_text for meaning in card.meanings[0].meanings]
+                        [
+                            meaning.answer_text
+                            for meaning_entry in vocab_card.meanings[:1]
+                            for meaning in meaning_entry.meanings
+                        ]
                     ),
                     answers=[AnswerGroup(answers=answers)],
-                )
+                ).with_content_ids("vocab_kanji_meanings")
             )
 
-        elif isinstance(card, KanjiCard):
-            radical_card = self.get_dictionary_radical_for_kanji(card)
-            if radical_card:
-                card.custom_questions.append(
-                    TestQuestion(
-                        parent_id=card.card_id,
-                        header="Radical for kanji",
-                        question=card.writing,
-                        hint=", ".join(
-                            [meaning.answer_text for meaning in card.meanings]
+        for kanji_card in kanji_cards:
+            extra_questions[kanji_card.card_id] = []
+            if kanji_card.radical_id not in radicals:
+                continue
+            radical = radicals[kanji_card.radical_id]
+            extra_questions[kanji_card.card_id].append(
+                TestQuestion(
+                    parent_id=kanji_card.card_id,
+                    header="Radical for kanji",
+                    question=kanji_card.writing,
+                    hint=", ".join(
+                        [meaning.answer_text for meaning in kanji_card.meanings]
+                    ),
+                    answers=[
+                        AnswerGroup(
+                            answers=[
+                                Answer(
+                                    answer_type=AnswerType.ROMAJI,
+                                    header=f"Radical {radical.radical} meaning",
+                                    answers=[
+                                        AnswerText(answer_text=meaning.strip())
+                                        for meaning in radical.meaning.split(",")
+                                    ],
+                                )
+                            ]
                         ),
-                        answers=[
-                            AnswerGroup(
-                                answers=[
-                                    Answer(
-                                        answer_type=AnswerType.ROMAJI,
-                                        header=f"Radical {radical_card.writing} meaning",
-                                        answers=radical_card.meanings,
-                                    )
-                                ]
-                            ),
-                        ],
+                    ],
+                ).with_content_ids("kanji_radical")
+            )
+        return extra_questions
+
+    def update_extra_questions(self, cards: Sequence[TestCardTypes]) -> None:
+        """Creates extra questions for the cards and stores them in the database.
+
+        Called when the cards are imported or edited, so the questions
+        do not have to be created when a test session starts.
+        """
+        self.db.store_extra_questions(self.create_extra_questions(cards))
+
+    def add_extra_questions(self, cards: Sequence[TestCardTypes]) -> None:
+        """Adds extra questions to the custom questions of the cards.
+
+        The questions stored in the database are used, the missing questions
+        (e.g. invalidated by changes of linked cards) are created and stored.
+        """
+        card_ids = [
+            card.card_id for card in cards if isinstance(card, (VocabCard, KanjiCard))
+        ]
+        extra_questions = self.db.get_extra_questions(card_ids)
+        missing_questions = self.create_extra_questions(
+            [card for card in cards if card.card_id not in extra_questions]
+        )
+        if missing_questions:
+            logging.info(f"Creating extra questions for {len(missing_questions)} cards")
+            self.db.store_extra_questions(missing_questions)
+            extra_questions.update(missing_questions)
+
+        for card in cards:
+            if card.card_id in extra_questions:
+                card.custom_questions.extend(extra_questions[card.card_id])
+
+    def prepare_test_session(
+        self,
+        test_session: TestSession,
+        study_cards: list[TestCardTypes],
+        generate_extra_questions: bool,
+        session_id: str,
+    ) -> None:
+        """Loads the cards to the test session and sets it as the client's session.
+
+        Progress is reported to the running session build of the session.
+
+        Parameters
+        ----------
+        test_session: TestSession
+            The new test session.
+        study_cards: list[TestCardTypes]
+            Cards of the test session.
+        generate_extra_questions: bool
+            If True, extra questions are added to the cards.
+        session_id: str
+            Id of the test session.
+        """
+        build_status = self.get_running_session_build(session_id)
+        if build_status is not None:
+            build_status.num_cards = len(study_cards)
+            build_status.stage = "extra_questions"
+        if generate_extra_questions:
+            logging.info("Adding extra questions")
+            self.add_extra_questions(study_cards)
+
+        if build_status is not None:
+            build_status.stage = "loading_questions"
+        test_session.load(study_cards)
+        if build_status is not None:
+            build_status.num_questions = test_session.num_questions
+        self.session_registry.set(session_id, test_session)
+
+    def get_running_session_build(
+        self, session_id: str
+    ) -> Optional[SessionBuildStatus]:
+        """Gets status of the running build of the test session, if there is one."""
+        with self.session_builds_lock:
+            for build_status in self.session_builds.values():
+                if build_status.session_id == session_id and build_status.running:
+                    return build_status
+        return None
+
+    def start_test_session_build(
+        self,
+        build_request: SessionBuildRequest,
+        session_id: str = DEFAULT_SESSION_ID,
+    ) -> SessionBuildStatus:
+        """Starts building test session in a background thread.
+
+        The current session of the client can be used until the new
+        session is built. Use get_test_session_build to get the progress.
+
+        Parameters
+        ----------
+        build_request: SessionBuildRequest
+            Selection of the cards and configuration of the test.
+        session_id: str
+            Id of the built test session.
+
+        Returns
+        -------
+        SessionBuildStatus
+            Status of the started build.
+
+        Raises
+        ------
+        ValueError
+            If the request is not valid or the session is already being built.
+        """
+        self.session_registry.validate_session_id(session_id)
+        if (
+            build_request.start_type == SessionStartType.RECENT_MISTAKES
+            and build_request.time_since is None
+        ):
+            raise ValueError("Recent mistakes session requires time_since")
+
+        with self.session_builds_lock:
+            for job_id, build_status in list(self.session_builds.items()):
+                if build_status.session_id != session_id:
+                    continue
+                if build_status.running:
+                    raise ValueError(
+                        f"Test session {session_id} is already being built"
                     )
+                # only the last build of the session is kept
+                del self.session_builds[job_id]
+            build_status = SessionBuildStatus(
+                job_id=str(uuid.uuid4()), session_id=session_id
+            )
+            self.session_builds[build_status.job_id] = build_status
+
+        logging.info(f"Starting test session build {build_status.job_id}")
+        threading.Thread(
+            target=self.run_test_session_build,
+            args=(build_request, build_status),
+            daemon=True,
+        ).start()
+        return build_status.model_copy()
+
+    def run_test_session_build(
+        self, build_request: SessionBuildRequest, build_status: SessionBuildStatus
+    ) -> None:
+        """Builds test session, the progress is stored in the build status."""
+        test_setup = build_request.start_request
+        session_id = build_status.session_id
+        try:
+            start_type = build_request.start_type
+            if start_type == SessionStartType.ANY_STATE:
+                self.start_test_session(test_setup, session_id)
+            elif start_type == SessionStartType.NEW:
+                self.start_test_session_new_cards(test_setup, session_id)
+            elif start_type == SessionStartType.STUDIED:
+                self.start_test_session_studied(test_setup, session_id)
+            elif start_type == SessionStartType.WEAKEST:
+                self.start_test_session_weakest(test_setup, session_id)
+            elif start_type == SessionStartType.DUE:
+                self.start_test_session_fsrs_due(test_setup, session_id)
+            elif start_type == SessionStartType.RECENT_MISTAKES:
+                assert build_request.time_since is not None
+                self.start_test_session_recent_mistakes(
+                    test_setup, build_request.time_since, session_id
                 )
+            build_status.stage = "finished"
+            logging.info(f"Finished test session build {build_status.job_id}")
+        except Exception as e:
+            logging.exception(f"Test session build {build_status.job_id} failed")
+            build_status.error = str(e)
+        build_status.running = False
+
+    def get_test_session_build(self, job_id: str) -> Optional[SessionBuildStatus]:
+        """Gets status of test session build.
+
+        Parameters
+        ----------
+        job_id: str
+            Id of the build job.
+
+        Returns
+        -------
+        Optional[SessionBuildStatus]
+            Status of the build, None if there is no build with the id.
+        """
+        with self.session_builds_lock:
+            build_status = self.session_builds.get(job_id)
+            if build_status is None:
+                return None
+            return build_status.model_copy()
 
     def start_test_session(
         self,
         test_setup: StartTestRequest,
+        session_id: str = DEFAULT_SESSION_ID,
     ) -> TestSession:
         """Starts test session ignoring FRSR state."""
 
-        self.test_session = TestSession(
-            db=self.db, mark_answers=test_setup.mark_answers
+        test_session = TestSession(
+            db=self.db,
+            fsrs_handler=self.fsrs_scheduler,
+            load_balancer=self.due_load_balancer,
+            mark_answers=test_setup.mark_answers,
         )
         study_cards = self.db.get_cards_any_state(test_setup)
-        if test_setup.generate_extra_questions:
-            for card in study_cards:
-                self.add_extra_questions(card)
-
-        self.test_session.load(study_cards)
-        return self.test_session
+        self.prepare_test_session(
+            test_session,
+            study_cards,
+            generate_extra_questions=test_setup.generate_extra_questions,
+            session_id=session_id,
+        )
+        return test_session
 
     def start_test_session_new_cards(
         self,
         test_setup: StartTestRequest,
+        session_id: str = DEFAULT_SESSION_ID,
     ) -> TestSession:
         """Start test session with new cards."""
-        self.test_session = TestSession(
-            db=self.db, mark_answers=test_setup.mark_answers, shuffle_questions=False
+        test_session = TestSession(
+            db=self.db,
+            fsrs_handler=self.fsrs_scheduler,
+            load_balancer=self.due_load_balancer,
+            mark_answers=test_setup.mark_answers,
+            shuffle_questions=False,
         )
 
         study_cards = self.db.get_new_cards(test_setup)
+        self.prepare_test_session(
+            test_session,
+            study_cards,
+            generate_extra_questions=test_setup.generate_extra_questions,
+            session_id=session_id,
+        )
 
-        if test_setup.generate_extra_questions:
-            logging.info("Adding extra questions")
-            for card in study_cards:
-                self.add_extra_questions(card)
-        self.test_session.load(study_cards)
-
-        return self.test_session
+        return test_session
 
     def start_test_session_recent_mistakes(
         self,
         test_setup: StartTestRequest,
         timestamp: int,
+        session_id: str = DEFAULT_SESSION_ID,
     ) -> TestSession:
         """Starts test session with recent mistakes."""
 
         mark_answers = test_setup.mark_answers
-        self.test_session = TestSession(db=self.db, mark_answers=mark_answers)
+        test_session = TestSession(
+            db=self.db,
+            fsrs_handler=self.fsrs_scheduler,
+            load_balancer=self.due_load_balancer,
+            mark_answers=mark_answers,
+        )
         study_cards = self.db.mistakes_get_mistakes_cards(timestamp, test_setup)
-        for card in study_cards:
-            self.add_extra_questions(card)
-        self.test_session.load(study_cards)
+        self.prepare_test_session(
+            test_session,
+            study_cards,
+            generate_extra_questions=True,
+            session_id=session_id,
+        )
 
-        return self.test_session
+        return test_session
 
     def get_num_matching_new_cards(self, filter: CardFilter) -> int:
         """Get the number of new cards that match the test setup."""
@@ -290,26 +587,82 @@ class GakuManager:
     def start_test_session_fsrs_due(
         self,
         test_setup: StartTestRequest,
+        session_id: str = DEFAULT_SESSION_ID,
     ) -> TestSession:
         """Start test session with cards that due date in fsrs."""
 
-        self.test_session = TestSession(
-            db=self.db, mark_answers=test_setup.mark_answers
+        test_session = TestSession(
+            db=self.db,
+            fsrs_handler=self.fsrs_scheduler,
+            load_balancer=self.due_load_balancer,
+            mark_answers=test_setup.mark_answers,
         )
         study_cards = self.db.get_fsrs_due_cards(test_setup)
-        for card in study_cards:
-            self.add_extra_questions(card)
-        self.test_session.load(study_cards)
+        self.prepare_test_session(
+            test_session,
+            study_cards,
+            generate_extra_questions=True,
+            session_id=session_id,
+        )
 
-        return self.test_session
+        return test_session
+
+    def start_test_session_weakest(
+        self, test_setup: StartTestRequest, session_id: str = DEFAULT_SESSION_ID
+    ) -> TestSession:
+        """Starts test session with studied cards with lowest recall probability.
 
-    def start_test_session_studied(self, test_setup: StartTestRequest) -> TestSession:
+        Parameters
+        ----------
+        test_setup: StartTestRequest
+            Configuration of the test, num_cards is the number of the weakest cards.
+        session_id: str
+            Id of the started test session.
+
+        Returns
+        -------
+        TestSession
+            New test session with the weakest cards matching the setup,
+            ordered from the lowest recall probability.
+        """
+
+        # keep the order, so the weakest cards are tested first
+        test_session = TestSession(
+            db=self.db,
+            fsrs_handler=self.fsrs_scheduler,
+            load_balancer=self.due_load_balancer,
+            mark_answers=test_setup.mark_answers,
+            shuffle_questions=False,
+        )
+        card_ids = None
+        if test_setup.card_sources or test_setup.card_types or test_setup.search_text:
+            card_ids = self.db.get_studied_card_ids(test_setup)
+        weakest_ids = self.retrievability_engine.get_weakest_cards(
+            num_cards=test_setup.num_cards,
+            start_index=test_setup.start_index or 0,
+            card_ids=card_ids,
+        )
+        study_cards = self.db.get_cards_by_ids(weakest_ids)
+        self.prepare_test_session(
+            test_session,
+            study_cards,
+            generate_extra_questions=test_setup.generate_extra_questions,
+            session_id=session_id,
+        )
+
+        return test_session
+
+    def start_test_session_studied(
+        self, test_setup: StartTestRequest, session_id: str = DEFAULT_SESSION_ID
+    ) -> TestSession:
         """Starts test session with studied cards matching the test_setup settings.
 
         Paramteters
         -----------
         test_setup: StartTestRequest
             Configuration of the test
+        session_id: str
+            Id of the started test session.
 
         Returns
         -------
@@ -317,30 +670,43 @@ class GakuManager:
             New test session with cards matching the setup.
         """
 
-        self.test_session = TestSession(
-            db=self.db, mark_answers=test_setup.mark_answers
+        test_session = TestSession(
+            db=self.db,
+            fsrs_handler=self.fsrs_scheduler,
+            load_balancer=self.due_load_balancer,
+            mark_answers=test_setup.mark_answers,
         )
         study_cards = self.db.get_studied_cards(test_setup)
-        for card in study_cards:
-            self.add_extra_questions(card)
-        self.test_session.load(study_cards)
+        self.prepare_test_session(
+            test_session,
+            study_cards,
+            generate_extra_questions=True,
+            session_id=session_id,
+        )
 
-        return self.test_session
+        return test_session
 
     def get_num_due_cards(self, filter: CardFilter) -> int:
         """Get the number of cards that are due for testing."""
         return self.db.get_num_fsrs_due_cards(filter)
 
-    def get_session_exists(self) -> bool:
+    @property
+    def test_session(self) -> Optional[TestSession]:
+        """Test session of clients without session id."""
+        return self.get_test_session(DEFAULT_SESSION_ID)
+
+    def get_test_session(self, session_id: str) -> Optional[TestSession]:
+        """Gets test session with the id, None if it does not exist."""
+        return self.session_registry.get(session_id)
+
+    def get_session_exists(self, session_id: str = DEFAULT_SESSION_ID) -> bool:
         """Checks if there is a test session."""
-        return self.test_session is not None
+        return self.get_test_session(session_id) is not None
 
-    def get_session_active(self) -> bool:
+    def get_session_active(self, session_id: str = DEFAULT_SESSION_ID) -> bool:
         """Checks if test session is active."""
-        return (
-            self.test_session is not None
-            and not self.test_session.is_session_finished()
-        )
+        test_session = self.get_test_session(session_id)
+        return test_session is not None and not test_session.is_session_finished()
 
     def find_dictionary_vocab_by_writing(self, query: str) -> list[DictionaryEntry]:
         """Searches vocabulary dictionary by writing (kanji)."""
@@ -370,91 +736,8 @@ class GakuManager:
         generate_vocab_cards : bool, optional
             If True, generates missing VocabCard from dictionary entry, by default False
         """
-        # ids of the cards that were not found in the database
-        new_cards: list[str] = []
-
-        vocab_query = vocab_query.strip()
-        vocab_entries = self.db.get_vocab_entries_by_key(vocab_query)
-        if generate_vocab_cards:
-            # we have to match the entries dictionary_id with ent_seq key
-            dictionary_entries = self.find_dictionary_vocab_by_writing(vocab_query)
-            logging.info(f"Found {dictionary_entries} entries for {vocab_query}")
-            for dictionary_entry in dictionary_entries:
-                logging.info(f"Adding vocab card {dictionary_entry}")
-                if dictionary_entry.ent_seq not in [
-                    entry.dictionary_id for entry in vocab_entries
-                ]:
-                    new_card = VocabCard(
-                        dictionary_id=dictionary_entry.ent_seq,
-                        writing=vocab_query,
-                        readings=[
-                            AnswerText(answer_text=reading)
-                            for reading in dictionary_entry.reading_elements
-                        ],
-                        # TODO: review - why test_enabled
-                        meanings=[
-                            VocabularyMeaningEntry(
-                                part_of_speech=meaning.part_of_speech,
-                                meanings=[
-                                    AnswerText(answer_text=meaning)
-                                    for meaning in meaning.meanings
-                                ],
-                                test_enabled=True,
-                            )
-                            for meaning in dictionary_entry.meanings
-                        ],
-                    )
-                    vocab_entries.append(new_card)
-                    new_cards.append(new_card.card_id)
-
-            if not dictionary_entries:
-                dictionary_reading_entries = self.find_dictionary_vocab_by_reading(
-                    vocab_query
-                )
-                for dictionary_entry in dictionary_reading_entries:
-                    logging.info(
-                        f"\nAdding vocab card found by reading: {dictionary_entry}"
-                    )
-                    if dictionary_entry.ent_seq not in [
-                        entry.dictionary_id for entry in vocab_entries
-                    ]:
-
-                        new_card = VocabCard(
-                            dictionary_id=dictionary_entry.ent_seq,
-                            writing=vocab_query,
-                            readings=[],  # reading is same as writing, so we don't need it
-                            # TODO: review - why test_enabled?
-                            meanings=[
-                                VocabularyMeaningEntry(
-                                    part_of_speech=meaning.part_of_speech,
-                                    meanings=[
-                                        AnswerText(answer_text=meaning)
-                                        for meaning in meaning.meanings
-                                    ],
-                                    test_enabled=True,
-                                )
-                                for meaning in dictionary_entry.meanings
-                            ],
-                            note=f"Import note: Found in dictionary by reading, kanji: {dictionary_entry.kanji_elements}",
-                        )
-                        vocab_entries.append(new_card)
-                        new_cards.append(new_card.card_id)
-
-            if not vocab_entries:
-                logging.warning(f"Word {vocab_query} not found in dictionary")
-                vocab_entries = [
-                    VocabCard(
-                        writing=vocab_query,
-                        readings=[],
-                        meanings=[],
-                        note="Warning: Word not found in dictionary",
-                    )
-                ]
-                new_cards.append(vocab_entries[0].card_id)
-
-        logging.info(f"Found {len(vocab_entries)} entries for {vocab_query}")
-        logging.debug(vocab_entries)
-        return vocab_entries, new_cards
+        resolver = ImportResolver(self.db, self.dictionary)
+        return resolver.get_vocab_cards(vocab_query, generate_vocab_cards)
 
     def get_kanji_cards(
         self, kanji_text: str, generate_kanji_cards: bool = False
@@ -468,63 +751,12 @@ class GakuManager:
         generate_kanji_cards : bool, optional
             If True, generates missing KanjiCard from dictionary entry, by default False
         """
-        # ids of the cards that were not found in the database
-        new_cards: list[str] = []
-        kanji_entries = []
-        for char in kanji_text:
-
-            db_kanji = self.db.get_card_by_key(char, CardType.KANJI)
-            if db_kanji:
-                if not isinstance(db_kanji, KanjiCard):
-                    raise ValueError(
-                        f"Incorrect card type for kanji {char}, {db_kanji}"
-                    )
-                kanji_entries.append(db_kanji)
-                continue
-            if generate_kanji_cards:
-                kanji = self.find_dictionary_kanji(char)
-                if kanji:
-                    meanings: list[AnswerText] = [
-                        AnswerText(answer_text=meaning.strip())
-                        for entry in kanji.meanings
-                        for meaning in entry.split(",")
-                    ]
-
-                    new_card = KanjiCard(
-                        writing=char,
-                        dictionary_id=kanji.ucs_codepoint,
-                        meanings=meanings,
-                        on_readings=[
-                            AnswerText(answer_text=reading)
-                            for reading in kanji.readings.get("ja_on", [])
-                        ],
-                        kun_readings=[
-                            AnswerText(answer_text=reading)
-                            for reading in kanji.readings.get("ja_kun", [])
-                        ],
-                        radical_id=kanji.radicals.get("classical", None),
-                    )
-                    kanji_entries.append(new_card)
-                    new_cards.append(new_card.card_id)
-                # else:
-                #     logging.warning(f"Kanji {char} not found in dictionary")
-                #     kanji_entries.append(
-                #         KanjiCard(
-                #             character=char,
-                #             meanings=[],
-                #             on_readings=[],
-                #             kun_readings=[],
-                #             note="Warning: Kanji not found in dictionary",
-                #             radical_id=None,
-                #         )
-                #     )
-
-        return kanji_entries, new_cards
+        resolver = ImportResolver(self.db, self.dictionary)
+        return resolver.get_kanji_cards(kanji_text, generate_kanji_cards)
 
     def get_radical_card(
         self, kanji: KanjiCard, generate_radical_cards: bool = False
     ) -> tuple[Optional[RadicalCard], list[str]]:
-        """Generates radical card for Kanji."""
         """Finds the radical in the database for the given kanji.
 
         Parameters
@@ -533,53 +765,9 @@ class GakuManager:
             Word to search radical for.
         generate_radical_cards : bool, optional
             If True, generates missing RadicalCard from dictionary entry, by default False
-
-        Raises
-        ------
-        ValueError
-            If kanji is not one character long
         """
-        # ids of the cards that were not found in the database
-        new_cards: list[str] = []
-
-        # there can be only one radical for one kanji
-
-        if kanji.radical_id is None:
-            logging.warning(f"Kanji {kanji.writing} has no radical")
-            return None, new_cards
-        dict_radical = self.find_dictionary_radical(kanji.radical_id)
-        if not dict_radical:
-            logging.warning(f"Radical for kanji {kanji.writing} not found")
-            # return RadicalCard(
-            #     dictionary_id=kanji.radical_id,
-            #     character="",
-            #     meanings=[],
-            #     reading="",
-            #     note="Warning: Radical not found in dictionary",
-            # )
-            return None, new_cards
-        db_radical = self.db.get_card_by_key(dict_radical.radical, CardType.RADICAL)
-        if db_radical:
-            if not isinstance(db_radical, RadicalCard):
-                raise ValueError(
-                    f"Incorrect card type for radical {dict_radical.radical}, {db_radical}"
-                )
-            return db_radical, new_cards
-        if generate_radical_cards:
-            new_card = RadicalCard(
-                dictionary_id=dict_radical.id,
-                writing=dict_radical.radical,
-                meanings=[
-                    AnswerText(answer_text=meaning.strip())
-                    for meaning in dict_radical.meaning.split(",")
-                ],
-                reading=dict_radical.reading_j,
-            )
-            new_cards.append(new_card.card_id)
-            return new_card, new_cards
-
-        logging.warning(f"Radical for kanji {kanji.writing} not found")
-        return None, new_cards
+        resolver = ImportResolver(self.db, self.dictionary)
+        return resolver.get_radical_card(kanji, generate_radical_cards)
 
     def generate_kanji_import(
         self,
@@ -587,112 +775,126 @@ class GakuManager:
         existing_cards: Optional[
             list[VocabCard | KanjiCard | RadicalCard | card_types.OnomatopoeiaCard]
         ] = None,
+        resolver: Optional[ImportResolver] = None,
     ) -> GeneratedImports:
-        """Generates Kanji cards for a list."""
-        logging.info(f"Generating import for kanji list: {kanji_list}")
-        # ids of the generated cards in order and with dependencies
-        import_items: list[ImportItem] = []
-        generated_cards: dict[
-            str, VocabCard | KanjiCard | RadicalCard | card_types.OnomatopoeiaCard
-        ] = {}
-        errors: list[str] = []
-        new_card_ids: list[str] = []
-
-        if not existing_cards:
-            existing_cards = []
-
-        existing_kanji_cards: dict[int, KanjiCard] = {
-            card.dictionary_id: card
-            for card in existing_cards
-            if isinstance(card, KanjiCard)
-            if card.dictionary_id is not None
-        }
-        existing_radiacal_cards: dict[int, RadicalCard] = {
-            card.dictionary_id: card
-            for card in existing_cards
-            if isinstance(card, RadicalCard)
-            if card.dictionary_id is not None
-        }
+        """Generates Kanji cards for a list.
 
+        Parameters
+        ----------
+        kanji_list : str
+            Kanji to generate the cards for.
+        existing_cards : Optional[list]
+            Cards generated before, they are reused.
+        resolver : Optional[ImportResolver]
+            Resolver with the data of the imported kanji, new one is created if None.
+        """
+        logging.info(f"Generating import for kanji list: {kanji_list}")
         if not kanji_list:
             raise ValueError("Empty kanji list")
 
+        if resolver is None:
+            resolver = ImportResolver(self.db, self.dictionary)
+        index = ImportIndex(existing_cards)
+        import_items = self.add_kanji_import_items(kanji_list, index, resolver)
+
+        logging.info(f"Generated {len(index.generated_cards)} cards for kanji")
+        return index.create_imports(import_items)
+
+    def add_kanji_import_items(
+        self, kanji_list: str, index: ImportIndex, resolver: ImportResolver
+    ) -> list[ImportItem]:
+        """Adds Kanji cards for a list and their radicals to the import.
+
+        Parameters
+        ----------
+        kanji_list : str
+            Kanji to generate the cards for.
+        index : ImportIndex
+            Index of the import, the generated cards are added to it.
+        resolver : ImportResolver
+            Resolver with the data of the imported kanji.
+
+        Returns
+        -------
+        list[ImportItem]
+            Import items of the kanji with their radicals.
+        """
+        # ids of the generated cards in order and with dependencies
+        import_items: list[ImportItem] = []
+
         # remove newlines and spaces
         kanji_list = kanji_list.replace("\n", "").replace(" ", "")
+        resolver.resolve_kanji([kanji for kanji in kanji_list if utils.is_kanji(kanji)])
 
         for kanji in kanji_list:
             if not utils.is_kanji(kanji):
                 logging.info(f"Skipping non-kanji character: {kanji}")
                 continue
 
-            kanji_cards, new_cards = self.get_kanji_cards(
+            kanji_cards, new_cards = resolver.get_kanji_cards(
                 kanji, generate_kanji_cards=True
             )
-            new_card_ids.extend(new_cards)
+            index.add_new_card_ids(new_cards)
 
             if not kanji_cards:
                 # will mostly show up when there is kana
                 # TODO: add kana detection and skip
                 logging.warning(f"Kanji '{kanji}' not found in dictionary")
-                errors.append(f"Kanji '{kanji}' not found in dictionary")
+                index.errors.append(f"Kanji '{kanji}' not found in dictionary")
                 continue
 
             for kanji_card in kanji_cards:
 
                 # check if the kanji is already imported
-                if kanji_card.dictionary_id in existing_kanji_cards:
+                existing_kanji = index.get_card(
+                    CardType.KANJI, kanji_card.dictionary_id
+                )
+                if isinstance(existing_kanji, KanjiCard):
                     logging.info(
                         f"Kanji {kanji_card.writing} already imported, replacing"
                     )
-                    if kanji_card.card_id in new_card_ids:
-                        new_card_ids.remove(kanji_card.card_id)
-                    kanji_card = existing_kanji_cards[kanji_card.dictionary_id]
-                else:
-                    if kanji_card.dictionary_id is None:
-                        error_msg = f"Kanji {kanji_card.writing} has no dictionary id"
-                        logging.warning(error_msg)
-                        errors.append(error_msg)
-                        continue
-
-                    existing_kanji_cards[kanji_card.dictionary_id] = kanji_card
-
-                generated_cards[kanji_card.card_id] = kanji_card
+                    index.discard_new_card_id(kanji_card.card_id)
+                    kanji_card = existing_kanji
+                elif kanji_card.dictionary_id is None:
+                    error_msg = f"Kanji {kanji_card.writing} has no dictionary id"
+                    logging.warning(error_msg)
+                    index.errors.append(error_msg)
+                    continue
+
+                index.add_card(kanji_card)
                 kanji_import_item = ImportItem(item_id=kanji_card.card_id)
 
-                radical_card, new_radical_cards = self.get_radical_card(
+                radical_card, new_radical_cards = resolver.get_radical_card(
                     kanji_card, generate_radical_cards=True
                 )
-                new_card_ids.extend(new_radical_cards)
+                index.add_new_card_ids(new_radical_cards)
                 if not radical_card:
                     logging.warning(
                         f"Radical for kanji {kanji} not found in dictionary"
                     )
-                    errors.append(f"Radical for kanji {kanji} not found in dictionary")
+                    index.errors.append(
+                        f"Radical for kanji {kanji} not found in dictionary"
+                    )
                     continue
 
                 # check if the radical is already imported
-                if radical_card.dictionary_id in existing_radiacal_cards:
+                existing_radical = index.get_card(
+                    CardType.RADICAL, radical_card.dictionary_id
+                )
+                if isinstance(existing_radical, RadicalCard):
                     logging.info(
                         f"Radical {radical_card.writing} already imported, replacing"
                     )
-                    if radical_card.card_id in new_card_ids:
-                        new_card_ids.remove(radical_card.card_id)
-                    radical_card = existing_radiacal_cards[radical_card.dictionary_id]
-                else:
-                    generated_cards[radical_card.card_id] = radical_card
+                    index.discard_new_card_id(radical_card.card_id)
+                    radical_card = existing_radical
+                index.add_card(radical_card)
                 kanji_import_item.sub_items.append(
                     ImportItem(item_id=radical_card.card_id)
                 )
 
                 import_items.append(kanji_import_item)
 
-        logging.info(f"Generated {len(generated_cards)} cards for kanji")
-        return GeneratedImports(
-            import_items=import_items,
-            generated_cards=generated_cards,
-            new_card_ids=new_card_ids,
-            errors=errors,
-        )
+        return import_items
 
     def generate_onomatopoeia_import(
         self,
@@ -702,56 +904,59 @@ class GakuManager:
         ] = None,
     ) -> GeneratedImports:
         """Generates Onomatopoeia card(s) for provided text."""
+        index = ImportIndex(existing_cards)
+        import_items = self.add_onomatopoeia_import_items(text, index)
+        return index.create_imports(import_items)
+
+    def add_onomatopoeia_import_items(
+        self, text: str, index: ImportIndex
+    ) -> list[ImportItem]:
+        """Adds Onomatopoeia card(s) for provided text to the import.
+
+        Parameters
+        ----------
+        text : str
+            Kana of the onomatopoeia.
+        index : ImportIndex
+            Index of the import, the generated cards are added to it.
+
+        Returns
+        -------
+        list[ImportItem]
+            Import items of the cards not imported before.
+        """
         # ids of the generated cards in order and with dependencies
         import_items: list[ImportItem] = []
-        generated_cards: dict[
-            str, VocabCard | KanjiCard | RadicalCard | card_types.OnomatopoeiaCard
-        ] = {}
-        errors: list[str] = []
-        new_card_ids: list[str] = []
-
-        if existing_cards is None:
-            existing_cards = []
-        ono_card_refs: list[str] = [
-            card.writing
-            for card in existing_cards
-            if isinstance(card, card_types.OnomatopoeiaCard)
-        ]
 
         db_ono = self.db.get_cards_by_text(
             filter=CardFilter(text=text, card_types=[card_types.CardType.ONOMATOPOEIA])
         )
         for item in db_ono:
             if not isinstance(item, card_types.OnomatopoeiaCard):
-                errors.append(f"Wrong card data for Onomatopoeia, skipping: {item}")
+                index.errors.append(
+                    f"Wrong card data for Onomatopoeia, skipping: {item}"
+                )
                 continue
 
-            if item.writing in ono_card_refs:
+            if item.writing in index.onomatopoeia_writings:
                 # card is already in the list
                 continue
-            generated_cards[item.card_id] = item
-            ono_card_refs.append(item.writing)
+            index.add_card(item)
             import_items.append(ImportItem(item_id=item.card_id, sub_items=[]))
 
         dict_ono = self.dictionary.get_ono_by_kana(text)
         for item in dict_ono:
-            if item.writing in ono_card_refs:
+            if item.writing in index.onomatopoeia_writings:
                 # card is already in the list
                 continue
-            generated_cards[item.card_id] = item
-            new_card_ids.append(item.card_id)
-            ono_card_refs.append(item.writing)
+            index.add_card(item)
+            index.add_new_card_ids([item.card_id])
             import_items.append(ImportItem(item_id=item.card_id, sub_items=[]))
 
         if len(db_ono) == 0 and len(dict_ono) == 0:
-            errors.append(f"No Onomatopoeia entry found for: {text}")
+            index.errors.append(f"No Onomatopoeia entry found for: {text}")
 
-        return GeneratedImports(
-            import_items=import_items,
-            generated_cards=generated_cards,
-            new_card_ids=new_card_ids,
-            errors=errors,
-        )
+        return import_items
 
     def generate_vocab_import(
         self, vocab_list: list[str], source_id: str = ""
@@ -759,17 +964,14 @@ class GakuManager:
         """Generates cards from a vocabulary list."""
         # ids of the generated cards in order and with dependencies
         import_items: list[ImportItem] = []
-        generated_cards: dict[
-            str, VocabCard | KanjiCard | RadicalCard | card_types.OnomatopoeiaCard
-        ] = {}
-        errors: list[str] = []
-        new_card_ids: list[str] = []
-
-        existing_vocab_cards: dict[int, VocabCard] = {}
+        # cards of the whole import, shared with the kanji and onomatopoeia imports
+        index = ImportIndex()
 
         if not vocab_list:
             raise ValueError("Empty vocab list")
 
+        # words with their notes
+        vocab_entries: list[tuple[str, str]] = []
         for vocab in vocab_list:
 
             if vocab.startswith("#"):
@@ -790,77 +992,61 @@ class GakuManager:
                 logging.info("Empty word in vocab list")
                 continue
 
+            vocab_entries.append((vocab, note))
+
+        # load the cards and dictionary data of all the words at once
+        resolver = ImportResolver(self.db, self.dictionary)
+        resolver.resolve_words(
+            [vocab for vocab, _ in vocab_entries if not vocab.startswith("@")]
+        )
+
+        for vocab, note in vocab_entries:
             if vocab.startswith("@"):
                 # Onomatopoeia card
-                ono_cards = self.generate_onomatopoeia_import(
-                    vocab[1:],
-                    [
-                        card
-                        for card in generated_cards.values()
-                        if isinstance(card, card_types.OnomatopoeiaCard)
-                    ],
+                import_items.extend(
+                    self.add_onomatopoeia_import_items(vocab[1:], index)
                 )
-                generated_cards.update(ono_cards.generated_cards)
-                errors.extend(ono_cards.errors)
-                new_card_ids.extend(ono_cards.new_card_ids)
-                for card in ono_cards.generated_cards:
-                    import_items.append(ImportItem(item_id=card))
-
                 continue
 
-            vocab_cards, new_cards = self.get_vocab_entry(
+            vocab_cards, new_cards = resolver.get_vocab_cards(
                 vocab, generate_vocab_cards=True
             )
             if len(vocab_cards) > 1:
-                errors.append(f"Multiple cards for vocab: {vocab}")
-            new_card_ids.extend(new_cards)
+                index.errors.append(f"Multiple cards for vocab: {vocab}")
+            index.add_new_card_ids(new_cards)
 
             if not vocab_cards:
                 logging.warning(f"Vocab '{vocab}' not found in dictionary")
-                errors.append(f"Vocab '{vocab}' not found in dictionary")
+                index.errors.append(f"Vocab '{vocab}' not found in dictionary")
                 continue
 
             for vocab_card in vocab_cards:
                 vocab_card.note = note + "\n" + vocab_card.note
-                if vocab_card.dictionary_id in existing_vocab_cards:
+                if index.get_card(CardType.VOCABULARY, vocab_card.dictionary_id):
                     # skip if the vocab card is already imported
                     # in case the word is in the list multiple times
                     logging.info(
                         f"Vocab {vocab_card.writing} already imported, skipping"
                     )
+                    index.discard_new_card_id(vocab_card.card_id)
                     continue
-                else:
-                    if vocab_card.dictionary_id is None:
-                        error_msg = f"Vocab {vocab_card.writing} has no dictionary id"
-                        logging.warning(error_msg)
-                        errors.append(error_msg)
-                    else:
-                        existing_vocab_cards[vocab_card.dictionary_id] = vocab_card
-
-                generated_cards[vocab_card.card_id] = vocab_card
+                elif vocab_card.dictionary_id is None:
+                    error_msg = f"Vocab {vocab_card.writing} has no dictionary id"
+                    logging.warning(error_msg)
+                    index.errors.append(error_msg)
+
+                index.add_card(vocab_card)
                 vocab_import_item = ImportItem(item_id=vocab_card.card_id)
 
-                existing_cards = list(generated_cards.values())
                 if vocab_card.writing:
-                    generated_kanji_imports = self.generate_kanji_import(
-                        vocab_card.writing, existing_cards=existing_cards
-                    )
-                    generated_cards.update(generated_kanji_imports.generated_cards)
-                    new_card_ids.extend(generated_kanji_imports.new_card_ids)
-                    errors.extend(generated_kanji_imports.errors)
                     vocab_import_item.sub_items.extend(
-                        generated_kanji_imports.import_items
+                        self.add_kanji_import_items(vocab_card.writing, index, resolver)
                     )
 
                 import_items.append(vocab_import_item)
 
-        logging.info(f"Generated {len(generated_cards)} cards for vocab")
-        return GeneratedImports(
-            import_items=import_items,
-            generated_cards=generated_cards,
-            new_card_ids=new_card_ids,
-            errors=errors,
-        )
+        logging.info(f"Generated {len(index.generated_cards)} cards for vocab")
+        return index.create_imports(import_items)
 
     def import_cards(
         self, import_data: GeneratedImports, sources: list[CardSource]
@@ -871,9 +1057,11 @@ class GakuManager:
         cards_to_add: list[
             VocabCard | KanjiCard | RadicalCard | card_types.OnomatopoeiaCard
         ] = []
-        # TODO: update the import to avoid duplicate links and
-        # switch the links back to CardSourceLink
-        source_links_to_add: set[tuple[str, str]] = set()
+        # ids of the cards not in the database and of the cards already in the list
+        new_card_ids = set(import_data.new_card_ids)
+        added_card_ids: set[str] = set()
+        # dict keeps the links in the import order, the values are not used
+        source_links_to_add: dict[tuple[str, str], None] = {}
 
         # we need to recursiverly iterate over the import items
         # and add the cards to the list in deepest first order
@@ -887,38 +1075,38 @@ class GakuManager:
 
             # attach the source link to all cards
             for source in sources:
-                source_links_to_add.add(
-                    # CardSourceLink(card_id=card.card_id, source_id=source.source_id)
-                    (card.card_id, source.source_id)
-                )
+                source_links_to_add[(card.card_id, source.source_id)] = None
 
             # only add the card if it is not already in the database
-            if card.card_id not in import_data.new_card_ids:
+            if card.card_id not in new_card_ids:
                 logging.info(f"Card {card} already imported")
                 return
 
             # check if the card was already added to the list
-            for added_card in cards_to_add:
-                if added_card.card_id == card.card_id:
-                    logging.info(f"Card {card} already in import list")
-                    return
-
-            # check the database for the card (in case the import is run multiple times)
-            # TODO: rewrite to use batch query to remove existing cards
-            #   to speed up the process
-            db_card = self.db.get_card_by_key(card.writing, card.card_type)
-            if db_card and db_card.card_id == card.card_id:
-                logging.info(f"Card {card} already imported")
+            if card.card_id in added_card_ids:
+                logging.info(f"Card {card} already in import list")
                 return
 
             logging.info(f"Adding card {card} to import list")
             cards_to_add.append(card)
+            added_card_ids.add(card.card_id)
 
         for import_item in import_data.import_items:
             add_cards_to_list(import_item)
 
+        # check the database for the cards (in case the import is run multiple times)
+        existing_card_ids = self.db.get_existing_card_ids(
+            [card.card_id for card in cards_to_add]
+        )
+        if existing_card_ids:
+            logging.info(f"{len(existing_card_ids)} cards already imported")
+            cards_to_add = [
+                card for card in cards_to_add if card.card_id not in existing_card_ids
+            ]
+
         # Batch insert cards and source links
         self.db.add_cards(cards_to_add)
+        self.update_extra_questions(cards_to_add)
         self.db.add_card_source_links(
             [
                 CardSourceLink(card_id=link[0], source_id=link[1])
@@ -926,73 +1114,273 @@ class GakuManager:
             ]
         )
 
-    def save_test_session(self) -> None:
-        """Stores current test session in a file."""
-        if self.test_session is None:
-            logging.info("No test session to save")
-            return
+    def restore_test_session(self, session_data: dict) -> TestSession:
+        """Creates test session from its saved data.
 
-        session_file = self.userdata_dir / "test_session.json"
+        The data are either compact snapshot or full dump of the session
+        stored by older versions.
+        """
+        if "snapshot_version" in session_data:
+            return TestSession.load_snapshot(
+                session_data,
+                db=self.db,
+                fsrs_handler=self.fsrs_scheduler,
+                load_balancer=self.due_load_balancer,
+            )
+        return TestSession(
+            db=self.db,
+            fsrs_handler=self.fsrs_scheduler,
+            load_balancer=self.due_load_balancer,
+            **session_data,
+        )
+
+    def save_test_session(self, session_id: str = DEFAULT_SESSION_ID) -> None:
+        """Stores test session in a file."""
+        with self.session_registry.lock(session_id):
+            if session_id not in self.session_registry.sessions:
+                logging.info(f"No test session {session_id} to save")
+                return
+
+            session_file = self.session_registry.get_journal(session_id).session_file
+            backup_prefix = f"{session_file.stem}_backup_"
+            if session_file.exists():
+                session_file.rename(
+                    session_file.with_name(
+                        f"{backup_prefix}{datetime.datetime.now().isoformat()}"
+                        f"{session_file.suffix}"
+                    )
+                )
+                logging.warning("Old test session file found, renamed to backup")
 
-        if session_file.exists():
-            session_file.rename(
-                self.userdata_dir
-                / f"test_session_backup_{datetime.datetime.now().isoformat()}.json"
+            self.session_registry.save(session_id)
+
+            # keep at most 5 backups
+            backup_files = sorted(
+                session_file.parent.glob(f"{backup_prefix}*"), reverse=True
             )
-            logging.warning("Old test session file found, renamed to backup")
+            for backup_file in backup_files[5:]:
+                backup_file.unlink()
+
+    def save_test_sessions(self) -> None:
+        """Stores all test sessions in memory in files."""
+        for session_id in list(self.session_registry.sessions):
+            self.save_test_session(session_id)
 
-        with session_file.open("w", encoding="utf-8") as f:
-            f.write(json.dumps(self.test_session.model_dump(mode="json")))
+    def load_test_session(self, session_id: str = DEFAULT_SESSION_ID) -> None:
+        """Loads test session from saved snapshot and replays its journal."""
+        self.session_registry.load(session_id)
 
-        # keep at most 5 backups
-        backup_files = sorted(
-            self.userdata_dir.glob("test_session_backup_*.json"), reverse=True
+    def start_fsrs_optimization(self) -> FSRSOptimizationStatus:
+        """Starts optimization of FSRS parameters in a worker process.
+
+        Returns
+        -------
+        FSRSOptimizationStatus
+            Status of the started optimization.
+
+        Raises
+        ------
+        ValueError
+            If the optimization is already running.
+        """
+        if self.get_fsrs_optimization_status().running:
+            raise ValueError("FSRS optimization is already running")
+
+        logging.info("Starting FSRS optimization")
+        self.fsrs_optimization_status = FSRSOptimizationStatus(running=True)
+        self.fsrs_optimization_queue = multiprocessing.Queue()
+        self.fsrs_optimization_process = multiprocessing.Process(
+            target=run_fsrs_optimization,
+            kwargs={
+                "connection_uri": self.db_connection,
+                "scheduler_file": self.fsrs_scheduler_file,
+                "status_queue": self.fsrs_optimization_queue,
+            },
+            daemon=True,
         )
-        for backup_file in backup_files[5:]:
-            backup_file.unlink()
+        self.fsrs_optimization_process.start()
+        return self.fsrs_optimization_status
 
-    def load_test_session(self) -> None:
-        """Loads test session from saved file."""
-        session_file = self.userdata_dir / "test_session.json"
+    def get_fsrs_optimization_status(self) -> FSRSOptimizationStatus:
+        """Gets status of FSRS parameters optimization.
 
-        if not session_file.exists():
-            # if there is no session file do nothing
-            logging.info("No test session file found")
-            return
+        When the optimization finishes, the optimized scheduler
+        is used for new test sessions.
 
-        with session_file.open("r", encoding="utf-8") as f:
-            session_data = json.load(f)
+        Returns
+        -------
+        FSRSOptimizationStatus
+            Status of the last started optimization.
+        """
+        if self.fsrs_optimization_process is None:
+            return self.fsrs_optimization_status
+
+        assert self.fsrs_optimization_queue is not None
+        # check if the process is alive before reading the queue,
+        # so no status sent before the process exit is missed
+        process_alive = self.fsrs_optimization_process.is_alive()
+        try:
+            while True:
+                self.fsrs_optimization_status = (
+                    self.fsrs_optimization_queue.get_nowait()
+                )
+        except queue.Empty:
+            pass
 
-        self.test_session = TestSession(db=self.db, **session_data)
+        if process_alive:
+            return self.fsrs_optimization_status
 
-    def clear_saved_test_session(self) -> None:
-        """Deletes test session file."""
-        session_file = self.userdata_dir / "test_session.json"
+        if self.fsrs_optimization_status.running:
+            self.fsrs_optimization_status.running = False
+            self.fsrs_optimization_status.error = (
+                "FSRS optimization process exited unexpectedly"
+            )
+        elif self.fsrs_optimization_status.error is None:
+            logging.info("FSRS optimization finished, loading optimized scheduler")
+            self.fsrs_scheduler = load_fsrs_scheduler(self.fsrs_scheduler_file)
+            # the sessions are used by the threads of the request handlers
+            for test_session in list(self.session_registry.sessions.values()):
+                test_session.fsrs_handler = self.fsrs_scheduler
+        self.fsrs_optimization_process = None
+        self.fsrs_optimization_queue = None
+        return self.fsrs_optimization_status
+
+    def clear_saved_test_session(self, session_id: str = DEFAULT_SESSION_ID) -> None:
+        """Deletes test session file and its journal."""
+        self.session_registry.clear(session_id)
+
+    def get_num_upcoming_cards(
+        self,
+        num_days: int = 5,
+        bucket_days: int = 1,
+        filter: Optional[CardFilter] = None,
+    ) -> dict[int, int]:
+        """Provides forecast for upcoming cards.
 
-        if session_file.exists():
-            session_file.unlink()
-            logging.info("Deleted test session file")
-        else:
-            logging.info("No test session file found")
+        The forecast is cached until the FSRS data change
+        or the cache gets too old.
+
+        Parameters
+        ----------
+        num_days: int
+            Number of days after today to include in the forecast.
+        bucket_days: int
+            Number of days grouped in one forecast entry.
+        filter: Optional[CardFilter]
+            Filter to limit the cards included in the forecast.
+
+        Returns
+        -------
+        dict[int, int]
+            Number of cards becoming due, 0 is today, 1 is tomorrow (or next bucket), etc.
+        """
+        # set the time to 0:00
+        today = datetime.datetime.now().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+
+        cache_key = json.dumps(
+            [
+                num_days,
+                bucket_days,
+                filter.model_dump(mode="json") if filter is not None else None,
+                today.isoformat(),
+            ]
+        )
+        # forecasts of older FSRS data and expired ones, e.g. from previous days,
+        # are not used anymore
+        data_version = self.db.fsrs_data_version
+        now = time.monotonic()
+        for key, (cached_version, created, _) in list(self.due_forecast_cache.items()):
+            if (
+                cached_version != data_version
+                or now - created >= DUE_FORECAST_CACHE_SECONDS
+            ):
+                del self.due_forecast_cache[key]
+
+        cached = self.due_forecast_cache.get(cache_key)
+        if cached is not None:
+            logging.info("Using cached due forecast")
+            self.due_forecast_cache.move_to_end(cache_key)
+            return cached[2]
+
+        upcoming_cards = self.db.get_due_forecast(
+            start=today, num_days=num_days, bucket_days=bucket_days, filter=filter
+        )
+        self.due_forecast_cache[cache_key] = (data_version, now, upcoming_cards)
+        while len(self.due_forecast_cache) > DUE_FORECAST_CACHE_SIZE:
+            self.due_forecast_cache.popitem(last=False)
+        return upcoming_cards
+
+    def simulate_workload(
+        self, new_cards_per_day: int = 0, num_days: int = 90
+    ) -> list[WorkloadDay]:
+        """Simulates daily review workload with current scheduler.
+
+        Parameters
+        ----------
+        new_cards_per_day: int
+            Number of new cards learned each day.
+        num_days: int
+            Number of simulated days, starting today.
 
-    def get_num_upcoming_cards(self, num_days: int = 5) -> dict[int, int]:
-        """Provides forecast for upcoming cards."""
-        # 0 is today, 1 is tomorrow, etc.
-        upcoming_by_date = datetime.datetime.now() + datetime.timedelta(days=1)
+        Returns
+        -------
+        list[WorkloadDay]
+            Simulated workload for each day, 0 is today.
+        """
         # set the time to 0:00
-        upcoming_by_date = upcoming_by_date.replace(
+        today = datetime.datetime.now().replace(
             hour=0, minute=0, second=0, microsecond=0
         )
+        start_day = to_julian_day(today.astimezone(datetime.timezone.utc))
+
+        stability, difficulty, due, last_review = self.db.get_fsrs_schedules()
+        review_duration = self.db.get_average_review_duration()
+        logging.info(
+            f"Simulating workload for {len(stability)} cards and {new_cards_per_day} new cards per day"
+        )
+        return simulate_workload(
+            scheduler=self.fsrs_scheduler,
+            stability=np.array(stability, dtype=np.float64),
+            difficulty=np.array(difficulty, dtype=np.float64),
+            due_days=np.array(due, dtype=np.float64) - start_day,
+            last_review_days=np.array(last_review, dtype=np.float64) - start_day,
+            new_cards_per_day=new_cards_per_day,
+            num_days=num_days,
+            review_seconds=(
+                review_duration / 1000
+                if review_duration is not None
+                else DEFAULT_REVIEW_SECONDS
+            ),
+        )
 
-        upcoming_cards: dict[int, int] = {}
-        num_last = self.get_num_due_cards(StartTestRequest())
-        for days in range(num_days + 1):
-            dt = datetime.timedelta(days=days)
-            num_upcoming: int = self.db.get_num_due_by_date(upcoming_by_date + dt)
-            upcoming_cards[days] = num_upcoming - num_last
-            num_last = num_upcoming
+    def reschedule_fsrs(
+        self, dry_run: bool = True, resume: bool = True
+    ) -> RescheduleReport:
+        """Reschedules all studied cards with current scheduler.
 
-        return upcoming_cards
+        Parameters
+        ----------
+        dry_run: bool
+            If True, only report the changes without storing them.
+        resume: bool
+            If True, continue interrupted rescheduling with the same scheduler.
+
+        Returns
+        -------
+        RescheduleReport
+            Report of the changes of the due dates.
+        """
+        logging.info(f"Rescheduling all cards, dry run: {dry_run}")
+        with self.fsrs_reschedule_lock:
+            return reschedule_cards(
+                db=self.db,
+                scheduler=self.fsrs_scheduler,
+                checkpoint_file=self.fsrs_reschedule_file,
+                dry_run=dry_run,
+                resume=resume,
+            )
 
     def get_num_recent_mistakes(self) -> dict[int, int]:
         """Provides counts of recent mistakes by day."""
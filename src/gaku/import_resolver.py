@@ -0,0 +1,475 @@
+"""Resolving of the cards for imported words, kanji and radicals."""
+
+import logging
+from typing import Optional
+
+from . import utils
+from .api_types import GeneratedImports, ImportItem
+from .card_types import (
+    AnswerText,
+    CardType,
+    KanjiCard,
+    OnomatopoeiaCard,
+    RadicalCard,
+    VocabCard,
+    VocabularyMeaningEntry,
+)
+from .database import DbManager
+from .db_dictionary import DictionaryManager
+from .dictionary import DictionaryEntry, Kanji, Radical
+
+ImportCardTypes = VocabCard | KanjiCard | RadicalCard | OnomatopoeiaCard
+
+
+class ImportIndex:
+    """Cards generated by an import, indexed while the import grows.
+
+    The vocabulary and kanji imports share one index, so the lookups
+    of the already generated cards do not depend on the import size.
+
+    Attributes
+    ----------
+    generated_cards: dict[str, ImportCardTypes]
+        Generated cards by card id.
+    dictionary_cards: dict[tuple[CardType, int], ImportCardTypes]
+        Known cards by card type and dictionary id, the first card wins.
+    new_card_ids: dict[str, None]
+        Ids of the cards not in the database, in the order they were added.
+    onomatopoeia_writings: set[str]
+        Writings of the known onomatopoeia cards.
+    errors: list[str]
+        Errors and notes of the import.
+    """
+
+    def __init__(self, existing_cards: Optional[list[ImportCardTypes]] = None) -> None:
+        """Initializes the index.
+
+        Parameters
+        ----------
+        existing_cards: Optional[list[ImportCardTypes]]
+            Cards generated before, they are reused instead of the same cards
+            generated again, but they are not part of the generated cards.
+        """
+        self.generated_cards: dict[str, ImportCardTypes] = {}
+        self.dictionary_cards: dict[tuple[CardType, int], ImportCardTypes] = {}
+        self.new_card_ids: dict[str, None] = {}
+        self.onomatopoeia_writings: set[str] = set()
+        self.errors: list[str] = []
+        for card in existing_cards or []:
+            self.index_card(card)
+
+    def index_card(self, card: ImportCardTypes) -> None:
+        """Adds the card to the lookups, keeps the card found first."""
+        if isinstance(card, OnomatopoeiaCard):
+            self.onomatopoeia_writings.add(card.writing)
+        elif card.dictionary_id is not None:
+            self.dictionary_cards.setdefault((card.card_type, card.dictionary_id), card)
+
+    def add_card(self, card: ImportCardTypes) -> None:
+        """Adds the card to the generated cards and the lookups."""
+        self.generated_cards[card.card_id] = card
+        self.index_card(card)
+
+    def get_card(
+        self, card_type: CardType, dictionary_id: Optional[int]
+    ) -> Optional[ImportCardTypes]:
+        """Gets known card by type and dictionary id, None if not known."""
+        if dictionary_id is None:
+            return None
+        return self.dictionary_cards.get((card_type, dictionary_id))
+
+    def add_new_card_ids(self, card_ids: list[str]) -> None:
+        """Marks the cards as not in the database."""
+        self.new_card_ids.update(dict.fromkeys(card_ids))
+
+    def discard_new_card_id(self, card_id: str) -> None:
+        """Removes card replaced by a known card from the new cards."""
+        self.new_card_ids.pop(card_id, None)
+
+    def create_imports(self, import_items: list[ImportItem]) -> GeneratedImports:
+        """Creates the generated imports with the indexed cards."""
+        return GeneratedImports(
+            import_items=import_items,
+            generated_cards=self.generated_cards,
+            new_card_ids=list(self.new_card_ids),
+            errors=self.errors,
+        )
+
+
+class ImportResolver:
+    """Finds and creates the cards for imported words, kanji and radicals.
+
+    The existing cards and the dictionary entries of all the words, their
+    kanji and radicals are loaded with a few batched queries against
+    the user database and the dictionary. The cards are then created
+    from the loaded data, so resolving a long vocabulary list does not
+    query the databases for each word and character.
+
+    Data not loaded yet are loaded when they are requested, so
+    the resolver can also be used for single words or kanji.
+
+    Attributes
+    ----------
+    vocab_cards: dict[str, list[VocabCard]]
+        Existing vocabulary cards by their key.
+    dictionary_vocab: dict[str, list[DictionaryEntry]]
+        Dictionary entries by the kanji writing of the word.
+    dictionary_vocab_by_reading: dict[str, list[DictionaryEntry]]
+        Dictionary entries by the kana writing, only for the words
+        not found by the kanji writing.
+    kanji_cards: dict[str, KanjiCard]
+        Existing kanji cards by the character.
+    dictionary_kanji: dict[str, Kanji]
+        Dictionary kanji by the character, only for the kanji without card.
+    dictionary_radicals: dict[int, Radical]
+        Dictionary radicals by the radical id.
+    radical_cards: dict[str, RadicalCard]
+        Existing radical cards by the radical character.
+    """
+
+    def __init__(self, db: DbManager, dictionary: DictionaryManager) -> None:
+        self.db = db
+        self.dictionary = dictionary
+        self.vocab_cards: dict[str, list[VocabCard]] = {}
+        self.dictionary_vocab: dict[str, list[DictionaryEntry]] = {}
+        self.dictionary_vocab_by_reading: dict[str, list[DictionaryEntry]] = {}
+        self.kanji_cards: dict[str, KanjiCard] = {}
+        self.dictionary_kanji: dict[str, Kanji] = {}
+        self.dictionary_radicals: dict[int, Radical] = {}
+        self.radical_cards: dict[str, RadicalCard] = {}
+        # already loaded words, characters and radical ids
+        self.resolved_words: set[str] = set()
+        self.resolved_kanji: set[str] = set()
+        self.resolved_radicals: set[int] = set()
+
+    def resolve_words(self, words: list[str]) -> None:
+        """Loads the cards and dictionary entries of the words and their kanji.
+
+        Parameters
+        ----------
+        words: list[str]
+            Words to load, already loaded words are skipped.
+        """
+        new_words = list(
+            dict.fromkeys(
+                word.strip()
+                for word in words
+                if word.strip() not in self.resolved_words
+            )
+        )
+        if not new_words:
+            return
+        self.resolved_words.update(new_words)
+
+        self.vocab_cards.update(self.db.get_vocab_entries_by_keys(new_words))
+        self.dictionary_vocab.update(
+            self.dictionary.get_vocabulary_by_kanji_writings(new_words)
+        )
+        # the words are searched by reading only if they are not found by writing
+        self.dictionary_vocab_by_reading.update(
+            self.dictionary.get_vocabulary_by_kana_writings(
+                [word for word in new_words if word not in self.dictionary_vocab]
+            )
+        )
+
+        # kanji of the words and of the writings of the existing cards
+        writings = new_words + [
+            card.writing
+            for word in new_words
+            for card in self.vocab_cards.get(word, [])
+        ]
+        self.resolve_kanji(
+            [char for writing in writings for char in writing if utils.is_kanji(char)]
+        )
+
+    def resolve_kanji(self, characters: list[str]) -> None:
+        """Loads the kanji cards or dictionary kanji and their radicals.
+
+        Parameters
+        ----------
+        characters: list[str]
+            Kanji characters to load, already loaded characters are skipped.
+
+        Raises
+        ------
+        ValueError
+            If the card found for a kanji is not a kanji card.
+        """
+        new_characters = list(
+            dict.fromkeys(
+                char for char in characters if char not in self.resolved_kanji
+            )
+        )
+        if not new_characters:
+            return
+        self.resolved_kanji.update(new_characters)
+
+        for char, card in self.db.get_cards_by_keys(
+            new_characters, CardType.KANJI
+        ).items():
+            if not isinstance(card, KanjiCard):
+                raise ValueError(f"Incorrect card type for kanji {char}, {card}")
+            self.kanji_cards[char] = card
+        self.dictionary_kanji.update(
+            self.dictionary.get_kanji_by_characters(
+                [char for char in new_characters if char not in self.kanji_cards]
+            )
+        )
+
+        radical_ids = [
+            (
+                self.kanji_cards[char].radical_id
+                if char in self.kanji_cards
+                else self.dictionary_kanji[char].radicals.get("classical", None)
+            )
+            for char in new_characters
+            if char in self.kanji_cards or char in self.dictionary_kanji
+        ]
+        self.resolve_radicals(
+            [radical_id for radical_id in radical_ids if radical_id is not None]
+        )
+
+    def resolve_radicals(self, radical_ids: list[int]) -> None:
+        """Loads the dictionary radicals and the radical cards.
+
+        Parameters
+        ----------
+        radical_ids: list[int]
+            Radical ids to load, already loaded ids are skipped.
+
+        Raises
+        ------
+        ValueError
+            If the card found for a radical is not a radical card.
+        """
+        new_radical_ids = list(
+            dict.fromkeys(
+                radical_id
+                for radical_id in radical_ids
+                if radical_id not in self.resolved_radicals
+            )
+        )
+        if not new_radical_ids:
+            return
+        self.resolved_radicals.update(new_radical_ids)
+
+        radicals = self.dictionary.get_radicals_by_ids(new_radical_ids)
+        self.dictionary_radicals.update(radicals)
+        for char, card in self.db.get_cards_by_keys(
+            list(dict.fromkeys(radical.radical for radical in radicals.values())),
+            CardType.RADICAL,
+        ).items():
+            if not isinstance(card, RadicalCard):
+                raise ValueError(f"Incorrect card type for radical {char}, {card}")
+            self.radical_cards[char] = card
+
+    def get_vocab_cards(
+        self, vocab_query: str, generate_vocab_cards: bool = False
+    ) -> tuple[list[VocabCard], list[str]]:
+        """Gets the cards for the word.
+
+        Parameters
+        ----------
+        vocab_query : str
+            Word to get the cards for.
+        generate_vocab_cards : bool, optional
+            If True, generates missing VocabCard from dictionary entry, by default False
+
+        Returns
+        -------
+        tuple[list[VocabCard], list[str]]
+            The cards of the word and ids of the cards not in the database.
+        """
+        # ids of the cards that were not found in the database
+        new_cards: list[str] = []
+
+        vocab_query = vocab_query.strip()
+        self.resolve_words([vocab_query])
+        # the cards are modified by the import, so each call gets its own copy
+        vocab_entries = [
+            card.model_copy(deep=True) for card in self.vocab_cards.get(vocab_query, [])
+        ]
+        if generate_vocab_cards:
+            # we have to match the entries dictionary_id with ent_seq key
+            dictionary_entries = self.dictionary_vocab.get(vocab_query, [])
+            logging.info(f"Found {dictionary_entries} entries for {vocab_query}")
+            for dictionary_entry in dictionary_entries:
+                logging.info(f"Adding vocab card {dictionary_entry}")
+                if dictionary_entry.ent_seq not in [
+                    entry.dictionary_id for entry in vocab_entries
+                ]:
+                    new_card = VocabCard(
+                        dictionary_id=dictionary_entry.ent_seq,
+                        writing=vocab_query,
+                        readings=[
+                            AnswerText(answer_text=reading)
+                            for reading in dictionary_entry.reading_elements
+                        ],
+                        # TODO: review - why test_enabled
+                        meanings=[
+                            VocabularyMeaningEntry(
+                                part_of_speech=meaning.part_of_speech,
+                                meanings=[
+                                    AnswerText(answer_text=meaning)
+                                    for meaning in meaning.meanings
+                                ],
+                                test_enabled=True,
+                            )
+                            for meaning in dictionary_entry.meanings
+                        ],
+                    )
+                    vocab_entries.append(new_card)
+                    new_cards.append(new_card.card_id)
+
+            if not dictionary_entries:
+                dictionary_reading_entries = self.dictionary_vocab_by_reading.get(
+                    vocab_query, []
+                )
+                for dictionary_entry in dictionary_reading_entries:
+                    logging.info(
+                        f"\nAdding vocab card found by reading: {dictionary_entry}"
+                    )
+                    if dictionary_entry.ent_seq not in [
+                        entry.dictionary_id for entry in vocab_entries
+                    ]:
+
+                        new_card = VocabCard(
+                            dictionary_id=dictionary_entry.ent_seq,
+                            writing=vocab_query,
+                            readings=[],  # reading is same as writing, so we don't need it
+                            # TODO: review - why test_enabled?
+                            meanings=[
+                                VocabularyMeaningEntry(
+                                    part_of_speech=meaning.part_of_speech,
+                                    meanings=[
+                                        AnswerText(answer_text=meaning)
+                                        for meaning in meaning.meanings
+                                    ],
+                                    test_enabled=True,
+                                )
+                                for meaning in dictionary_entry.meanings
+                            ],
+                            note=f"Import note: Found in dictionary by reading, kanji: {dictionary_entry.kanji_elements}",
+                        )
+                        vocab_entries.append(new_card)
+                        new_cards.append(new_card.card_id)
+
+            if not vocab_entries:
+                logging.warning(f"Word {vocab_query} not found in dictionary")
+                vocab_entries = [
+                    VocabCard(
+                        writing=vocab_query,
+                        readings=[],
+                        meanings=[],
+                        note="Warning: Word not found in dictionary",
+                    )
+                ]
+                new_cards.append(vocab_entries[0].card_id)
+
+        logging.info(f"Found {len(vocab_entries)} entries for {vocab_query}")
+        logging.debug(vocab_entries)
+        return vocab_entries, new_cards
+
+    def get_kanji_cards(
+        self, kanji_text: str, generate_kanji_cards: bool = False
+    ) -> tuple[list[KanjiCard], list[str]]:
+        """Gets the cards for the kanji in the text.
+
+        Parameters
+        ----------
+        kanji_text : str
+            Kanji to get the cards for.
+        generate_kanji_cards : bool, optional
+            If True, generates missing KanjiCard from dictionary entry, by default False
+
+        Returns
+        -------
+        tuple[list[KanjiCard], list[str]]
+            The kanji cards and ids of the cards not in the database.
+        """
+        # ids of the cards that were not found in the database
+        new_cards: list[str] = []
+        kanji_entries = []
+        self.resolve_kanji(list(kanji_text))
+        for char in kanji_text:
+
+            db_kanji = self.kanji_cards.get(char)
+            if db_kanji:
+                kanji_entries.append(db_kanji.model_copy(deep=True))
+                continue
+            if generate_kanji_cards:
+                kanji = self.dictionary_kanji.get(char)
+                if kanji:
+                    meanings: list[AnswerText] = [
+                        AnswerText(answer_text=meaning.strip())
+                        for entry in kanji.meanings
+                        for meaning in entry.split(",")
+                    ]
+
+                    new_card = KanjiCard(
+                        writing=char,
+                        dictionary_id=kanji.ucs_codepoint,
+                        meanings=meanings,
+                        on_readings=[
+                            AnswerText(answer_text=reading)
+                            for reading in kanji.readings.get("ja_on", [])
+                        ],
+                        kun_readings=[
+                            AnswerText(answer_text=reading)
+                            for reading in kanji.readings.get("ja_kun", [])
+                        ],
+                        radical_id=kanji.radicals.get("classical", None),
+                    )
+                    kanji_entries.append(new_card)
+                    new_cards.append(new_card.card_id)
+
+        return kanji_entries, new_cards
+
+    def get_radical_card(
+        self, kanji: KanjiCard, generate_radical_cards: bool = False
+    ) -> tuple[Optional[RadicalCard], list[str]]:
+        """Gets the radical card for the kanji.
+
+        Parameters
+        ----------
+        kanji : KanjiCard
+            Kanji to get the radical card for.
+        generate_radical_cards : bool, optional
+            If True, generates missing RadicalCard from dictionary entry, by default False
+
+        Returns
+        -------
+        tuple[Optional[RadicalCard], list[str]]
+            The radical card, None if not found, and ids of the cards
+            not in the database.
+        """
+        # ids of the cards that were not found in the database
+        new_cards: list[str] = []
+
+        # there can be only one radical for one kanji
+        if kanji.radical_id is None:
+            logging.warning(f"Kanji {kanji.writing} has no radical")
+            return None, new_cards
+        self.resolve_radicals([kanji.radical_id])
+        dict_radical = self.dictionary_radicals.get(kanji.radical_id)
+        if not dict_radical:
+            logging.warning(f"Radical for kanji {kanji.writing} not found")
+            return None, new_cards
+        db_radical = self.radical_cards.get(dict_radical.radical)
+        if db_radical:
+            return db_radical.model_copy(deep=True), new_cards
+        if generate_radical_cards:
+            new_card = RadicalCard(
+                dictionary_id=dict_radical.id,
+                writing=dict_radical.radical,
+                meanings=[
+                    AnswerText(answer_text=meaning.strip())
+                    for meaning in dict_radical.meaning.split(",")
+                ],
+                reading=dict_radical.reading_j,
+            )
+            new_cards.append(new_card.card_id)
+            return new_card, new_cards
+
+        logging.warning(f"Radical for kanji {kanji.writing} not found")
+        return None, new_cards
@@ -0,0 +1,182 @@
+"""Spreading of due dates to days with less reviews."""
+
+import logging
+import math
+from collections import Counter
+from copy import copy
+from datetime import datetime, timedelta
+from typing import Optional
+
+import fsrs
+
+from .database.db_fsrs import FSRSManager
+
+
+def get_fuzz_range(interval_days: int, maximum_interval: int) -> tuple[int, int]:
+    """Computes the range of intervals allowed by the fsrs interval fuzzing.
+
+    Parameters
+    ----------
+    interval_days: int
+        Interval before fuzzing in days.
+    maximum_interval: int
+        Maximum interval of the scheduler in days.
+
+    Returns
+    -------
+    tuple[int, int]
+        The shortest and the longest allowed interval in days.
+    """
+    delta = 1.0
+    for fuzz_range in fsrs.fsrs.FUZZ_RANGES:
+        delta += fuzz_range["factor"] * max(
+            min(interval_days, fuzz_range["end"]) - fuzz_range["start"], 0.0
+        )
+
+    max_interval = min(int(round(interval_days + delta)), maximum_interval)
+    min_interval = min(max(2, int(round(interval_days - delta))), max_interval)
+    return min_interval, max_interval
+
+
+class DueLoadBalancer:
+    """Schedules reviewed cards to the least loaded days.
+
+    Instead of random interval fuzzing, the due date is moved within
+    the fuzz range to the day with the lowest number of due cards,
+    so cards learned together do not all become due on the same day.
+
+    The number of due cards by day is loaded from the database once
+    and then updated with each review. It is reloaded when the FSRS data
+    are changed by something else or when the day changes.
+
+    Attributes
+    ----------
+    day_load: Counter[int]
+        Number of cards due on each day, 0 is the day starting at start.
+    start: Optional[datetime]
+        Start of the day the loads are counted from.
+    """
+
+    def __init__(self, db: FSRSManager) -> None:
+        self.db = db
+        self.day_load: Counter[int] = Counter()
+        self.start: Optional[datetime] = None
+        # version of FSRS data the loads correspond to
+        self.data_version: Optional[int] = None
+
+    def refresh(self) -> None:
+        """Reloads the loads if the FSRS data changed or a new day started."""
+        # set the time to 0:00
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = today.astimezone()
+        if self.data_version == self.db.fsrs_data_version and self.start == start:
+            return
+
+        data_version = self.db.fsrs_data_version
+        self.day_load = Counter(self.db.get_num_due_by_day(start))
+        logging.info(f"Loaded due cards for {len(self.day_load)} days")
+        self.start = start
+        self.data_version = data_version
+
+    def get_day(self, date: datetime) -> int:
+        """Gets index of the day of the date, 0 is the day starting at start."""
+        assert self.start is not None
+        return math.floor((date - self.start) / timedelta(days=1))
+
+    def review_card(
+        self,
+        scheduler: fsrs.Scheduler,
+        fsrs_card: fsrs.Card,
+        rating: fsrs.Rating,
+        review_datetime: Optional[datetime] = None,
+        review_duration: Optional[int] = None,
+    ) -> tuple[fsrs.Card, fsrs.ReviewLog]:
+        """Reviews card and moves the due date to the least loaded day.
+
+        The card is reviewed without fuzzing and the due date is then
+        chosen within the fuzz range of the scheduler. When more days
+        have the same load, the one closest to the original interval is used.
+        If the scheduler does not use fuzzing, the due date is not changed.
+
+        Parameters
+        ----------
+        scheduler: fsrs.Scheduler
+            Scheduler used to review the card.
+        fsrs_card: fsrs.Card
+            The reviewed card.
+        rating: fsrs.Rating
+            Rating of the review.
+        review_datetime: Optional[datetime]
+            Time of the review, current time if not set.
+        review_duration: Optional[int]
+            Duration of the review in milliseconds.
+
+        Returns
+        -------
+        tuple[fsrs.Card, fsrs.ReviewLog]
+            The reviewed card and the review log.
+        """
+        if not scheduler.enable_fuzzing:
+            return scheduler.review_card(
+                fsrs_card,
+                rating,
+                review_datetime=review_datetime,
+                review_duration=review_duration,
+            )
+
+        unfuzzed_scheduler = copy(scheduler)
+        unfuzzed_scheduler.enable_fuzzing = False
+        review, review_log = unfuzzed_scheduler.review_card(
+            fsrs_card,
+            rating,
+            review_datetime=review_datetime,
+            review_duration=review_duration,
+        )
+        # the fsrs scheduler fuzzes only intervals of cards in review
+        if review.state != fsrs.State.Review or review.last_review is None:
+            return review, review_log
+        last_review = review.last_review
+        interval_days = (review.due - last_review).days
+        if interval_days < 2.5:
+            return review, review_log
+
+        self.refresh()
+        min_interval, max_interval = get_fuzz_range(
+            interval_days, scheduler.maximum_interval
+        )
+        balanced_interval = min(
+            range(min_interval, max_interval + 1),
+            key=lambda interval: (
+                self.day_load[self.get_day(last_review + timedelta(days=interval))],
+                abs(interval - interval_days),
+            ),
+        )
+        review.due = last_review + timedelta(days=balanced_interval)
+        return review, review_log
+
+    def card_updated(self, prior_due: Optional[datetime], due: datetime) -> None:
+        """Updates the loads after due date of a card was stored.
+
+        Must be called right after the FSRS data were stored, otherwise
+        the loads are reloaded from the database on next use.
+
+        Parameters
+        ----------
+        prior_due: Optional[datetime]
+            Due date before the update, None if the card had no FSRS data.
+        due: datetime
+            The stored due date.
+        """
+        if (
+            self.data_version is None
+            or self.db.fsrs_data_version != self.data_version + 1
+        ):
+            # other changes happened, the loads are not valid anymore
+            self.data_version = None
+            return
+
+        if prior_due is not None and self.get_day(prior_due) >= 0:
+            self.day_load[self.get_day(prior_due)] -= 1
+        if self.get_day(due) >= 0:
+            self.day_load[self.get_day(due)] += 1
+        self.data_version = self.db.fsrs_data_version
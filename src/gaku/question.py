@@ -1,11 +1,32 @@
 """Test questions related functionality."""
 
+import hashlib
 import logging
 import re
 import uuid
 from enum import Enum
+from functools import lru_cache
 from typing import Optional
-from pydantic import BaseModel, Field, computed_field
+from pydantic import BaseModel, ConfigDict, Field, computed_field
+
+# replacements of characters in the answers
+# japanese commas with english comma, dashes with the character used in dictionary
+ANSWER_CHARACTER_TABLE = str.maketrans(
+    {"、": ",", "，": ",", "ー": "-", "~": "-", "〜": "-"}
+)
+# text in parentheses, can be in the beginning or at the end of the answer
+PARENTHESES_REGEX = re.compile(r"\s*\([^)]*\)\s*")
+# suffixes which can be left out in the romaji answers
+REMOVED_ANSWER_SUFFIXES = ["..."]
+# number of cached answer matchers
+ANSWER_MATCHER_CACHE_SIZE = 4096
+# namespace of the ids derived from the content of the questions
+CONTENT_ID_NAMESPACE = uuid.UUID("5b0e6f4e-2d7c-4f1a-9a43-8c1f2e7d9b60")
+# ids excluded from the content hash of the question
+CONTENT_HASH_EXCLUDED_IDS: dict = {
+    "question_id": True,
+    "answers": {"__all__": {"group_id": True, "answers": {"__all__": {"answer_id"}}}},
+}
 
 
 class AnswerType(Enum):
@@ -45,7 +66,7 @@ class Answer(BaseModel):
     note: Optional[str] = None
     font_size: float = 1.0
 
-    @computed_field  # type:ignore[misc]
+    @computed_field  # type: ignore[misc]
     @property
     def header_num_questions(self) -> str:
         """Adds number of required answers to header."""
@@ -76,21 +97,7 @@ class Answer(BaseModel):
         str
             processed answer text
         """
-        # first replace japanese commas with english comma
-        japanese_commas = ["、", "，"]
-        for japanese_comma in japanese_commas:
-            answer_text = answer_text.replace(japanese_comma, ",")
-        # replace dashes to the character used in dictionary
-        dashes = ["ー", "~", "〜", "-"]
-        for dash in dashes:
-            answer_text = answer_text.replace(dash, "-")
-
-        # casefold the text to ensure there are no case problems when comparing
-        answer_text = answer_text.casefold()
-
-        # not stripping text, since it might need to be split first
-
-        return answer_text
+        return prepare_answer_text(answer_text)
 
     def get_required_answers(self) -> list[str]:
         """Creates a list of required answers
@@ -108,6 +115,13 @@ class Answer(BaseModel):
 
         return required_answers
 
+    def get_matcher(self) -> "AnswerMatcher":
+        """Gets matcher checking the answers, cached by the answer content."""
+        return get_answer_matcher(
+            self.answer_type,
+            tuple((answer.answer_text, answer.required) for answer in self.answers),
+        )
+
     def check_answer(self, user_answers: TestAnswer) -> tuple[bool, list[str]]:
         """Check if the answer is correct.
 
@@ -129,98 +143,150 @@ class Answer(BaseModel):
             )
             return False, []
 
-        user_answer = user_answers[self.answer_id]
-        user_answer = self.prepare_answer(user_answer)
-        # if there is comma in the user's answer, split it and check each part
-        received_answers = set([answer.strip() for answer in user_answer.split(",")])
-        logging.info(f"Processed received answers: {received_answers}")
-
-        # if the type is ROMAJI, we need to preprocess the answer
-        if self.answer_type == AnswerType.ROMAJI:
-            logging.debug("Processing Romaji answer type")
-            # create a set of correct answers
-            expected_answers = set(
-                [self.prepare_answer(answer.answer_text) for answer in self.answers]
-            )
-            required_answers = set(self.get_required_answers())
-
-            # we want to accept anwers with the text in parentheses missing
-            # remove text in parentheses for each answer in self.answers
-            # the parenthesis can be in the beginning or at the end of the answer
-            # so the best solution is probably using regex to find what to remove
-            paren_regex = re.compile(r"\s*\([^)]*\)\s*")
-            no_paren_answers = [
-                paren_regex.sub("", answer).strip() for answer in expected_answers
-            ]
-            no_paren_required_answers: list[str] = [
-                paren_regex.sub("", required_answer).strip()
-                for required_answer in required_answers
-            ]
-            expected_answers.update(no_paren_answers)
-            required_answers.update(no_paren_required_answers)
-            logging.debug(f"Accepted answers - paren: {expected_answers}")
-            logging.debug(f"Required answers - paren: {required_answers}")
-
-            remove_suffixes = ["..."]
-            no_suffix_answers = []
-            for suffix in remove_suffixes:
-                for answer_text in expected_answers:
-                    if answer_text.endswith(suffix):
-                        no_suffix_answers.append(answer_text[0 : -len(suffix)].strip())
-                        break
-            expected_answers.update(no_suffix_answers)
-
-            no_suffix_required_answers = []
-            for suffix in remove_suffixes:
-                for answer_text in required_answers:
-                    if answer_text.endswith(suffix):
-                        no_suffix_required_answers.append(
-                            answer_text[0 : -len(suffix)].strip()
-                        )
-                        break
-            required_answers.update(no_suffix_required_answers)
-            logging.debug(f"Accepted answers - suffix: {expected_answers}")
-            logging.debug(f"Required answers - suffix: {required_answers}")
+        return self.get_matcher().check(user_answers[self.answer_id])
 
-        else:
-            logging.debug("Processing Hiragana or Katakana answer")
-            # if the type is HIRAGANA or KATAKANA we need to split the answer to set
 
-            # first replace japanese commas with english commas
-            # using casefold just to be consistent with the ROMAJI type
-            # but should not be necessary here as we are comparing kana
-            expected_answers = set()
-            for answer in self.answers:
-                answer_text = self.prepare_answer(answer.answer_text)
-                expected_answers.update([answer_text.casefold()])
+class AnswerMatcher(BaseModel):
+    """Checks user answers against precomputed accepted answers.
+
+    Attributes
+    ----------
+    expected_answers: frozenset[str]
+        Prepared texts of all accepted answers.
+    required_answers: frozenset[str]
+        Prepared texts of the required answers.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    expected_answers: frozenset[str]
+    required_answers: frozenset[str]
 
-            required_answers = set(self.get_required_answers())
+    def check(self, user_answer: str) -> tuple[bool, list[str]]:
+        """Check if the answer is correct.
+
+        Parameters
+        ----------
+        user_answer : str
+            Comma separated answers of the user.
+
+        Returns
+        -------
+        tuple[bool, list[str]]
+            True if the answer is correct and the answers which are not accepted.
+        """
+        user_answer = prepare_answer_text(user_answer)
+        # if there is comma in the user's answer, split it and check each part
+        split_answers = user_answer.split(",")
+        received_answers = set([answer.strip() for answer in split_answers])
 
         # validate there were no duplicate answers
-        if len(received_answers) != len(user_answer.split(",")):
+        if len(received_answers) != len(split_answers):
             logging.info("Duplicate answers")
-            return False, list(received_answers - expected_answers)
+            return False, list(received_answers - self.expected_answers)
 
         # verify all required answers are present
         if received_answers - received_answers:
             logging.info("Not all required answers present")
-            logging.info(f"Required: {required_answers}")
+            logging.info(f"Required: {self.required_answers}")
             logging.info(f"Provided: {received_answers}")
-            return False, list(received_answers - expected_answers - set(""))
-
-        logging.info(f"Received answers: {received_answers}")
-        logging.info(f"Correct answers: {expected_answers}")
+            return False, list(received_answers - self.expected_answers - set(""))
 
         # check if all the answers are in the set of correct answers
         # since we are using set, the order of answers does not matter
         # and we can just check if the set of received answers is a subset of the set of correct answers
-        answer_is_correct = received_answers.issubset(expected_answers)
+        answer_is_correct = received_answers.issubset(self.expected_answers)
         if not answer_is_correct:
             logging.info(
-                f"Answer is not correct, accepted answers are: {expected_answers}"
+                f"Answer is not correct, accepted answers are: {self.expected_answers}"
             )
 
-        return answer_is_correct, list(received_answers - expected_answers - set(""))
+        return answer_is_correct, list(
+            received_answers - self.expected_answers - set("")
+        )
+
+
+def prepare_answer_text(answer_text: str) -> str:
+    """Does necessary processing of answer text
+    (e.g converting all comma types to same comma).
+
+    Parameters
+    ----------
+    answer_text: str
+        Text for single answer.
+
+    Returns
+    -------
+    str
+        processed answer text
+    """
+    # casefold the text to ensure there are no case problems when comparing
+    # not stripping text, since it might need to be split first
+    return answer_text.translate(ANSWER_CHARACTER_TABLE).casefold()
+
+
+def get_accepted_variants(answer_texts: set[str]) -> set[str]:
+    """Adds variants of romaji answers accepted in addition to the full text.
+
+    The text in parentheses and the "..." suffix can be left out.
+
+    Parameters
+    ----------
+    answer_texts: set[str]
+        Prepared answer texts.
+
+    Returns
+    -------
+    set[str]
+        The answer texts with their accepted variants.
+    """
+    accepted = set(answer_texts)
+    accepted.update(
+        PARENTHESES_REGEX.sub("", answer).strip() for answer in answer_texts
+    )
+    for answer_text in list(accepted):
+        for suffix in REMOVED_ANSWER_SUFFIXES:
+            if answer_text.endswith(suffix):
+                accepted.add(answer_text[0 : -len(suffix)].strip())
+                break
+    return accepted
+
+
+@lru_cache(maxsize=ANSWER_MATCHER_CACHE_SIZE)
+def get_answer_matcher(
+    answer_type: AnswerType, answers: tuple[tuple[str, bool], ...]
+) -> AnswerMatcher:
+    """Creates matcher for the answers.
+
+    The matchers are cached, so answers with the same content
+    share one matcher.
+
+    Parameters
+    ----------
+    answer_type: AnswerType
+        Type of the answers.
+    answers: tuple[tuple[str, bool], ...]
+        The answer texts and if they are required.
+
+    Returns
+    -------
+    AnswerMatcher
+        Matcher accepting the answers.
+    """
+    expected_answers = set(prepare_answer_text(text) for text, _ in answers)
+    required_answers = set(
+        prepare_answer_text(text) for text, required in answers if required
+    )
+    # we want to accept romaji answers with the text in parentheses
+    # or the suffix missing, kana answers must match exactly
+    if answer_type == AnswerType.ROMAJI:
+        expected_answers = get_accepted_variants(expected_answers)
+        required_answers = get_accepted_variants(required_answers)
+
+    return AnswerMatcher(
+        expected_answers=frozenset(expected_answers),
+        required_answers=frozenset(required_answers),
+    )
 
 
 class AnswerGroup(BaseModel):
@@ -241,6 +307,54 @@ class TestQuestion(BaseModel):
     hint: str = ""
     answers: list[AnswerGroup]
 
+    def with_content_ids(self, kind: str) -> "TestQuestion":
+        """Gets copy of the question with ids derived from its content.
+
+        The question id is derived from the parent card id, the kind
+        of the question and the hash of the question content, the ids
+        of the answer groups and answers from the question id and their
+        position. The same question of the same card version so always
+        gets the same ids.
+
+        Parameters
+        ----------
+        kind: str
+            Kind of the question, e.g. "vocab_meanings".
+
+        Returns
+        -------
+        TestQuestion
+            The question with the content ids, the answers are copied,
+            so the answers of the card are not changed.
+        """
+        content_hash = hashlib.sha256(
+            self.model_dump_json(exclude=CONTENT_HASH_EXCLUDED_IDS).encode("utf-8")
+        ).hexdigest()
+        question_id = create_content_id(self.parent_id, kind, content_hash)
+        answer_groups = []
+        for group_index, group in enumerate(self.answers):
+            group_id = create_content_id(question_id, str(group_index))
+            answer_groups.append(
+                group.model_copy(
+                    update={
+                        "group_id": group_id,
+                        "answers": [
+                            answer.model_copy(
+                                update={
+                                    "answer_id": create_content_id(
+                                        group_id, str(answer_index)
+                                    )
+                                }
+                            )
+                            for answer_index, answer in enumerate(group.answers)
+                        ],
+                    }
+                )
+            )
+        return self.model_copy(
+            update={"question_id": question_id, "answers": answer_groups}
+        )
+
     def to_json(self) -> dict:
         """Convert test card to JSON format.
 
@@ -252,6 +366,11 @@ class TestQuestion(BaseModel):
         return self.model_dump(mode="json")
 
 
+def create_content_id(*parts: str) -> str:
+    """Creates id derived from the parts, the same parts always give the same id."""
+    return str(uuid.uuid5(CONTENT_ID_NAMESPACE, "/".join(parts)))
+
+
 def get_num_required_answers(answers: list[AnswerText]) -> int:
     """Provides number of required answers.
 
@@ -0,0 +1,137 @@
+"""Retrievability of all studied cards computed at once."""
+
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+import fsrs
+import numpy as np
+
+from .database import DbManager
+
+# julian day number of the unix epoch
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+
+
+def to_julian_day(date: datetime) -> float:
+    """Converts datetime to julian day number as used by SQLite."""
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp() / 86400 + UNIX_EPOCH_JULIAN_DAY
+
+
+class RetrievabilityEngine:
+    """Computes retrievability of all studied cards.
+
+    The FSRS memory state of the cards is kept in arrays, so the retrievability
+    of the whole collection is computed in one vectorized pass. The arrays
+    are reloaded from the database when the FSRS data change.
+
+    Attributes
+    ----------
+    card_ids: np.ndarray
+        Ids of the studied cards.
+    stability: np.ndarray
+        FSRS stability of the cards.
+    last_review: np.ndarray
+        Time of the last review of the cards in julian days.
+    """
+
+    def __init__(self, db: DbManager) -> None:
+        self.db = db
+        self.card_ids = np.empty(0, dtype=object)
+        self.stability = np.empty(0)
+        self.last_review = np.empty(0)
+        self.card_index: dict[str, int] = {}
+        # version of FSRS data the arrays were loaded from
+        self.data_version: Optional[int] = None
+
+    def refresh(self) -> None:
+        """Reloads the memory state of the cards if the FSRS data changed."""
+        if self.data_version == self.db.fsrs_data_version:
+            return
+
+        data_version = self.db.fsrs_data_version
+        card_ids, stability, last_review = self.db.get_fsrs_memory_states()
+        logging.info(f"Loaded memory state of {len(card_ids)} cards")
+        self.card_ids = np.array(card_ids, dtype=object)
+        self.stability = np.array(stability, dtype=np.float64)
+        self.last_review = np.array(last_review, dtype=np.float64)
+        self.card_index = {card_id: idx for idx, card_id in enumerate(card_ids)}
+        self.data_version = data_version
+
+    def get_retrievability(self, now: Optional[datetime] = None) -> np.ndarray:
+        """Computes current retrievability of all studied cards.
+
+        Uses the same formula as fsrs.Card.get_retrievability.
+
+        Parameters
+        ----------
+        now: Optional[datetime]
+            Time for which to compute the retrievability, current time if not set.
+
+        Returns
+        -------
+        np.ndarray
+            Retrievability of the cards in the order of card_ids.
+        """
+        self.refresh()
+        if now is None:
+            now = datetime.now(timezone.utc)
+
+        # the julian days are floats, the tolerance avoids rounding down exact days
+        elapsed_days = np.maximum(
+            np.floor(to_julian_day(now) - self.last_review + 1e-6), 0
+        )
+        return (1 + fsrs.fsrs.FACTOR * elapsed_days / self.stability) ** fsrs.fsrs.DECAY
+
+    def get_weakest_cards(
+        self,
+        num_cards: Optional[int] = None,
+        start_index: int = 0,
+        card_ids: Optional[list[str]] = None,
+        now: Optional[datetime] = None,
+    ) -> list[str]:
+        """Gets ids of the cards with the lowest retrievability.
+
+        Parameters
+        ----------
+        num_cards: Optional[int]
+            Maximum number of returned cards, all cards if not set.
+        start_index: int
+            Number of the weakest cards to skip.
+        card_ids: Optional[list[str]]
+            If set, only these cards are considered.
+        now: Optional[datetime]
+            Time for which to compute the retrievability, current time if not set.
+
+        Returns
+        -------
+        list[str]
+            Card ids ordered from the lowest retrievability.
+        """
+        retrievability = self.get_retrievability(now)
+        candidates = np.arange(len(retrievability))
+        if card_ids is not None:
+            candidates = np.array(
+                [
+                    self.card_index[card_id]
+                    for card_id in card_ids
+                    if card_id in self.card_index
+                ],
+                dtype=np.int64,
+            )
+
+        num_selected = len(candidates)
+        if num_cards is not None and num_cards > 0:
+            num_selected = min(start_index + num_cards, num_selected)
+
+        candidate_retrievability = retrievability[candidates]
+        if num_selected < len(candidates):
+            # only the weakest cards need to be sorted
+            weakest = np.argpartition(candidate_retrievability, num_selected - 1)
+            candidates = candidates[weakest[:num_selected]]
+            candidate_retrievability = candidate_retrievability[weakest[:num_selected]]
+        order = np.argsort(candidate_retrievability, kind="stable")
+
+        return self.card_ids[candidates[order][start_index:]].tolist()
@@ -0,0 +1,128 @@
+"""Messages of the test session channel.
+
+The channel is a WebSocket connection used by the test page instead of
+the REST endpoints for answering the questions. Each client message is
+a JSON object with the "type" of the request and an "id", the response
+has the same "id" and "type". The supported requests are:
+
+- "next": gets the current or the next question
+- "check": checks the "answer" without marking the question
+- "answer": answers the question with the "answer" and gets the next one
+- "mark_correct", "mark_mistake": marks the current question and gets
+  the next one, the ids of the "answer" must match the current question
+- "status": gets the session status
+
+Responses contain "check_result", "next_card" and "status" fields
+as returned by the corresponding REST endpoints. Invalid requests are
+answered with type "error" and the "detail" of the error.
+"""
+
+import json
+from typing import Any
+
+from .question import TestAnswer, TestQuestion
+from .test_session import TestSession
+
+CHANNEL_REQUEST_TYPES = [
+    "next",
+    "check",
+    "answer",
+    "mark_correct",
+    "mark_mistake",
+    "status",
+]
+
+
+class ChannelRequestError(ValueError):
+    """Request of the channel is not valid, the detail is sent to the client."""
+
+
+def decode_channel_message(message: str) -> Any:
+    """Decodes JSON message of the test session channel.
+
+    Raises
+    ------
+    ChannelRequestError
+        If the message is not valid JSON.
+    """
+    try:
+        return json.loads(message)
+    except json.JSONDecodeError as e:
+        raise ChannelRequestError(f"Message is not valid JSON: {e}") from e
+
+
+def get_answered_question(
+    test_session: TestSession, answer: TestAnswer
+) -> TestQuestion:
+    """Gets the current question after checking the answer matches it.
+
+    Raises
+    ------
+    ChannelRequestError
+        If there is no current question or the answer ids do not match.
+    """
+    try:
+        return test_session.get_answered_question(answer)
+    except ValueError as e:
+        raise ChannelRequestError(str(e)) from e
+
+
+def handle_channel_message(test_session: TestSession, message: Any) -> dict:
+    """Handles message of the test session channel.
+
+    Parameters
+    ----------
+    test_session: TestSession
+        Test session of the client.
+    message: Any
+        The received message decoded from JSON.
+
+    Returns
+    -------
+    dict
+        JSON compatible response.
+
+    Raises
+    ------
+    ChannelRequestError
+        If the message is not valid or cannot be done in the current
+        state of the session.
+    """
+    if not isinstance(message, dict):
+        raise ChannelRequestError("Message must be an object")
+    request_type = message.get("type")
+    if request_type not in CHANNEL_REQUEST_TYPES:
+        raise ChannelRequestError(f"Unknown message type: {request_type}")
+    response: dict = {"id": message.get("id"), "type": request_type}
+
+    answer: TestAnswer = {}
+    if request_type in ["check", "answer", "mark_correct", "mark_mistake"]:
+        message_answer = message.get("answer")
+        if not isinstance(message_answer, dict) or not all(
+            isinstance(key, str) and isinstance(value, str)
+            for key, value in message_answer.items()
+        ):
+            raise ChannelRequestError("Answer must be an object with text answers")
+        answer = message_answer
+        question = get_answered_question(test_session, answer)
+
+    if request_type == "check":
+        response["check_result"] = test_session.check_answer(answer).model_dump(
+            mode="json"
+        )
+        return response
+    if request_type == "answer":
+        response.update(
+            test_session.answer_and_get_next(answer).model_dump(mode="json")
+        )
+        return response
+    if request_type in ["mark_correct", "mark_mistake"]:
+        if request_type == "mark_correct":
+            test_session.mark_answer_correct(question.question_id)
+        else:
+            test_session.mark_answer_mistake(question.question_id)
+
+    if request_type != "status":
+        response["next_card"] = test_session.get_test_question().model_dump(mode="json")
+    response["status"] = test_session.get_session_status().model_dump(mode="json")
+    return response
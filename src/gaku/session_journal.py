@@ -0,0 +1,165 @@
+"""Persistence of test session as snapshot and journal of events."""
+
+import json
+import logging
+import os
+import zlib
+from pathlib import Path
+from typing import Optional, TextIO
+
+# number of journal events after which a new snapshot is written
+JOURNAL_SNAPSHOT_INTERVAL = 200
+# start of the snapshot files, followed by the compressed snapshot data
+SNAPSHOT_MAGIC = b"GAKUSNAP"
+
+
+def encode_snapshot(session_data: dict) -> bytes:
+    """Encodes snapshot data to the binary snapshot file content."""
+    return SNAPSHOT_MAGIC + zlib.compress(
+        json.dumps(session_data, separators=(",", ":")).encode("utf-8")
+    )
+
+
+def decode_snapshot(content: bytes) -> dict:
+    """Decodes snapshot data from the binary snapshot file content.
+
+    Raises
+    ------
+    ValueError
+        If the content is not a snapshot.
+    """
+    if not content.startswith(SNAPSHOT_MAGIC):
+        raise ValueError("Not a test session snapshot")
+    return json.loads(zlib.decompress(content[len(SNAPSHOT_MAGIC) :]))
+
+
+class SessionJournal:
+    """Stores test session as a snapshot and a journal of later events.
+
+    Each change of the session is appended to the journal as one JSON line,
+    so only a small write is needed per answer. The snapshot is rewritten
+    after a number of events and the journal is then emptied. The session
+    is recovered by loading the snapshot and replaying the journal.
+
+    The journal is flushed after each event, so it survives the process
+    being killed. A partially written last line is ignored on recovery.
+
+    The snapshot is stored compressed. Snapshots stored as JSON files
+    by older versions are read from the file with ".json" suffix
+    and replaced by the next written snapshot.
+
+    Attributes
+    ----------
+    session_file: Path
+        File with the snapshot of the session.
+    legacy_session_file: Path
+        JSON file with the snapshot written by older versions.
+    journal_file: Path
+        File with the events since the snapshot.
+    num_events: int
+        Number of events in the journal.
+    """
+
+    def __init__(
+        self,
+        session_file: Path,
+        journal_file: Path,
+        snapshot_interval: int = JOURNAL_SNAPSHOT_INTERVAL,
+    ) -> None:
+        self.session_file = session_file
+        self.legacy_session_file = session_file.with_suffix(".json")
+        self.journal_file = journal_file
+        self.snapshot_interval = snapshot_interval
+        self.num_events = 0
+        self.journal: Optional[TextIO] = None
+
+    def needs_snapshot(self) -> bool:
+        """Checks if a new snapshot should be written."""
+        return (
+            self.num_events >= self.snapshot_interval or not self.session_file.exists()
+        )
+
+    def write_snapshot(self, session_data: dict) -> None:
+        """Writes snapshot of the session and empties the journal.
+
+        Parameters
+        ----------
+        session_data: dict
+            The session dumped to JSON compatible snapshot data.
+        """
+        # write to a temporary file first, so the old snapshot stays valid on crash
+        tmp_file = self.session_file.with_suffix(".tmp")
+        tmp_file.write_bytes(encode_snapshot(session_data))
+        os.replace(tmp_file, self.session_file)
+        if self.legacy_session_file.exists():
+            self.legacy_session_file.unlink()
+            logging.info(f"Replaced old test session file {self.legacy_session_file}")
+
+        self.close()
+        self.journal = self.journal_file.open("w", encoding="utf-8")
+        self.num_events = 0
+        logging.info(f"Written test session snapshot to {self.session_file}")
+
+    def append(self, event: dict) -> None:
+        """Appends event to the journal.
+
+        Parameters
+        ----------
+        event: dict
+            JSON compatible event data.
+        """
+        if self.journal is None:
+            self.journal = self.journal_file.open("a", encoding="utf-8")
+        self.journal.write(json.dumps(event) + "\n")
+        self.journal.flush()
+        self.num_events += 1
+
+    def read_snapshot(self) -> Optional[dict]:
+        """Reads the snapshot, None if there is none.
+
+        Snapshot read from the old JSON file is the full dump of the session
+        without "snapshot_version".
+        """
+        if self.session_file.exists():
+            return decode_snapshot(self.session_file.read_bytes())
+        if self.legacy_session_file.exists():
+            with self.legacy_session_file.open("r", encoding="utf-8") as f:
+                return json.load(f)
+        return None
+
+    def read_events(self) -> list[dict]:
+        """Reads events from the journal.
+
+        Returns
+        -------
+        list[dict]
+            The events in the order they were appended.
+        """
+        if not self.journal_file.exists():
+            return []
+
+        events = []
+        with self.journal_file.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # the process was killed while writing the last event
+                    logging.warning("Ignoring incomplete test session journal event")
+                    break
+        return events
+
+    def clear(self) -> None:
+        """Deletes the snapshot and the journal."""
+        self.close()
+        self.num_events = 0
+        for file in [self.session_file, self.legacy_session_file, self.journal_file]:
+            if file.exists():
+                file.unlink()
+                logging.info(f"Deleted {file}")
+
+    def close(self) -> None:
+        """Closes the journal file."""
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
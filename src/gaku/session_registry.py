@@ -0,0 +1,352 @@
+"""Registry of test sessions of different clients."""
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+
+from .session_journal import SessionJournal
+from .test_session import TestSession
+
+# session used by clients that do not send a session id
+DEFAULT_SESSION_ID = "default"
+# maximum number of test sessions kept in memory
+MAX_LOADED_SESSIONS = 8
+# test sessions not used for this time are stored to disk and unloaded
+SESSION_IDLE_SECONDS = 30 * 60
+# session ids are used in file names
+SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+# stored sessions not used for this time are deleted
+STORED_SESSION_SECONDS = 30 * 24 * 60 * 60
+# written when the stored sessions were checked for the session
+# stored before the clients had their own ids
+LEGACY_SESSION_MARKER = "test_sessions.migrated"
+
+
+class SessionRegistry:
+    """Keeps test sessions by session id.
+
+    Each client, e.g. a device, uses its own session id, so the clients
+    do not overwrite each other's test session. Each session has its own lock
+    and its own snapshot and journal files.
+
+    Sessions not used for idle_seconds and the least recently used sessions
+    over max_loaded are spilled to disk - the snapshot is written
+    and the session is removed from memory. The session is loaded from
+    the snapshot and the journal again when it is used next time.
+
+    The first client with a new session id takes over the default session
+    stored before the clients had their own ids, so it can be continued.
+    This is done only for the session found on the first start after
+    the upgrade and only until a client without session id uses it.
+
+    Attributes
+    ----------
+    userdata_dir: Path
+        Directory with user data, the default session is stored there,
+        other sessions in its test_sessions subdirectory.
+    sessions: OrderedDict[str, TestSession]
+        Sessions in memory, the least recently used first.
+    """
+
+    def __init__(
+        self,
+        userdata_dir: Path,
+        restore_session: Callable[[dict], TestSession],
+        max_loaded: int = MAX_LOADED_SESSIONS,
+        idle_seconds: float = SESSION_IDLE_SECONDS,
+    ) -> None:
+        """Initializes the registry.
+
+        Parameters
+        ----------
+        userdata_dir: Path
+            Directory with user data.
+        restore_session: Callable[[dict], TestSession]
+            Creates test session from its snapshot data.
+        max_loaded: int
+            Maximum number of sessions in memory.
+        idle_seconds: float
+            Time after which unused session is spilled to disk.
+        """
+        self.userdata_dir = userdata_dir
+        self.sessions_dir = userdata_dir / "test_sessions"
+        self.restore_session = restore_session
+        self.max_loaded = max_loaded
+        self.idle_seconds = idle_seconds
+        self.sessions: OrderedDict[str, TestSession] = OrderedDict()
+        self.last_access: dict[str, float] = {}
+        self.journals: dict[str, SessionJournal] = {}
+        self.locks: dict[str, threading.RLock] = {}
+        # guards the dictionaries above
+        self.registry_lock = threading.RLock()
+        # default session stored before the upgrade can be taken over
+        self.legacy_session_pending = False
+        self.find_legacy_session()
+
+    def find_legacy_session(self) -> None:
+        """Checks for the default session stored before the clients had their ids.
+
+        Only done once, the marker file is written after the check,
+        so the default session used after the upgrade is never taken over.
+        """
+        marker_file = self.userdata_dir / LEGACY_SESSION_MARKER
+        if marker_file.exists():
+            return
+        journal = self.get_journal(DEFAULT_SESSION_ID)
+        self.legacy_session_pending = journal.session_file.exists()
+        if self.legacy_session_pending:
+            logging.info("Found default test session stored before the upgrade")
+        marker_file.touch()
+
+    def validate_session_id(self, session_id: str) -> None:
+        """Checks the session id can be used.
+
+        Raises
+        ------
+        ValueError
+            If the session id contains other characters than letters,
+            digits, "_" and "-" or is longer than 64 characters.
+        """
+        if not SESSION_ID_PATTERN.fullmatch(session_id):
+            raise ValueError(f"Invalid test session id: {session_id!r}")
+
+    def lock(self, session_id: str) -> threading.RLock:
+        """Gets lock of the session, must be held while the session is used."""
+        self.validate_session_id(session_id)
+        with self.registry_lock:
+            return self.locks.setdefault(session_id, threading.RLock())
+
+    def get_journal(self, session_id: str) -> SessionJournal:
+        """Gets journal storing the session."""
+        self.validate_session_id(session_id)
+        with self.registry_lock:
+            if session_id not in self.journals:
+                if session_id == DEFAULT_SESSION_ID:
+                    # keep the location used before there were more sessions
+                    session_file = self.userdata_dir / "test_session.snapshot"
+                    journal_file = self.userdata_dir / "test_session_journal.jsonl"
+                else:
+                    self.sessions_dir.mkdir(exist_ok=True)
+                    session_file = self.sessions_dir / f"{session_id}.snapshot"
+                    journal_file = self.sessions_dir / f"{session_id}_journal.jsonl"
+                self.journals[session_id] = SessionJournal(
+                    session_file=session_file, journal_file=journal_file
+                )
+            return self.journals[session_id]
+
+    def get(self, session_id: str) -> Optional[TestSession]:
+        """Gets the session, loads it from disk if it is not in memory.
+
+        Parameters
+        ----------
+        session_id: str
+            Id of the session.
+
+        Returns
+        -------
+        Optional[TestSession]
+            The session, None if it does not exist.
+        """
+        with self.lock(session_id):
+            with self.registry_lock:
+                if session_id == DEFAULT_SESSION_ID:
+                    # used by client without session id, not for taking over anymore
+                    self.legacy_session_pending = False
+                test_session = self.sessions.get(session_id)
+                if test_session is not None:
+                    self.sessions.move_to_end(session_id)
+                    self.last_access[session_id] = time.monotonic()
+            if test_session is None:
+                test_session = self.load(session_id)
+            if test_session is None and session_id != DEFAULT_SESSION_ID:
+                test_session = self.take_over_default(session_id)
+        self.evict()
+        return test_session
+
+    def take_over_default(self, session_id: str) -> Optional[TestSession]:
+        """Moves the default session stored before the upgrade to the session id.
+
+        Parameters
+        ----------
+        session_id: str
+            Id of the session, which does not exist.
+
+        Returns
+        -------
+        Optional[TestSession]
+            The moved session, None if there is no session to take over.
+        """
+        with self.lock(session_id), self.lock(DEFAULT_SESSION_ID):
+            with self.registry_lock:
+                if not self.legacy_session_pending:
+                    return None
+                self.legacy_session_pending = False
+                # loaded on startup
+                test_session = self.sessions.get(DEFAULT_SESSION_ID)
+            if test_session is None:
+                test_session = self.load(DEFAULT_SESSION_ID)
+            if test_session is None:
+                return None
+            logging.info(f"Session {session_id} takes over the default test session")
+            self.set(session_id, test_session)
+            with self.registry_lock:
+                self.sessions.pop(DEFAULT_SESSION_ID, None)
+                self.last_access.pop(DEFAULT_SESSION_ID, None)
+            self.clear(DEFAULT_SESSION_ID)
+            with self.registry_lock:
+                self.journals.pop(DEFAULT_SESSION_ID, None)
+            return test_session
+
+    def set(self, session_id: str, test_session: TestSession) -> None:
+        """Sets new session and starts its journal with its snapshot.
+
+        Parameters
+        ----------
+        session_id: str
+            Id of the session.
+        test_session: TestSession
+            The new session, replaces the previous session with the id.
+        """
+        with self.lock(session_id):
+            journal = self.get_journal(session_id)
+            test_session.journal = journal
+            journal.write_snapshot(test_session.dump_snapshot())
+            with self.registry_lock:
+                if session_id == DEFAULT_SESSION_ID:
+                    self.legacy_session_pending = False
+                self.sessions[session_id] = test_session
+                self.sessions.move_to_end(session_id)
+                self.last_access[session_id] = time.monotonic()
+        self.evict()
+
+    def load(self, session_id: str) -> Optional[TestSession]:
+        """Loads session from its snapshot and replays its journal.
+
+        Parameters
+        ----------
+        session_id: str
+            Id of the session.
+
+        Returns
+        -------
+        Optional[TestSession]
+            The loaded session, None if there is no snapshot.
+        """
+        with self.lock(session_id):
+            journal = self.get_journal(session_id)
+            session_data = journal.read_snapshot()
+            if session_data is None:
+                logging.info(f"No test session file found for session {session_id}")
+                return None
+
+            test_session = self.restore_session(session_data)
+            num_replayed = 0
+            for event in journal.read_events():
+                if event["sequence"] <= test_session.journal_sequence:
+                    # the event is already included in the snapshot
+                    continue
+                if event["sequence"] != test_session.journal_sequence + 1:
+                    logging.warning(f"Missing test session events before {event}")
+                    break
+                test_session.replay_event(event)
+                num_replayed += 1
+            logging.info(f"Replayed {num_replayed} events of test session {session_id}")
+
+            # loading the stored session is not its use by a client
+            legacy_session_pending = self.legacy_session_pending
+            self.set(session_id, test_session)
+            self.legacy_session_pending = legacy_session_pending
+            return test_session
+
+    def save(self, session_id: str) -> None:
+        """Writes snapshot of the session in memory and closes its journal."""
+        with self.lock(session_id):
+            test_session = self.sessions.get(session_id)
+            if test_session is None:
+                return
+            # the snapshot contains all the events, so the journal is emptied
+            journal = self.get_journal(session_id)
+            journal.write_snapshot(test_session.dump_snapshot())
+            journal.close()
+
+    def spill(self, session_id: str) -> None:
+        """Stores the session to disk and removes it from memory."""
+        with self.lock(session_id), self.registry_lock:
+            self.save(session_id)
+            self.sessions.pop(session_id, None)
+            self.last_access.pop(session_id, None)
+            self.journals.pop(session_id, None)
+            logging.info(f"Unloaded test session {session_id}")
+
+    def evict(self) -> None:
+        """Spills idle sessions and the least recently used sessions over limit.
+
+        Sessions used by other threads are skipped.
+        """
+        with self.registry_lock:
+            now = time.monotonic()
+            num_loaded = len(self.sessions)
+            for session_id in list(self.sessions):
+                idle = now - self.last_access[session_id] > self.idle_seconds
+                if not idle and num_loaded <= self.max_loaded:
+                    # the rest of the sessions were used later
+                    break
+                lock = self.lock(session_id)
+                if not lock.acquire(blocking=False):
+                    continue
+                try:
+                    self.spill(session_id)
+                    num_loaded -= 1
+                finally:
+                    lock.release()
+
+    def clear(self, session_id: str) -> None:
+        """Deletes stored snapshot and journal of the session."""
+        with self.lock(session_id):
+            self.get_journal(session_id).clear()
+
+    def remove_old_sessions(
+        self, max_age_seconds: float = STORED_SESSION_SECONDS
+    ) -> None:
+        """Deletes files of the stored sessions not used for max_age_seconds.
+
+        The files of the clients' sessions would pile up otherwise,
+        e.g. when the browser data are deleted, the client gets new id.
+        The default session is kept.
+
+        Parameters
+        ----------
+        max_age_seconds: float
+            Sessions with older snapshot and journal are deleted.
+        """
+        if not self.sessions_dir.exists():
+            return
+        session_ids = {file.stem for file in self.sessions_dir.glob("*.snapshot")}
+        session_ids.update(
+            file.name.removesuffix("_journal.jsonl")
+            for file in self.sessions_dir.glob("*_journal.jsonl")
+        )
+        oldest_time = time.time() - max_age_seconds
+        for session_id in session_ids:
+            # backups of the snapshots are removed the same way
+            session_files = [
+                file
+                for file in [
+                    self.sessions_dir / f"{session_id}.snapshot",
+                    self.sessions_dir / f"{session_id}_journal.jsonl",
+                ]
+                if file.exists()
+            ]
+            with self.registry_lock:
+                if session_id in self.sessions:
+                    continue
+                if max(file.stat().st_mtime for file in session_files) > oldest_time:
+                    continue
+                for file in session_files:
+                    file.unlink()
+                self.journals.pop(session_id, None)
+            logging.info(f"Deleted old test session {session_id}")
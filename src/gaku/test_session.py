@@ -2,27 +2,51 @@
 
 import logging
 import random
-from copy import deepcopy
-from typing import Optional, Annotated, TypeVar
+import time
+from collections import deque
+from typing import Any, Iterable, Optional, Annotated, TypeVar
 
 import fsrs
-from pydantic import BaseModel, Field, field_serializer, field_validator, ConfigDict
+from pydantic import (
+    BaseModel,
+    Field,
+    field_serializer,
+    field_validator,
+    model_validator,
+    ConfigDict,
+)
 
 from . import card_types
 from .card_types import TestCardTypes
 from .question import TestAnswer, TestQuestion
 from .database import DbManager
+from .database.db_fsrs import get_review_log_entry
+from .load_balancer import DueLoadBalancer
+from .session_journal import SessionJournal
 from .api_types import (
     NextCardMessage,
     TestStatusMessage,
     CheckResult,
     AnswerCheckResponse,
+    AnswerNextResponse,
 )
 from .config import get_config
 
-
 T = TypeVar("T")
 
+# version of the compact snapshot data created by TestSession.dump_snapshot
+SNAPSHOT_VERSION = 2
+# fields of the session stored in the snapshot by references
+SNAPSHOT_REFERENCED_FIELDS = {
+    "test_cards",
+    "remaining_questions",
+    "current_question_set",
+    "current_question",
+    "card_questions",
+    "question_card_data",
+    "check_result",
+}
+
 ExcludedField = Annotated[T, Field(exclude=True)]
 
 
@@ -62,8 +86,12 @@ class CardTestData(BaseModel):
     # for question in generated_cards:
     #     generated_questions[question.question_id] = QuestionTestData()
 
+    # False for cards without stored FSRS data, which were never reviewed
+    fsrs_stored: bool = True
     num_mistakes: int = 0
     fsrs_marked: bool = False
+    # time spent answering the questions of the card in milliseconds
+    review_duration: int = 0
 
     @field_serializer("fsrs_data")
     def serialize_fsrs_data(self, value: fsrs.Card) -> dict:
@@ -101,15 +129,17 @@ class CardTestData(BaseModel):
         self.question_test_data[question_id].mark_correct()
         return self.question_test_data[question_id].needs_correct_responses
 
-    def mark_entry(self, fsrs_manager: fsrs.Scheduler, db: DbManager) -> None:
+    def mark_entry(
+        self,
+        fsrs_manager: fsrs.Scheduler,
+        db: DbManager,
+        load_balancer: Optional[DueLoadBalancer] = None,
+    ) -> None:
         """Marks this card in FSRS database."""
         if self.num_mistakes and not self.fsrs_marked:
             # mark as mistake
             logging.info(f"FSRS - Marking card {self.card_id} as again")
-            review, _ = fsrs_manager.review_card(
-                self.fsrs_data, rating=fsrs.Rating.Again
-            )
-            db.update_card_fsrs(card_id=self.card_id, fsrs_card=review)
+            self.review_entry(fsrs_manager, db, fsrs.Rating.Again, load_balancer)
             db.mistakes_mark_mistake(card_id=self.card_id)
         else:
             # check if all generated cards are completed
@@ -123,13 +153,77 @@ class CardTestData(BaseModel):
                 return
 
             logging.info(f"FSRS - Marking card {self.card_id} as good")
-            review, _ = fsrs_manager.review_card(
-                self.fsrs_data, rating=fsrs.Rating.Good
-            )
-            db.update_card_fsrs(card_id=self.card_id, fsrs_card=review)
+            self.review_entry(fsrs_manager, db, fsrs.Rating.Good, load_balancer)
 
         self.fsrs_marked = True
 
+    def review_entry(
+        self,
+        fsrs_manager: fsrs.Scheduler,
+        db: DbManager,
+        rating: fsrs.Rating,
+        load_balancer: Optional[DueLoadBalancer] = None,
+    ) -> None:
+        """Reviews this card and stores the result and the review log.
+
+        Parameters
+        ----------
+        fsrs_manager: fsrs.Scheduler
+            Scheduler used to review the card.
+        db: DbManager
+            Database to store the result in.
+        rating: fsrs.Rating
+            Rating of the review.
+        load_balancer: Optional[DueLoadBalancer]
+            If set, the due date is moved to the least loaded day
+            instead of random fuzzing.
+        """
+        if load_balancer is not None:
+            review, review_log = load_balancer.review_card(
+                fsrs_manager,
+                self.fsrs_data,
+                rating=rating,
+                review_duration=self.review_duration or None,
+            )
+        else:
+            review, review_log = fsrs_manager.review_card(
+                self.fsrs_data,
+                rating=rating,
+                review_duration=self.review_duration or None,
+            )
+        db.update_card_fsrs(
+            card_id=self.card_id,
+            fsrs_card=review,
+            review_log=get_review_log_entry(
+                self.card_id,
+                review_log,
+                self.fsrs_data if self.fsrs_stored else None,
+            ),
+        )
+        if load_balancer is not None:
+            load_balancer.card_updated(
+                self.fsrs_data.due if self.fsrs_stored else None,
+                review.due,
+            )
+        # card with a mistake is reviewed again when it is answered correctly,
+        # the second review continues from the stored result of the first one
+        self.fsrs_data = review
+        self.fsrs_stored = True
+
+    def replay_fsrs_event(self, event: dict) -> None:
+        """Sets FSRS state of the card recorded in the journal event.
+
+        Parameters
+        ----------
+        event: dict
+            The "correct" or "mistake" event.
+        """
+        self.fsrs_marked = event["fsrs_marked"]
+        # not recorded in older journals
+        if "fsrs_data" in event:
+            self.fsrs_data = fsrs.Card.from_dict(event["fsrs_data"])
+            self.fsrs_stored = event["fsrs_stored"]
+
     def is_completed(self) -> bool:
         """Checks if current test is finished.
 
@@ -144,6 +238,74 @@ class CardTestData(BaseModel):
         )
 
 
+class QuestionRef(BaseModel):
+    """Reference to a question of a card in the session.
+
+    The questions of a card are created only when the first of them
+    is asked, until then the question is known only by its index.
+    """
+
+    card_id: str
+    # index of the question in the questions of the card
+    index: int
+
+
+class QuestionQueue(BaseModel):
+    """Queue of the remaining questions.
+
+    Shuffling the whole queue is replaced by taking the shuffled questions
+    in random order, so both shuffling and taking a question take constant
+    time on average. The questions are taken with the same probabilities
+    as from a list which is shuffled and then popped from the start.
+    """
+
+    # questions in random order, taken first
+    shuffled: list[QuestionRef] = []
+    # questions added after the last shuffle, taken in order after the shuffled
+    queued: deque[QuestionRef] = Field(default_factory=deque)
+
+    def __len__(self) -> int:
+        """Returns number of questions in the queue."""
+        return len(self.shuffled) + len(self.queued)
+
+    def append(self, question: QuestionRef) -> None:
+        """Adds question to the end of the queue."""
+        self.queued.append(question)
+
+    def shuffle(self) -> None:
+        """Shuffles all questions in the queue."""
+        self.shuffled.extend(self.queued)
+        self.queued.clear()
+
+    def next_index(self) -> Optional[int]:
+        """Chooses the next question, None if it is the first queued question."""
+        if not self.shuffled:
+            return None
+        return random.randrange(len(self.shuffled))
+
+    def popleft(self, idx: Optional[int] = None) -> QuestionRef:
+        """Removes and returns the next question.
+
+        Parameters
+        ----------
+        idx: Optional[int]
+            Index of the shuffled question to take as chosen by next_index,
+            random if not set.
+
+        Raises
+        ------
+        IndexError
+            If the queue is empty.
+        """
+        if not self.shuffled:
+            return self.queued.popleft()
+        if idx is None:
+            idx = random.randrange(len(self.shuffled))
+        # swap the question to the end, so it can be removed in constant time
+        self.shuffled[idx], self.shuffled[-1] = self.shuffled[-1], self.shuffled[idx]
+        return self.shuffled.pop()
+
+
 class TestSession(BaseModel):
     """Session for testing japanese."""
 
@@ -151,14 +313,22 @@ class TestSession(BaseModel):
 
     db: ExcludedField[DbManager]
     test_cards: dict[str, TestCardTypes] = {}
-    remaining_questions: list[TestQuestion] = []
-    current_question_set: list[TestQuestion] = []
+    remaining_questions: QuestionQueue = Field(default_factory=QuestionQueue)
+    current_question_set: deque[TestQuestion] = Field(default_factory=deque)
     current_question: Optional[TestQuestion] = None
+    # questions of the cards which were already asked, by card id
+    card_questions: dict[str, list[TestQuestion]] = {}
     question_card_data: dict[str, CardTestData] = {}
     fsrs_handler: ExcludedField[fsrs.Scheduler] = fsrs.Scheduler()
+    load_balancer: ExcludedField[Optional[DueLoadBalancer]] = None
+    journal: ExcludedField[Optional[SessionJournal]] = None
+    # number of events recorded in the journal
+    journal_sequence: int = 0
     mark_answers: bool = True
     num_current_cards: int = get_config().num_current_questions
     check_result: Optional[CheckResult] = None
+    # time when the current question was shown, used for review duration
+    question_shown_time: Optional[float] = None
 
     # statistics
     num_cards: int = 0
@@ -171,34 +341,294 @@ class TestSession(BaseModel):
     # configuration
     shuffle_questions: bool = True
 
+    @model_validator(mode="before")
+    @classmethod
+    def validate_stored_questions(cls, data: Any) -> Any:
+        """Converts sessions stored with remaining questions as list.
+
+        Such sessions have all questions created, so the remaining questions
+        are moved to the card questions and queued in their stored order.
+        """
+        if not isinstance(data, dict) or not isinstance(
+            data.get("remaining_questions"), list
+        ):
+            return data
+
+        card_questions: dict[str, list[TestQuestion]] = {}
+        remaining_questions = QuestionQueue()
+        for question_data in data["remaining_questions"]:
+            question = TestQuestion.model_validate(question_data)
+            questions = card_questions.setdefault(question.parent_id, [])
+            remaining_questions.append(
+                QuestionRef(card_id=question.parent_id, index=len(questions))
+            )
+            questions.append(question)
+        return {
+            **data,
+            "remaining_questions": remaining_questions,
+            "card_questions": card_questions,
+        }
+
+    def dump_snapshot(self) -> dict:
+        """Dumps the session to compact snapshot data.
+
+        The cards are stored only by their id together with their custom
+        questions, the rest of the card data is loaded from the database
+        when the snapshot is restored. Each created question is stored once,
+        the question queues refer to it by index of its card and its index
+        in the card questions.
+
+        Returns
+        -------
+        dict
+            JSON compatible snapshot data.
+        """
+        card_index = {card_id: index for index, card_id in enumerate(self.test_cards)}
+        question_refs = {
+            question.question_id: [card_index[card_id], index]
+            for card_id, questions in self.card_questions.items()
+            if card_id in card_index
+            for index, question in enumerate(questions)
+        }
+
+        def dump_question(question: TestQuestion) -> list[int] | dict:
+            # questions missing in the card questions are stored whole
+            return question_refs.get(
+                question.question_id, question.model_dump(mode="json")
+            )
+
+        def dump_queue(questions: Iterable[QuestionRef]) -> list[int]:
+            return [
+                value
+                for question in questions
+                for value in (card_index[question.card_id], question.index)
+            ]
+
+        return {
+            "snapshot_version": SNAPSHOT_VERSION,
+            "cards": [
+                [
+                    card.card_id,
+                    [
+                        question.model_dump(mode="json")
+                        for question in card.custom_questions
+                    ],
+                ]
+                for card in self.test_cards.values()
+            ],
+            "card_questions": [
+                [
+                    card_index[card_id],
+                    [question.model_dump(mode="json") for question in questions],
+                ]
+                for card_id, questions in self.card_questions.items()
+                if card_id in card_index
+            ],
+            "question_card_data": [
+                [
+                    card_index[card_id],
+                    card_data.fsrs_data.to_dict(),
+                    card_data.num_mistakes,
+                    card_data.fsrs_marked,
+                    card_data.review_duration,
+                    [
+                        [
+                            question_id,
+                            test_data.needs_correct_responses,
+                            test_data.mistakes,
+                        ]
+                        for question_id, test_data in card_data.question_test_data.items()
+                    ],
+                    card_data.fsrs_stored,
+                ]
+                for card_id, card_data in self.question_card_data.items()
+                if card_id in card_index
+            ],
+            "remaining_shuffled": dump_queue(self.remaining_questions.shuffled),
+            "remaining_queued": dump_queue(self.remaining_questions.queued),
+            "current_question_set": [
+                dump_question(question) for question in self.current_question_set
+            ],
+            "current_question": (
+                dump_question(self.current_question)
+                if self.current_question is not None
+                else None
+            ),
+            "check_result": (
+                [
+                    dump_question(self.check_result.question),
+                    self.check_result.correct,
+                    self.check_result.mistakes,
+                ]
+                if self.check_result is not None
+                else None
+            ),
+            "session": self.model_dump(mode="json", exclude=SNAPSHOT_REFERENCED_FIELDS),
+        }
+
+    @classmethod
+    def load_snapshot(
+        cls, snapshot: dict, db: DbManager, **kwargs: Any
+    ) -> "TestSession":
+        """Creates session from compact snapshot data.
+
+        The cards are loaded from the database, so changes of the cards
+        done since the snapshot was written are used. Deleted cards
+        are removed from the session.
+
+        Parameters
+        ----------
+        snapshot: dict
+            Snapshot data created by dump_snapshot.
+        db: DbManager
+            Database with the cards.
+        kwargs: Any
+            Other fields of the session, which are not stored.
+
+        Returns
+        -------
+        TestSession
+            The restored session.
+        """
+        card_ids: list[str] = [card_id for card_id, _ in snapshot["cards"]]
+        db_cards = {card.card_id: card for card in db.get_cards_by_ids(card_ids)}
+        test_cards: dict[str, TestCardTypes] = {}
+        for card_id, custom_questions in snapshot["cards"]:
+            card = db_cards.get(card_id)
+            if card is None:
+                logging.warning(f"Card {card_id} of the test session was deleted")
+                continue
+            card.custom_questions = [
+                TestQuestion.model_validate(question) for question in custom_questions
+            ]
+            test_cards[card_id] = card
+
+        card_questions: dict[str, list[TestQuestion]] = {
+            card_ids[index]: [
+                TestQuestion.model_validate(question) for question in questions
+            ]
+            for index, questions in snapshot["card_questions"]
+            if card_ids[index] in test_cards
+        }
+        question_card_data = {
+            card_ids[index]: CardTestData(
+                card_id=card_ids[index],
+                fsrs_data=fsrs.Card.from_dict(fsrs_data),
+                # snapshots of version 1 do not have the flag,
+                # the cards without review were not stored in the database
+                fsrs_stored=(
+                    fsrs_stored[0]
+                    if fsrs_stored
+                    else fsrs_data.get("last_review") is not None
+                ),
+                num_mistakes=num_mistakes,
+                fsrs_marked=fsrs_marked,
+                review_duration=review_duration,
+                question_test_data={
+                    question_id: QuestionTestData(
+                        needs_correct_responses=needs_correct_responses,
+                        mistakes=mistakes,
+                    )
+                    for question_id, needs_correct_responses, mistakes in test_data
+                },
+            )
+            for (
+                index,
+                fsrs_data,
+                num_mistakes,
+                fsrs_marked,
+                review_duration,
+                test_data,
+                *fsrs_stored,
+            ) in snapshot["question_card_data"]
+            if card_ids[index] in test_cards
+        }
+
+        # number of questions of the cards, the not yet created questions
+        # of changed cards can differ from the snapshot
+        num_card_questions = {
+            card_id: (
+                len(card_questions[card_id])
+                if card_id in card_questions
+                else card.get_num_test_questions()
+            )
+            for card_id, card in test_cards.items()
+        }
+
+        def load_queue(values: list[int]) -> list[QuestionRef]:
+            questions = []
+            for position in range(0, len(values), 2):
+                card_id = card_ids[values[position]]
+                index = values[position + 1]
+                if index < num_card_questions.get(card_id, 0):
+                    questions.append(QuestionRef(card_id=card_id, index=index))
+            return questions
+
+        def load_question(value: list[int] | dict) -> Optional[TestQuestion]:
+            if isinstance(value, dict):
+                return TestQuestion.model_validate(value)
+            questions = card_questions.get(card_ids[value[0]])
+            return questions[value[1]] if questions is not None else None
+
+        current_question_set: deque[TestQuestion] = deque()
+        for value in snapshot["current_question_set"]:
+            question = load_question(value)
+            if question is not None:
+                current_question_set.append(question)
+        current_question = None
+        check_result = None
+        if snapshot["current_question"] is not None:
+            current_question = load_question(snapshot["current_question"])
+        if snapshot["check_result"] is not None and current_question is not None:
+            check_question = load_question(snapshot["check_result"][0])
+            if check_question is not None:
+                check_result = CheckResult(
+                    question=check_question,
+                    correct=snapshot["check_result"][1],
+                    # not stored in snapshots of version 1
+                    mistakes=(
+                        snapshot["check_result"][2]
+                        if len(snapshot["check_result"]) > 2
+                        else {}
+                    ),
+                )
+
+        return cls(
+            db=db,
+            test_cards=test_cards,
+            remaining_questions=QuestionQueue(
+                shuffled=load_queue(snapshot["remaining_shuffled"]),
+                queued=deque(load_queue(snapshot["remaining_queued"])),
+            ),
+            current_question_set=current_question_set,
+            current_question=current_question,
+            card_questions=card_questions,
+            question_card_data=question_card_data,
+            check_result=check_result,
+            **snapshot["session"],
+            **kwargs,
+        )
+
     def load(self, card_data: list[TestCardTypes]) -> None:
         """Load cards from JSON data.
 
+        Only the number of questions of the cards is computed,
+        the questions are created when they are first asked.
+
         Parameters
         ----------
         data : dict
             JSON data with cards.
         """
-        _card_data = deepcopy(card_data)
-        self.test_cards = {card.card_id: card for card in _card_data}
+        self.test_cards = {card.card_id: card for card in card_data}
         for test_entry in self.test_cards.values():
-            generated_questions = {
-                question.question_id: question
-                for question in test_entry.get_test_questions()
-            }
-            fsrs_data = (
-                self.db.get_fsrs_data_for_card(test_entry.card_id) or fsrs.Card()
-            )
-            self.question_card_data[test_entry.card_id] = CardTestData(
-                card_id=test_entry.card_id,
-                fsrs_data=fsrs_data,
-                question_test_data={
-                    question.question_id: QuestionTestData()
-                    for question in generated_questions.values()
-                },
-            )
-            for test_question in generated_questions.values():
-                self.remaining_questions.append(test_question)
+            # reloaded cards get new questions
+            self.card_questions.pop(test_entry.card_id, None)
+            self.question_card_data.pop(test_entry.card_id, None)
+            for index in range(test_entry.get_num_test_questions()):
+                self.remaining_questions.append(
+                    QuestionRef(card_id=test_entry.card_id, index=index)
+                )
 
         # set statistics
         self.num_cards = len(self.test_cards)
@@ -210,11 +640,45 @@ class TestSession(BaseModel):
 
         # shuffle cards
         if self.shuffle_questions:
-            random.shuffle(self.remaining_questions)
+            self.remaining_questions.shuffle()
         logging.info(f"Loaded {len(self.test_cards)} cards")
         logging.debug(self.test_cards)
         logging.info(f"Remaining cards: {len(self.remaining_questions)}")
 
+    def create_card_questions(self, card_ids: list[str]) -> None:
+        """Creates questions and test data of cards.
+
+        Parameters
+        ----------
+        card_ids: list[str]
+            Ids of the cards, which have no questions created yet.
+        """
+        # get FSRS data for all cards at once instead of querying each card
+        stored_fsrs_data = self.db.get_fsrs_data_for_cards(card_ids)
+        for card_id in card_ids:
+            questions = self.test_cards[card_id].get_test_questions()
+            self.card_questions[card_id] = questions
+            self.question_card_data[card_id] = CardTestData(
+                card_id=card_id,
+                fsrs_data=stored_fsrs_data.get(card_id) or fsrs.Card(),
+                fsrs_stored=card_id in stored_fsrs_data,
+                question_test_data={
+                    question.question_id: QuestionTestData() for question in questions
+                },
+            )
+        logging.info(f"Created questions for {len(card_ids)} cards")
+
+    def get_question_ref(self, question: TestQuestion) -> QuestionRef:
+        """Gets reference to a created question."""
+        questions = self.card_questions.setdefault(question.parent_id, [])
+        for index, card_question in enumerate(questions):
+            if card_question.question_id == question.question_id:
+                return QuestionRef(card_id=question.parent_id, index=index)
+        # sessions stored before the questions were created lazily
+        # do not have the asked questions in the card questions
+        questions.append(question)
+        return QuestionRef(card_id=question.parent_id, index=len(questions) - 1)
+
     def practice_failed_cards(self) -> None:
         """Practice only cards with mistakes."""
 
@@ -234,6 +698,7 @@ class TestSession(BaseModel):
 
         # switch to practice mode
         self.mark_answers = False
+        self.record_event({"event": "practice", "failed_only": True})
 
     def practice_all_cards(self) -> None:
         """Practice all cards."""
@@ -247,6 +712,7 @@ class TestSession(BaseModel):
 
         # switch to practice mode
         self.mark_answers = False
+        self.record_event({"event": "practice", "failed_only": False})
 
     def get_test_question(self) -> NextCardMessage:
         """Get next card to test.
@@ -282,16 +748,52 @@ class TestSession(BaseModel):
             return NextCardMessage()
 
         # if current card set is empty, fill it with defined amount of cards
+        new_questions: list[QuestionRef] = []
+        picked: list[Optional[int]] = []
         while (
-            len(self.current_question_set) < self.num_current_cards
+            len(self.current_question_set) + len(new_questions) < self.num_current_cards
             and self.remaining_questions
         ):
             # take the first card to ensure the order is correct
             # for learning new cards (and to avoid getting the same card again)
-            self.current_question_set.append(self.remaining_questions.pop(0))
+            picked.append(self.remaining_questions.next_index())
+            new_questions.append(self.remaining_questions.popleft(picked[-1]))
+        new_card_ids = list(
+            {
+                question.card_id: None
+                for question in new_questions
+                if question.card_id not in self.card_questions
+            }
+        )
+        self.create_card_questions(new_card_ids)
+        for question in new_questions:
+            self.current_question_set.append(
+                self.card_questions[question.card_id][question.index]
+            )
 
         # get next card from the current card set
-        self.current_question = self.current_question_set.pop(0)
+        self.current_question = self.current_question_set.popleft()
+        self.question_shown_time = time.time()
+        self.record_event(
+            {
+                "event": "next",
+                "picked": picked,
+                # created questions are stored whole, the cards can change
+                # before the journal is replayed
+                "created": {
+                    card_id: {
+                        "questions": [
+                            question.model_dump(mode="json")
+                            for question in self.card_questions[card_id]
+                        ],
+                        "test_data": self.question_card_data[card_id].model_dump(
+                            mode="json"
+                        ),
+                    }
+                    for card_id in new_card_ids
+                },
+            }
+        )
         logging.info(f"Next card: {self.current_question.question_id}")
         parent_card_id = self.current_question.parent_id
         parent_card = self.test_cards[parent_card_id]
@@ -299,6 +801,44 @@ class TestSession(BaseModel):
             next_question=self.current_question, test_card=parent_card
         )
 
+    def get_answered_question(self, answer_response: TestAnswer) -> TestQuestion:
+        """Gets the current question after checking the answer is for it.
+
+        Used before marking the question, so a client showing other question
+        does not mark the current one.
+
+        Parameters
+        ----------
+        answer_response : TestAnswer
+            Answer to the current question.
+
+        Returns
+        -------
+        TestQuestion
+            The current question.
+
+        Raises
+        ------
+        ValueError
+            If there is no current question or the answer ids do not match
+            the answer ids of the current question.
+        """
+        if self.current_question is None:
+            raise ValueError("No current question")
+
+        # verify the answer ids and current question answer ids match
+        answer_ids = [
+            answer.answer_id
+            for group in self.current_question.answers
+            for answer in group.answers
+        ]
+        response_ids = list(answer_response.keys())
+        if not set(answer_ids) == set(response_ids):
+            raise ValueError(
+                f"Answer ids do not match current question, {answer_ids} != {response_ids}"
+            )
+        return self.current_question
+
     def check_answer(self, answer_response: TestAnswer) -> AnswerCheckResponse:
         """Check if the answer is correct.
 
@@ -329,14 +869,32 @@ class TestSession(BaseModel):
         }
 
         all_answers_correct = all([result[0] for result in check_results.values()])
+        mistakes: dict[str, list[str]] = {
+            key: value[1] for key, value in check_results.items()
+        }
 
         self.check_result = CheckResult(
-            question=self.current_question, correct=all_answers_correct
+            question=self.current_question,
+            correct=all_answers_correct,
+            mistakes=mistakes,
+        )
+
+        # add the time spent on the question to the review duration of the card
+        review_duration = 0
+        if self.question_shown_time is not None:
+            review_duration = int((time.time() - self.question_shown_time) * 1000)
+            parent_card_data = self.question_card_data[self.current_question.parent_id]
+            parent_card_data.review_duration += review_duration
+            self.question_shown_time = None
+        self.record_event(
+            {
+                "event": "check",
+                "correct": all_answers_correct,
+                "mistakes": mistakes,
+                "review_duration": review_duration,
+            }
         )
 
-        mistakes: dict[str, list[str]] = {
-            key: value[1] for key, value in check_results.items()
-        }
         response = AnswerCheckResponse(
             all_correct=all_answers_correct, mistakes=mistakes
         )
@@ -375,22 +933,28 @@ class TestSession(BaseModel):
         # increase number of correct responses
         self.num_correct_responses += 1
 
+        question_order: Optional[list[str]] = None
         if remaining_responses >= 2:
             # >= means it was mistake before, so we want to show it sooner
             logging.info(f"Putting card to current cards: {question_id}")
             if self.shuffle_questions:
                 random.shuffle(self.current_question_set)
+                question_order = [
+                    question.question_id for question in self.current_question_set
+                ]
             self.current_question_set.append(self.current_question)
         elif remaining_responses > 0:
             #  if the cards needs more correct responses, add it back to the remaining cards
             logging.info(f"Putting card back to remaining cards: {question_id}")
             if self.shuffle_questions:
                 # shuffle the set
-                random.shuffle(self.remaining_questions)
+                self.remaining_questions.shuffle()
             # add card back to the remaining cards
             # this is done after shuffling to avoid
             # getting the same card again right away
-            self.remaining_questions.append(self.current_question)
+            self.remaining_questions.append(
+                self.get_question_ref(self.current_question)
+            )
         else:
             logging.info(
                 f"No more correct responses needed for {question_id}, remaining: {remaining_responses}"
@@ -401,15 +965,28 @@ class TestSession(BaseModel):
             # so we can update the card
             # but only mark as good if the card has no mistakes
             if self.mark_answers:
-                current_question_parent.mark_entry(self.fsrs_handler, self.db)
+                current_question_parent.mark_entry(
+                    self.fsrs_handler, self.db, self.load_balancer
+                )
 
             # check if all parent cards are completed
             if current_question_parent.is_completed():
                 self.num_completed_cards += 1
+                # the questions are not asked again, only the test data are kept
+                self.card_questions.pop(parent_card_id, None)
 
         # clear current card
         self.current_question = None
         self.check_result = None
+        self.record_event(
+            {
+                "event": "correct",
+                "question_order": question_order,
+                "fsrs_marked": current_question_parent.fsrs_marked,
+                "fsrs_data": current_question_parent.fsrs_data.to_dict(),
+                "fsrs_stored": current_question_parent.fsrs_stored,
+            }
+        )
 
     def mark_answer_mistake(self, question_id: str) -> None:
         """Mark question as incorrect.
@@ -436,15 +1013,141 @@ class TestSession(BaseModel):
         self.question_card_data[parent_card_id].mark_mistake(question_id)
         if self.mark_answers:
             self.question_card_data[parent_card_id].mark_entry(
-                self.fsrs_handler, self.db
+                self.fsrs_handler, self.db, self.load_balancer
             )
 
         self.num_incorrect_responses += 1
         self.check_result = None
+        parent_card_data = self.question_card_data[parent_card_id]
+        self.record_event(
+            {
+                "event": "mistake",
+                "fsrs_marked": parent_card_data.fsrs_marked,
+                "fsrs_data": parent_card_data.fsrs_data.to_dict(),
+                "fsrs_stored": parent_card_data.fsrs_stored,
+            }
+        )
 
         # clear current card
         self.current_question
 
+    def record_event(self, event: dict) -> None:
+        """Appends event to the journal of the session, if it has one.
+
+        A new snapshot of the session is written when needed.
+
+        Parameters
+        ----------
+        event: dict
+            Change of the session, including the outcome of random choices
+            and database operations, so it can be replayed.
+        """
+        if self.journal is None:
+            return
+
+        self.journal_sequence += 1
+        self.journal.append({**event, "sequence": self.journal_sequence})
+        if self.journal.needs_snapshot():
+            self.journal.write_snapshot(self.dump_snapshot())
+
+    def replay_event(self, event: dict) -> None:
+        """Applies event recorded in the journal of the session.
+
+        The session is changed in the same way as when the event was recorded,
+        but nothing is written to the database.
+
+        Parameters
+        ----------
+        event: dict
+            The recorded event.
+
+        Raises
+        ------
+        ValueError
+            If the event does not match the state of the session.
+        """
+        event_type = event["event"]
+        if event_type == "practice":
+            if event["failed_only"]:
+                self.practice_failed_cards()
+            else:
+                self.practice_all_cards()
+            self.journal_sequence = event["sequence"]
+            return
+
+        if event_type == "next":
+            new_questions = [
+                self.remaining_questions.popleft(idx) for idx in event["picked"]
+            ]
+            for card_id, card_data in event["created"].items():
+                self.card_questions[card_id] = [
+                    TestQuestion.model_validate(question)
+                    for question in card_data["questions"]
+                ]
+                self.question_card_data[card_id] = CardTestData.model_validate(
+                    card_data["test_data"]
+                )
+            for question in new_questions:
+                self.current_question_set.append(
+                    self.card_questions[question.card_id][question.index]
+                )
+            self.current_question = self.current_question_set.popleft()
+            self.journal_sequence = event["sequence"]
+            return
+
+        if self.current_question is None:
+            raise ValueError(f"No current question for event {event}")
+        current_question = self.current_question
+        parent_card_data = self.question_card_data[current_question.parent_id]
+
+        if event_type == "check":
+            self.check_result = CheckResult(
+                question=current_question,
+                correct=event["correct"],
+                mistakes=event.get("mistakes", {}),
+            )
+            parent_card_data.review_duration += event["review_duration"]
+        elif event_type == "correct":
+            remaining_responses = parent_card_data.mark_correct(
+                current_question.question_id
+            )
+            self.num_correct_responses += 1
+            if remaining_responses >= 2:
+                if event["question_order"] is not None:
+                    question_order = {
+                        question_id: idx
+                        for idx, question_id in enumerate(event["question_order"])
+                    }
+                    self.current_question_set = deque(
+                        sorted(
+                            self.current_question_set,
+                            key=lambda set_question: question_order[
+                                set_question.question_id
+                            ],
+                        )
+                    )
+                self.current_question_set.append(current_question)
+            elif remaining_responses > 0:
+                if self.shuffle_questions:
+                    self.remaining_questions.shuffle()
+                self.remaining_questions.append(self.get_question_ref(current_question))
+            else:
+                self.num_completed_questions += 1
+                parent_card_data.replay_fsrs_event(event)
+                if parent_card_data.is_completed():
+                    self.num_completed_cards += 1
+                    self.card_questions.pop(current_question.parent_id, None)
+            self.current_question = None
+            self.check_result = None
+        elif event_type == "mistake":
+            parent_card_data.mark_mistake(current_question.question_id)
+            parent_card_data.replay_fsrs_event(event)
+            self.num_incorrect_responses += 1
+            self.check_result = None
+        else:
+            raise ValueError(f"Unknown test session event: {event_type}")
+        self.journal_sequence = event["sequence"]
+
     def answer_question(self, answer_response: TestAnswer) -> AnswerCheckResponse:
         """Answer question.
 
@@ -472,6 +1175,36 @@ class TestSession(BaseModel):
         self.mark_answer_mistake(self.current_question.question_id)
         return answer_correct
 
+    def answer_and_get_next(self, answer_response: TestAnswer) -> AnswerNextResponse:
+        """Answers current question and gets the next one.
+
+        If the current question was already checked, the result of the check
+        is used, so the session records the result shown to the user.
+
+        Parameters
+        ----------
+        answer_response : TestAnswer
+            Answer to the current question, used if it was not checked yet.
+
+        Returns
+        -------
+        AnswerNextResponse
+            Result of the answer, the next question and status of the session.
+        """
+        if self.check_result and self.check_result.question == self.current_question:
+            # the stored result is applied by get_test_question
+            check_result = AnswerCheckResponse(
+                all_correct=self.check_result.correct,
+                mistakes=self.check_result.mistakes,
+            )
+        else:
+            check_result = self.answer_question(answer_response)
+        return AnswerNextResponse(
+            check_result=check_result,
+            next_card=self.get_test_question(),
+            status=self.get_session_status(),
+        )
+
     def get_test_results(self) -> dict:
         """Get test results of the session.
 
@@ -501,7 +1234,12 @@ class TestSession(BaseModel):
             for card in self.question_card_data.values()
             for question in card.question_test_data.values()
         ]
-        num_questions = len(question_stats)
+        # questions of cards not asked yet have no test data
+        num_questions = len(question_stats) + sum(
+            card.get_num_test_questions()
+            for card in self.test_cards.values()
+            if card.card_id not in self.question_card_data
+        )
         num_questions_with_mistakes = len(
             [mistakes for mistakes in question_stats if mistakes > 0]
         )
@@ -544,26 +1282,28 @@ class TestSession(BaseModel):
         self.test_cards = {
             card_id: card
             for card_id, card in self.test_cards.items()
-            if self.question_card_data[card_id].num_mistakes > 0
+            if card_id in self.question_card_data
+            and self.question_card_data[card_id].num_mistakes > 0
         }
 
         # keep only current card set
         # TODO: this is broken, needs rework for current structure
         #   probably filter out questions with mistakes
         #   that still need to be answered
-        self.current_question_set = [
+        self.current_question_set = deque(
             card
             for card in self.current_question_set
             if self.question_card_data[card.parent_id].num_mistakes > 0
-        ]
+        )
 
         # clear current card set
-        self.current_question_set = []
+        self.current_question_set = deque()
 
         # clear remaining cards
-        self.remaining_questions = []
+        self.remaining_questions = QuestionQueue()
 
         # clear test data
+        self.card_questions = {}
         self.question_card_data = {}
 
     def is_session_finished(self) -> bool:
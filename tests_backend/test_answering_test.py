@@ -2,11 +2,13 @@
 
 import logging
 
+import pytest
 import gaku
 import gaku.api_types
 import gaku.database
 import gaku.card_types
 import gaku.question
+from gaku.session_channel import ChannelRequestError, handle_channel_message
 
 from .utils import TestSetup, get_answer_for_question
 
@@ -67,3 +69,164 @@ class TestAnswering(TestSetup):
 
         result = test.answer_question(answers)
         assert result.all_correct is True
+
+    def test_answer_and_next(self) -> None:
+        """Verifies answering the question returns the next question
+        and the status matching the separate requests.
+        """
+        cards = [
+            gaku.card_types.RadicalCard(
+                writing=f"radical {index}",
+                reading="kana",
+                meanings=[gaku.question.AnswerText(answer_text=f"meaning {index}")],
+            )
+            for index in range(3)
+        ]
+        manager = self.manager
+        manager.db.add_cards(cards)
+        test = manager.start_test_session_new_cards(gaku.api_types.StartTestRequest())
+
+        next_card = test.get_test_question()
+        answer_correct = False
+        while next_card.next_question is not None:
+            answers = get_answer_for_question(next_card)
+            if not answer_correct:
+                # the first answer is wrong
+                answers = {answer_id: "wrong" for answer_id in answers}
+            response = test.answer_and_get_next(answers)
+            assert response.check_result.all_correct is answer_correct
+            answer_correct = True
+            assert response.status == test.get_session_status()
+            assert response.next_card == test.get_test_question()
+            next_card = response.next_card
+
+        assert test.num_incorrect_responses == 1
+        assert response.status.cards_completed == len(cards)
+
+        logging.info("Checked answer is not checked again")
+        manager.db.delete_card_fsrs(cards[0].card_id)
+        test = manager.start_test_session_new_cards(
+            gaku.api_types.StartTestRequest(num_cards=1)
+        )
+        next_card = test.get_test_question()
+        answers = get_answer_for_question(next_card)
+        wrong_answers = {answer_id: "wrong" for answer_id in answers}
+        check_result = test.check_answer(wrong_answers)
+        num_events = test.journal_sequence
+        # the answer was corrected after the check
+        response = test.answer_and_get_next(answers)
+        assert response.check_result == check_result
+        assert test.num_incorrect_responses == 1
+        assert test.num_correct_responses == 0
+        # only the mistake is recorded, the question is asked again
+        assert test.journal_sequence == num_events + 1
+
+    def test_session_channel(self) -> None:
+        """Verifies the channel messages answer the questions
+        the same way as the test session methods.
+        """
+        cards = [
+            gaku.card_types.RadicalCard(
+                writing=f"radical {index}",
+                reading="kana",
+                meanings=[gaku.question.AnswerText(answer_text=f"meaning {index}")],
+            )
+            for index in range(3)
+        ]
+        manager = self.manager
+        manager.db.add_cards(cards)
+        test = manager.start_test_session_new_cards(gaku.api_types.StartTestRequest())
+
+        response = handle_channel_message(test, {"id": 1, "type": "next"})
+        assert response["id"] == 1
+        next_card = gaku.api_types.NextCardMessage.model_validate(response["next_card"])
+        assert next_card.next_question is not None
+
+        logging.info("Checking and marking the answer as correct")
+        wrong_answer = {
+            answer_id: "wrong" for answer_id in get_answer_for_question(next_card)
+        }
+        response = handle_channel_message(
+            test, {"id": 2, "type": "check", "answer": wrong_answer}
+        )
+        assert response["check_result"]["all_correct"] is False
+        with pytest.raises(ChannelRequestError):
+            handle_channel_message(
+                test, {"id": 3, "type": "mark_correct", "answer": {"other": "wrong"}}
+            )
+        response = handle_channel_message(
+            test, {"id": 3, "type": "mark_correct", "answer": wrong_answer}
+        )
+        assert response["status"]["questions_completed"] == 1
+        next_card = gaku.api_types.NextCardMessage.model_validate(response["next_card"])
+
+        logging.info("Answering the rest of the questions")
+        while next_card.next_question is not None:
+            response = handle_channel_message(
+                test,
+                {
+                    "id": 4,
+                    "type": "answer",
+                    "answer": get_answer_for_question(next_card),
+                },
+            )
+            assert response["check_result"]["all_correct"] is True
+            next_card = gaku.api_types.NextCardMessage.model_validate(
+                response["next_card"]
+            )
+        assert test.num_incorrect_responses == 0
+        assert test.num_completed_cards == len(cards)
+
+        for message in [
+            [],
+            {"type": "unknown"},
+            {"type": "answer", "answer": [1]},
+            {"type": "answer", "answer": wrong_answer},
+        ]:
+            with pytest.raises(ChannelRequestError):
+                handle_channel_message(test, message)
+
+    def test_answer_matcher(self) -> None:
+        """Verifies the accepted answer variants and sharing of the matchers."""
+        answer = gaku.question.Answer(
+            answer_type=gaku.question.AnswerType.ROMAJI,
+            answers=[
+                gaku.question.AnswerText(answer_text="(to) Eat", required=True),
+                gaku.question.AnswerText(answer_text="consume ..."),
+                gaku.question.AnswerText(answer_text="gobble ..."),
+            ],
+            header="Meanings",
+        )
+        matcher = answer.get_matcher()
+        assert matcher.expected_answers == {
+            "(to) eat",
+            "eat",
+            "consume ...",
+            "consume",
+            "gobble ...",
+            "gobble",
+        }
+        assert matcher.required_answers == {"(to) eat", "eat"}
+
+        for user_answer, expected_result in [
+            ("eat", (True, [])),
+            ("EAT、 consume", (True, [])),
+            ("(to) eat, gobble ...", (True, [])),
+            ("eat, eat", (False, [])),
+            ("eat, drink", (False, ["drink"])),
+        ]:
+            assert (
+                answer.check_answer({answer.answer_id: user_answer}) == expected_result
+            )
+        assert answer.check_answer({}) == (False, [])
+
+        logging.info("Answers with the same content share the matcher")
+        same_answer = answer.model_copy(deep=True)
+        same_answer.answer_id = "other id"
+        assert same_answer.get_matcher() is matcher
+        same_answer.answer_type = gaku.question.AnswerType.HIRAGANA
+        assert same_answer.get_matcher().expected_answers == {
+            "(to) eat",
+            "consume ...",
+            "gobble ...",
+        }
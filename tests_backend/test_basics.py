@@ -1,22 +1,36 @@
 """Tests for basic Gaku functionality."""
 
 import logging
+import time
 
 import fsrs
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
 import gaku
 import gaku.api_types
 import gaku.database
 import gaku.card_types
+import gaku.session_journal
+import gaku.session_registry
+import gaku.test_session
 from gaku.card_types import (
+    AnswerText,
     KanjiCard,
     VocabCard,
     RadicalCard,
     CardType,
     create_card_from_json,
 )
-from gaku.api_types import StartTestRequest
+from gaku.api_types import (
+    SessionBuildRequest,
+    SessionStartType,
+    StartTestRequest,
+)
+from gaku.database.db_schema import CardSourceLinkTable
+from gaku.session_registry import DEFAULT_SESSION_ID
 
-from .utils import TestSetup, get_answer_for_question
+from .utils import TestSetup, get_answer_for_question, RESOURCE_DIR, REPO_ROOT
 from .test_data import VOCAB_CARD, KANJI_CARD, RADICAL_CARD, ONOMATOPOEIA_CARD
 
 
@@ -579,6 +593,45 @@ class TestBasics(TestSetup):
         logging.info(f"Deleted sources list: {deleted_sources}")
         assert len(deleted_sources) == 0
 
+    def test_add_card_source_links(self) -> None:
+        """Verifies batch added source links skip existing links."""
+
+        manager = self.manager
+        source = gaku.api_types.CardSource(source_name="source")
+        manager.db.add_card_source(source)
+        cards: list[gaku.card_types.TestCardTypes] = [
+            VOCAB_CARD,
+            KANJI_CARD,
+            RADICAL_CARD,
+        ]
+        manager.db.add_cards(cards)
+        assert manager.db.get_existing_card_ids(
+            [card.card_id for card in cards] + ["missing"]
+        ) == {card.card_id for card in cards}
+
+        manager.db.add_card_source_link(KANJI_CARD.card_id, source.source_id)
+        manager.db.add_card_source_links(
+            [
+                gaku.api_types.CardSourceLink(
+                    card_id=card.card_id, source_id=source.source_id
+                )
+                for card in cards + cards
+            ]
+        )
+
+        with Session(manager.db.engine) as session:
+            links = session.execute(
+                select(CardSourceLinkTable.card_id, CardSourceLinkTable.position)
+                .where(CardSourceLinkTable.source_id == source.source_id)
+                .order_by(CardSourceLinkTable.position)
+            ).all()
+        logging.info(f"Source links: {links}")
+        assert [tuple(link) for link in links] == [
+            (KANJI_CARD.card_id, 1),
+            (VOCAB_CARD.card_id, 2),
+            (RADICAL_CARD.card_id, 3),
+        ]
+
     def test_ono_dictionary(self) -> None:
         """Basic test that search in onomatopoeia dictionary works."""
 
@@ -632,3 +685,541 @@ class TestBasics(TestSetup):
         assert fsrs_card is not None
         logging.info(f"FSRS data after completed test: {fsrs_card.to_dict()}")
         assert isinstance(fsrs_card, fsrs.Card)
+
+    def test_question_queue(self) -> None:
+        """Verifies the remaining questions keep their order without shuffling,
+        shuffled questions come before the ones added later
+        and the queue is kept when the session is saved.
+        """
+        cards: list[gaku.card_types.TestCardTypes] = [
+            VOCAB_CARD,
+            KANJI_CARD,
+            RADICAL_CARD,
+        ]
+        questions = [
+            gaku.test_session.QuestionRef(card_id=card.card_id, index=index)
+            for card in cards
+            for index in range(card.get_num_test_questions())
+        ]
+        queue = gaku.test_session.QuestionQueue()
+        for question in questions:
+            queue.append(question)
+        assert [queue.popleft() for _ in questions] == questions
+        assert not queue
+
+        for question in questions[1:]:
+            queue.append(question)
+        queue.shuffle()
+        queue.append(questions[0])
+        taken = [queue.popleft() for _ in questions]
+        assert sorted(taken[:-1], key=str) == sorted(questions[1:], key=str)
+        assert taken[-1] == questions[0]
+
+        logging.info("Saving and loading test session")
+        self.manager.db.add_cards(cards)
+        test_setup = StartTestRequest(num_cards=0, generate_extra_questions=False)
+        test = self.manager.start_test_session(test_setup)
+        next_question = test.get_test_question()
+        assert next_question.next_question is not None
+        test.answer_question(get_answer_for_question(next_question))
+        remaining = len(test.remaining_questions)
+        current_set = list(test.current_question_set)
+        self.manager.save_test_session()
+        self.manager.load_test_session()
+        loaded_test = self.manager.test_session
+        assert loaded_test is not None
+        assert len(loaded_test.remaining_questions) == remaining
+        assert list(loaded_test.current_question_set) == current_set
+
+        logging.info("Loading remaining questions stored as list")
+        old_questions = [
+            question for card in cards for question in card.get_test_questions()
+        ]
+        old_test = gaku.test_session.TestSession.model_validate(
+            {"db": self.manager.db, "remaining_questions": old_questions}
+        )
+        assert [
+            old_test.card_questions[question.card_id][question.index]
+            for question in old_test.remaining_questions.queued
+        ] == old_questions
+
+    def test_lazy_question_creation(self) -> None:
+        """Verifies questions are created only for the cards being asked
+        and the number of questions matches the created questions.
+        """
+        cards: list[gaku.card_types.TestCardTypes] = [
+            VOCAB_CARD,
+            KANJI_CARD,
+            RADICAL_CARD,
+            ONOMATOPOEIA_CARD,
+        ]
+        for card in cards:
+            assert card.get_num_test_questions() == len(card.get_test_questions())
+        self.manager.db.add_cards(cards)
+
+        test_setup = StartTestRequest(num_cards=0, generate_extra_questions=False)
+        test = self.manager.start_test_session(test_setup)
+        assert test.num_questions == sum(
+            len(card.get_test_questions()) for card in cards
+        )
+        assert test.card_questions == {}
+        assert test.question_card_data == {}
+
+        test.num_current_cards = 1
+        next_question = test.get_test_question()
+        assert next_question.next_question is not None
+        assert list(test.card_questions) == [next_question.next_question.parent_id]
+
+        num_asked = 0
+        while next_question.next_question is not None:
+            test.answer_question(get_answer_for_question(next_question))
+            next_question = test.get_test_question()
+            num_asked += 1
+        assert num_asked == test.num_questions
+        assert test.num_completed_cards == len(cards)
+        # completed cards keep only the test data
+        assert test.card_questions == {}
+        assert len(test.question_card_data) == len(cards)
+
+    def test_session_journal_recovery(self) -> None:
+        """Verifies the test session is recovered from the snapshot
+        and the journal when it was not saved on exit.
+        """
+        cards: list[gaku.card_types.TestCardTypes] = [
+            VOCAB_CARD,
+            KANJI_CARD,
+            RADICAL_CARD,
+            ONOMATOPOEIA_CARD,
+        ]
+        self.manager.db.add_cards(cards)
+        # snapshot is written also during the answers
+        journal = self.manager.session_registry.get_journal(DEFAULT_SESSION_ID)
+        journal.snapshot_interval = 7
+
+        test_setup = StartTestRequest(num_cards=0, generate_extra_questions=False)
+        test = self.manager.start_test_session(test_setup)
+        for num_answers in range(8):
+            next_question = test.get_test_question()
+            assert next_question.next_question is not None
+            answer = get_answer_for_question(next_question)
+            if num_answers in [1, 2]:
+                # wrong answer, the question is repeated
+                answer = {answer_id: "wrong" for answer_id in answer}
+            test.answer_question(answer)
+        next_question = test.get_test_question()
+        assert test.num_incorrect_responses == 2
+        assert journal.read_events()
+
+        logging.info("Recovering session without saving it")
+        manager = gaku.GakuManager(
+            userdata_dir=self.tempdir,
+            resource_dir=RESOURCE_DIR,
+            gaku_root_dir=REPO_ROOT,
+        )
+        manager.load_test_session()
+        recovered = manager.test_session
+        assert recovered is not None
+        assert recovered.model_dump(exclude={"question_shown_time"}) == test.model_dump(
+            exclude={"question_shown_time"}
+        )
+        assert (
+            manager.session_registry.get_journal(DEFAULT_SESSION_ID).read_events() == []
+        )
+
+        logging.info("Finishing recovered session")
+        while next_question.next_question is not None:
+            recovered.answer_question(get_answer_for_question(next_question))
+            next_question = recovered.get_test_question()
+        assert recovered.num_completed_cards == len(cards)
+
+    def test_separate_sessions(self) -> None:
+        """Verifies test sessions with different ids are independent
+        and sessions unloaded from memory are restored from disk.
+        """
+        cards: list[gaku.card_types.TestCardTypes] = [
+            VOCAB_CARD,
+            KANJI_CARD,
+            RADICAL_CARD,
+            ONOMATOPOEIA_CARD,
+        ]
+        self.manager.db.add_cards(cards)
+        registry = self.manager.session_registry
+        registry.max_loaded = 1
+
+        test_setup = StartTestRequest(num_cards=0, generate_extra_questions=False)
+        phone_test = self.manager.start_test_session(test_setup, "phone")
+        next_question = phone_test.get_test_question()
+        assert next_question.next_question is not None
+        phone_test.answer_question(get_answer_for_question(next_question))
+        phone_test.get_test_question()
+
+        logging.info("Starting second session unloads the first one")
+        desktop_test = self.manager.start_test_session(test_setup, "desktop")
+        assert list(registry.sessions) == ["desktop"]
+        assert self.manager.test_session is None
+        assert desktop_test.num_correct_responses == 0
+
+        logging.info("Restoring the first session")
+        restored_test = self.manager.get_test_session("phone")
+        assert restored_test is not None
+        assert restored_test is not phone_test
+        assert restored_test.model_dump(
+            exclude={"question_shown_time"}
+        ) == phone_test.model_dump(exclude={"question_shown_time"})
+        assert list(registry.sessions) == ["phone"]
+
+        logging.info("Idle sessions are unloaded")
+        registry.max_loaded = 2
+        registry.idle_seconds = -1
+        assert self.manager.get_test_session("desktop") is not None
+        assert list(registry.sessions) == []
+
+        with pytest.raises(ValueError):
+            self.manager.get_test_session("../cards")
+
+    def test_default_session_take_over(self) -> None:
+        """Verifies new client takes over the default session stored
+        before the upgrade and old stored sessions are deleted.
+        """
+        self.manager.db.add_cards([VOCAB_CARD, KANJI_CARD])
+
+        test_setup = StartTestRequest(num_cards=0, generate_extra_questions=False)
+        default_test = self.manager.start_test_session(test_setup)
+        self.manager.save_test_sessions()
+        (self.tempdir / gaku.session_registry.LEGACY_SESSION_MARKER).unlink()
+
+        logging.info("Starting first time after the upgrade")
+        self.manager = gaku.GakuManager(
+            userdata_dir=self.tempdir,
+            resource_dir=RESOURCE_DIR,
+            gaku_root_dir=REPO_ROOT,
+        )
+        registry = self.manager.session_registry
+        self.manager.load_test_session()
+
+        logging.info("Client with new session id continues the default session")
+        client_test = self.manager.get_test_session("client")
+        assert client_test is not None
+        assert client_test.model_dump(
+            exclude={"question_shown_time"}
+        ) == default_test.model_dump(exclude={"question_shown_time"})
+        assert self.manager.get_test_session(DEFAULT_SESSION_ID) is None
+        assert self.manager.get_test_session("other_client") is None
+
+        logging.info("Old stored sessions are deleted")
+        self.manager.save_test_sessions()
+        registry.spill("client")
+        snapshot_file = registry.get_journal("client").session_file
+        assert snapshot_file.exists()
+        registry.remove_old_sessions(max_age_seconds=3600)
+        assert snapshot_file.exists()
+        registry.remove_old_sessions(max_age_seconds=-1)
+        assert list(registry.sessions_dir.iterdir()) == []
+
+    def test_default_session_kept(self) -> None:
+        """Verifies clients with and without session id keep their sessions
+        and the default session is not taken over after it was used.
+        """
+        self.manager.db.add_cards([VOCAB_CARD, KANJI_CARD])
+        registry = self.manager.session_registry
+        test_setup = StartTestRequest(num_cards=0, generate_extra_questions=False)
+
+        logging.info("Default session started after the upgrade is kept")
+        default_test = self.manager.start_test_session(test_setup)
+        self.manager.save_test_sessions()
+        registry.spill(DEFAULT_SESSION_ID)
+        assert self.manager.get_test_session("client") is None
+        client_test = self.manager.start_test_session(test_setup, "client")
+        assert self.manager.get_test_session(DEFAULT_SESSION_ID) is not None
+        assert self.manager.get_test_session("client") is client_test
+
+        logging.info("Stored session used by client without id is not taken over")
+        self.manager.save_test_sessions()
+        (self.tempdir / gaku.session_registry.LEGACY_SESSION_MARKER).unlink()
+        self.manager = gaku.GakuManager(
+            userdata_dir=self.tempdir,
+            resource_dir=RESOURCE_DIR,
+            gaku_root_dir=REPO_ROOT,
+        )
+        self.manager.load_test_session()
+        restored_test = self.manager.get_test_session(DEFAULT_SESSION_ID)
+        assert restored_test is not None
+        assert restored_test.model_dump(
+            exclude={"question_shown_time"}
+        ) == default_test.model_dump(exclude={"question_shown_time"})
+        assert self.manager.get_test_session("other_client") is None
+        assert self.manager.get_test_session(DEFAULT_SESSION_ID) is not None
+
+    def test_stored_extra_questions(self) -> None:
+        """Verifies extra questions are stored and invalidated by changes
+        of the linked kanji card.
+        """
+        vocab_card = VOCAB_CARD.model_copy(update={"writing": "食べる"})
+        kanji_card = KANJI_CARD.model_copy(update={"writing": "食", "radical_id": None})
+        self.manager.db.add_card(vocab_card)
+        self.manager.db.add_card(kanji_card)
+        self.manager.update_extra_questions([vocab_card, kanji_card])
+
+        stored_questions = self.manager.db.get_extra_questions(
+            [vocab_card.card_id, kanji_card.card_id]
+        )
+        assert stored_questions[kanji_card.card_id] == []
+        assert len(stored_questions[vocab_card.card_id]) == 1
+        question = stored_questions[vocab_card.card_id][0]
+        assert question.parent_id == vocab_card.card_id
+        answer = question.answers[0].answers[0]
+        assert answer.header == "Kanji 食 meaning"
+        assert [text.answer_text for text in answer.answers] == ["kanji meanings"]
+
+        logging.info("Cards of words not found in dictionary have no meanings")
+        unknown_card = vocab_card.model_copy(update={"meanings": []})
+        unknown_questions = self.manager.create_extra_questions([unknown_card])
+        assert unknown_questions[unknown_card.card_id][0].hint == ""
+
+        logging.info("Changing the kanji invalidates the vocab questions")
+        updated_kanji = kanji_card.model_copy(
+            update={"meanings": [AnswerText(answer_text="eat")]}
+        )
+        self.manager.db.update_card(updated_kanji)
+        stored_questions = self.manager.db.get_extra_questions(
+            [vocab_card.card_id, kanji_card.card_id]
+        )
+        assert list(stored_questions) == []
+
+        logging.info("Missing questions are created when the test starts")
+        test_setup = StartTestRequest(num_cards=0, generate_extra_questions=True)
+        test = self.manager.start_test_session(test_setup)
+        extra_questions = test.test_cards[vocab_card.card_id].custom_questions
+        assert len(extra_questions) == 1
+        answer = extra_questions[0].answers[0].answers[0]
+        assert [text.answer_text for text in answer.answers] == ["eat"]
+        stored_questions = self.manager.db.get_extra_questions([vocab_card.card_id])
+        assert len(stored_questions[vocab_card.card_id]) == 1
+
+    def test_extra_questions_for_multiple_cards(self) -> None:
+        """Verifies extra questions of more cards are created together."""
+        eat_card = VOCAB_CARD.model_copy(update={"writing": "食べ物"})
+        thing_card = VOCAB_CARD.model_copy(
+            update={
+                "card_id": "vocab001-0feb-46fe-9a3d-5f1d81544bb8",
+                "writing": "物",
+            }
+        )
+        kana_card = VOCAB_CARD.model_copy(
+            update={
+                "card_id": "vocab002-0feb-46fe-9a3d-5f1d81544bb8",
+                "writing": "たべる",
+            }
+        )
+        eat_kanji = KANJI_CARD.model_copy(update={"writing": "食", "radical_id": None})
+        thing_kanji = KANJI_CARD.model_copy(
+            update={
+                "card_id": "kanji001-09f2-46d0-9783-f6a6518a83dc",
+                "writing": "物",
+                "radical_id": None,
+                "meanings": [AnswerText(answer_text="thing")],
+            }
+        )
+        self.manager.db.add_cards([eat_kanji, thing_kanji])
+
+        extra_questions = self.manager.create_extra_questions(
+            [eat_card, thing_card, kana_card, eat_kanji]
+        )
+        assert list(extra_questions) == [
+            eat_card.card_id,
+            thing_card.card_id,
+            kana_card.card_id,
+            eat_kanji.card_id,
+        ]
+        headers = [
+            answer.header
+            for answer in extra_questions[eat_card.card_id][0].answers[0].answers
+        ]
+        assert headers == ["Kanji 食 meaning", "Kanji 物 meaning"]
+        answers = extra_questions[thing_card.card_id][0].answers[0].answers
+        assert [text.answer_text for text in answers[0].answers] == ["thing"]
+        assert extra_questions[kana_card.card_id] == []
+        assert extra_questions[eat_kanji.card_id] == []
+
+    def test_session_build(self) -> None:
+        """Verifies test session can be built in background."""
+        cards: list[gaku.card_types.TestCardTypes] = [
+            VOCAB_CARD,
+            KANJI_CARD,
+            RADICAL_CARD,
+        ]
+        self.manager.db.add_cards(cards)
+        build_request = SessionBuildRequest(
+            start_type=SessionStartType.NEW,
+            start_request=StartTestRequest(num_cards=0, generate_extra_questions=False),
+        )
+
+        build_status = self.manager.start_test_session_build(build_request, "build")
+        assert build_status.running
+        with pytest.raises(ValueError):
+            # the session is already being built
+            self.manager.start_test_session_build(build_request, "build")
+
+        job_id = build_status.job_id
+        for _ in range(100):
+            current_status = self.manager.get_test_session_build(job_id)
+            assert current_status is not None
+            build_status = current_status
+            if not build_status.running:
+                break
+            time.sleep(0.05)
+        logging.info(f"Build status: {build_status}")
+        assert not build_status.running
+        assert build_status.error is None
+        assert build_status.stage == "finished"
+        assert build_status.num_cards == len(cards)
+
+        test_session = self.manager.get_test_session("build")
+        assert test_session is not None
+        assert build_status.num_questions == test_session.num_questions
+        assert test_session.get_test_question().next_question is not None
+
+        logging.info("Recent mistakes session requires time since")
+        with pytest.raises(ValueError):
+            self.manager.start_test_session_build(
+                SessionBuildRequest(
+                    start_type=SessionStartType.RECENT_MISTAKES,
+                    start_request=StartTestRequest(),
+                ),
+                "build",
+            )
+        assert self.manager.get_test_session_build("unknown") is None
+
+    def test_compact_snapshot(self) -> None:
+        """Verifies test session is stored as compact snapshot, old JSON
+        sessions are migrated and deleted cards are removed on load.
+        """
+        cards: list[gaku.card_types.TestCardTypes] = [
+            VOCAB_CARD,
+            KANJI_CARD,
+            RADICAL_CARD,
+            ONOMATOPOEIA_CARD,
+        ]
+        self.manager.db.add_cards(cards)
+        test_setup = StartTestRequest(num_cards=0, generate_extra_questions=False)
+        test = self.manager.start_test_session(test_setup)
+        test.num_current_cards = 2
+        next_question = test.get_test_question()
+        assert next_question.next_question is not None
+        test.check_answer(get_answer_for_question(next_question))
+        journal = self.manager.session_registry.get_journal(DEFAULT_SESSION_ID)
+        exclude = {"question_shown_time"}
+
+        snapshot = test.dump_snapshot()
+        assert "test_cards" not in snapshot
+        restored = gaku.test_session.TestSession.load_snapshot(
+            snapshot, db=self.manager.db
+        )
+        assert restored.model_dump(exclude=exclude) == test.model_dump(exclude=exclude)
+
+        logging.info("Migrating session stored as JSON")
+        self.manager.save_test_sessions()
+        journal.session_file.unlink()
+        journal.legacy_session_file.write_text(test.model_dump_json(), encoding="utf-8")
+        self.manager.session_registry.sessions.clear()
+        self.manager.load_test_session()
+        migrated = self.manager.test_session
+        assert migrated is not None
+        assert migrated.model_dump(exclude=exclude) == test.model_dump(exclude=exclude)
+        assert journal.session_file.read_bytes().startswith(
+            gaku.session_journal.SNAPSHOT_MAGIC
+        )
+        assert not journal.legacy_session_file.exists()
+
+        logging.info("Deleted cards are removed from the session")
+        asked_card_ids = set(migrated.card_questions)
+        deleted_card = next(
+            card for card in cards if card.card_id not in asked_card_ids
+        )
+        self.manager.db.delete_card(deleted_card.card_id)
+        self.manager.save_test_sessions()
+        self.manager.session_registry.sessions.clear()
+        self.manager.load_test_session()
+        loaded = self.manager.test_session
+        assert loaded is not None
+        assert deleted_card.card_id not in loaded.test_cards
+        assert (
+            len(loaded.remaining_questions)
+            == len(migrated.remaining_questions) - deleted_card.get_num_test_questions()
+        )
+        assert loaded.current_question == migrated.current_question
+        assert loaded.check_result == migrated.check_result
+
+    def test_content_question_ids(self) -> None:
+        """Verifies question ids are derived from the card and question content."""
+        cards: list[gaku.card_types.TestCardTypes] = [
+            VOCAB_CARD,
+            KANJI_CARD,
+            RADICAL_CARD,
+            ONOMATOPOEIA_CARD,
+        ]
+        for card in cards:
+            questions = card.get_test_questions()
+            assert [question.model_dump() for question in questions] == [
+                question.model_dump() for question in card.get_test_questions()
+            ]
+            ids = [
+                id
+                for question in questions
+                for group in question.answers
+                for id in [question.question_id, group.group_id]
+                + [answer.answer_id for answer in group.answers]
+            ]
+            assert len(ids) == len(set(ids)), "ids are not unique"
+
+        logging.info("Changed content and other card change the ids")
+        question = VOCAB_CARD.get_meanings_test_question()
+        changed_card = VOCAB_CARD.model_copy(update={"writing": "changed writing"})
+        assert changed_card.get_meanings_test_question().question_id != (
+            question.question_id
+        )
+        other_card = VOCAB_CARD.model_copy(update={"card_id": "other"})
+        other_question = other_card.get_meanings_test_question()
+        assert other_question.question_id != question.question_id
+        assert (
+            other_question.answers[0].answers[0].answer_id
+            != question.answers[0].answers[0].answer_id
+        )
+
+    def test_question_cache(self) -> None:
+        """Verifies generated questions are reused until the card is changed."""
+        cards: list[gaku.card_types.TestCardTypes] = [
+            VOCAB_CARD,
+            KANJI_CARD,
+            RADICAL_CARD,
+            ONOMATOPOEIA_CARD,
+        ]
+        for card in cards:
+            questions = card.get_test_questions()
+            for question, cached_question in zip(questions, card.get_test_questions()):
+                assert cached_question is question
+
+        logging.info("Changed card gets new questions")
+        question = VOCAB_CARD.get_meanings_test_question()
+        changed_card = VOCAB_CARD.model_copy(update={"writing": "changed writing"})
+        changed_question = changed_card.get_meanings_test_question()
+        assert changed_question is not question
+        assert changed_question.question == "changed writing"
+
+        logging.info("Multi card reuses the child questions without changing them")
+        multi_card = gaku.card_types.MultiCard(
+            multicard_type=CardType.VOCABULARY,
+            card_ids=[VOCAB_CARD.card_id, changed_card.card_id],
+            cards=[VOCAB_CARD, changed_card],
+        )
+        multi_questions = multi_card.get_test_questions()
+        assert len(multi_questions) == 2
+        assert {group.header for group in multi_questions[0].answers} == {
+            VOCAB_CARD.writing,
+            "changed writing",
+        }
+        assert VOCAB_CARD.get_meanings_test_question() is question
+        assert question.answers[0].header != VOCAB_CARD.writing
+        assert multi_questions[0].question_id == (
+            multi_card.get_test_questions()[0].question_id
+        )
@@ -1,16 +1,66 @@
 """Verifies FSRS related functionality."""
 
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
+import json
 import logging
+import math
+import time
 
 import fsrs
+import numpy as np
+import pydantic
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
 import gaku
 import gaku.api_types
 import gaku.database
+import gaku.database.db_fsrs
+import gaku.fsrs_optimizer
+import gaku.fsrs_simulator
+import gaku.gaku_manager
+import gaku.load_balancer
 import gaku.card_types
+import gaku.test_session
+from gaku.database.db_schema import FSRSReviewLogTable
 
-from .utils import TestSetup
-from .test_data import VOCAB_CARD, KANJI_CARD
+from .utils import TestSetup, get_answer_for_question
+from .test_data import VOCAB_CARD, KANJI_CARD, RADICAL_CARD
+
+
+def replay_review_logs(
+    db: gaku.database.DbManager, card_ids: list[str], scheduler: fsrs.Scheduler
+) -> tuple[list[float], dict[str, fsrs.Card]]:
+    """Reviews the cards with fsrs scheduler as recorded in the review log.
+
+    Returns
+    -------
+    tuple[list[float], dict[str, fsrs.Card]]
+        Losses of the reviews on another day than the previous review
+        and the reviewed cards by card id.
+    """
+    losses = []
+    fsrs_cards = {}
+    for card_id in card_ids:
+        fsrs_card = fsrs.Card()
+        for review in db.get_review_logs(card_id=card_id):
+            if (
+                fsrs_card.last_review is not None
+                and (review.review_datetime - fsrs_card.last_review).days > 0
+            ):
+                retrievability = fsrs_card.get_retrievability(review.review_datetime)
+                losses.append(
+                    -math.log(
+                        retrievability if review.rating > 1 else 1 - retrievability
+                    )
+                )
+            fsrs_card, _ = scheduler.review_card(
+                fsrs_card,
+                fsrs.Rating(review.rating),
+                review_datetime=review.review_datetime,
+            )
+        fsrs_cards[card_id] = fsrs_card
+    return losses, fsrs_cards
 
 
 class TestFsrs(TestSetup):
@@ -43,3 +93,581 @@ class TestFsrs(TestSetup):
             due_cards = self.manager.db.get_fsrs_due_cards(filter=card_filter)
             assert len(due_cards) == 1
             assert due_cards[0].card_id == KANJI_CARD.card_id
+
+    def test_fsrs_data_for_multiple_cards(self) -> None:
+        """Verify FSRS data for multiple cards are returned in one call
+        and cards without FSRS data are left out.
+        """
+
+        logging.info("Creating cards and adding FSRS record for one of them")
+        self.manager.db.add_cards([VOCAB_CARD, KANJI_CARD])
+
+        vocab_fsrs = fsrs.Card()
+        self.manager.db.update_card_fsrs(VOCAB_CARD.card_id, vocab_fsrs)
+
+        fsrs_data = self.manager.db.get_fsrs_data_for_cards(
+            [VOCAB_CARD.card_id, KANJI_CARD.card_id]
+        )
+        assert list(fsrs_data.keys()) == [VOCAB_CARD.card_id]
+        assert fsrs_data[VOCAB_CARD.card_id].to_dict() == vocab_fsrs.to_dict()
+
+    def test_due_forecast(self) -> None:
+        """Verify the due forecast counts cards by day,
+        skips already due cards and respects the card filter.
+        """
+
+        self.manager.db.add_cards([VOCAB_CARD, KANJI_CARD, RADICAL_CARD])
+
+        vocab_fsrs = fsrs.Card()
+        vocab_fsrs.due = vocab_fsrs.due - timedelta(days=1)
+        kanji_fsrs = fsrs.Card()
+        kanji_fsrs.due = kanji_fsrs.due + timedelta(days=3)
+        radical_fsrs = fsrs.Card()
+        radical_fsrs.due = radical_fsrs.due + timedelta(days=3)
+
+        self.manager.db.update_card_fsrs(VOCAB_CARD.card_id, vocab_fsrs)
+        self.manager.db.update_card_fsrs(KANJI_CARD.card_id, kanji_fsrs)
+        self.manager.db.update_card_fsrs(RADICAL_CARD.card_id, radical_fsrs)
+
+        forecast = self.manager.get_num_upcoming_cards(num_days=30)
+        logging.info(f"Due forecast: {forecast}")
+        assert len(forecast) == 31
+        assert sum(forecast.values()) == 2
+        assert forecast[3] + forecast[4] == 2
+
+        weekly_forecast = self.manager.get_num_upcoming_cards(
+            num_days=365, bucket_days=7
+        )
+        assert len(weekly_forecast) == 53
+        assert sum(weekly_forecast.values()) == 2
+
+        kanji_filter = gaku.api_types.CardFilter(
+            card_types=[gaku.card_types.CardType.KANJI]
+        )
+        kanji_forecast = self.manager.get_num_upcoming_cards(
+            num_days=30, filter=kanji_filter
+        )
+        assert sum(kanji_forecast.values()) == 1
+
+        logging.info("Verifying cached forecast is invalidated by FSRS change")
+        assert len(self.manager.due_forecast_cache) == 3
+        self.manager.db.delete_card_fsrs(KANJI_CARD.card_id)
+        forecast = self.manager.get_num_upcoming_cards(num_days=30)
+        assert sum(forecast.values()) == 1
+        assert len(self.manager.due_forecast_cache) == 1
+
+        logging.info("Verifying number of cached forecasts is limited")
+        for num_days in range(1, gaku.gaku_manager.DUE_FORECAST_CACHE_SIZE + 2):
+            self.manager.get_num_upcoming_cards(num_days=num_days)
+        assert (
+            len(self.manager.due_forecast_cache)
+            == gaku.gaku_manager.DUE_FORECAST_CACHE_SIZE
+        )
+
+    def test_fsrs_state_stats(self) -> None:
+        """Verify FSRS state columns are kept in sync with FSRS data
+        and can be used for statistics.
+        """
+
+        source = gaku.card_types.CardSource(source_name="source")
+        self.manager.db.add_card_source(source)
+        self.manager.db.add_cards([VOCAB_CARD, KANJI_CARD])
+        self.manager.db.add_card_source_link(VOCAB_CARD.card_id, source.source_id)
+
+        scheduler = fsrs.Scheduler()
+        vocab_fsrs, _ = scheduler.review_card(fsrs.Card(), fsrs.Rating.Easy)
+        kanji_fsrs, _ = scheduler.review_card(fsrs.Card(), fsrs.Rating.Again)
+        self.manager.db.update_card_fsrs(VOCAB_CARD.card_id, vocab_fsrs)
+        self.manager.db.update_card_fsrs(KANJI_CARD.card_id, kanji_fsrs)
+
+        state_counts = self.manager.db.get_fsrs_state_counts()
+        logging.info(f"FSRS state counts: {state_counts}")
+        assert state_counts == {"Learning": 1, "Review": 1, "Relearning": 0}
+
+        kanji_filter = gaku.api_types.CardFilter(
+            card_types=[gaku.card_types.CardType.KANJI]
+        )
+        state_counts = self.manager.db.get_fsrs_state_counts(kanji_filter)
+        assert state_counts == {"Learning": 1, "Review": 0, "Relearning": 0}
+
+        stability = self.manager.db.get_fsrs_stability_by_source()
+        assert stability == {source.source_id: vocab_fsrs.stability}
+
+    def test_fsrs_review_log(self) -> None:
+        """Verify reviews are added to the review log together with
+        the FSRS update and can be queried by card and time.
+        """
+
+        self.manager.db.add_cards([VOCAB_CARD, KANJI_CARD])
+        scheduler = fsrs.Scheduler()
+
+        logging.info("Reviewing new vocab card as mistake and kanji card as correct")
+        vocab_data = gaku.test_session.CardTestData(
+            card_id=VOCAB_CARD.card_id,
+            fsrs_data=fsrs.Card(),
+            fsrs_stored=False,
+            question_test_data={},
+            num_mistakes=1,
+            review_duration=1500,
+        )
+        vocab_data.mark_entry(scheduler, self.manager.db)
+        kanji_data = gaku.test_session.CardTestData(
+            card_id=KANJI_CARD.card_id,
+            fsrs_data=fsrs.Card(),
+            question_test_data={},
+        )
+        kanji_data.mark_entry(scheduler, self.manager.db)
+
+        review_logs = self.manager.db.get_review_logs()
+        logging.info(f"Review logs: {review_logs}")
+        assert [review.card_id for review in review_logs] == [
+            VOCAB_CARD.card_id,
+            KANJI_CARD.card_id,
+        ]
+        assert review_logs[0].rating == fsrs.Rating.Again.value
+        assert review_logs[0].review_duration == 1500
+        # first review of a card has no prior state
+        assert review_logs[0].prior_state is None
+        assert review_logs[0].prior_step is None
+        assert review_logs[1].rating == fsrs.Rating.Good.value
+        assert review_logs[1].prior_state == fsrs.State.Learning.value
+        assert review_logs[1].prior_stability is None
+
+        vocab_logs = self.manager.db.get_review_logs(card_id=VOCAB_CARD.card_id)
+        assert len(vocab_logs) == 1
+        review_time = vocab_logs[0].review_datetime
+        assert self.manager.db.get_review_logs(end=review_time) == []
+        assert len(self.manager.db.get_review_logs(start=review_time)) == 2
+
+        logging.info("Verifying review log is removed with the card")
+        self.manager.db.delete_card(VOCAB_CARD.card_id)
+        review_logs = self.manager.db.get_review_logs()
+        assert [review.card_id for review in review_logs] == [KANJI_CARD.card_id]
+
+    def test_fsrs_review_after_mistake(self) -> None:
+        """Verify card answered wrong and then correctly is reviewed
+        as Again and then Good from the state after the first review.
+        """
+        self.manager.db.add_cards([RADICAL_CARD])
+        scheduler = fsrs.Scheduler(enable_fuzzing=False)
+        self.manager.fsrs_scheduler = scheduler
+        test = self.manager.start_test_session_new_cards(
+            gaku.api_types.StartTestRequest()
+        )
+
+        logging.info("Answering wrong and then correctly until completed")
+        next_card = test.get_test_question()
+        assert next_card.next_question is not None
+        answers = get_answer_for_question(next_card)
+        test.answer_question({answer_id: "wrong" for answer_id in answers})
+        while next_card.next_question is not None:
+            response = test.answer_and_get_next(get_answer_for_question(next_card))
+            assert response.check_result.all_correct
+            next_card = response.next_card
+
+        review_logs = self.manager.db.get_review_logs(card_id=RADICAL_CARD.card_id)
+        logging.info(f"Review logs: {review_logs}")
+        assert [review.rating for review in review_logs] == [
+            fsrs.Rating.Again.value,
+            fsrs.Rating.Good.value,
+        ]
+        assert review_logs[0].prior_state is None
+        again_fsrs, _ = scheduler.review_card(
+            fsrs.Card(),
+            fsrs.Rating.Again,
+            review_datetime=review_logs[0].review_datetime,
+        )
+        assert review_logs[1].prior_state == again_fsrs.state.value
+        assert review_logs[1].prior_step == again_fsrs.step
+        assert review_logs[1].prior_stability == pytest.approx(again_fsrs.stability)
+
+        good_fsrs, _ = scheduler.review_card(
+            again_fsrs,
+            fsrs.Rating.Good,
+            review_datetime=review_logs[1].review_datetime,
+        )
+        stored_fsrs = self.manager.db.get_fsrs_data_for_card(RADICAL_CARD.card_id)
+        assert stored_fsrs is not None
+        assert stored_fsrs.due == good_fsrs.due
+        assert stored_fsrs.stability == pytest.approx(good_fsrs.stability)
+        assert stored_fsrs.step == good_fsrs.step
+
+    def test_fsrs_optimization(self) -> None:
+        """Verify the vectorized FSRS model matches the fsrs scheduler
+        and the optimization runs in worker process.
+        """
+
+        cards: list[gaku.card_types.TestCardTypes] = [
+            VOCAB_CARD,
+            KANJI_CARD,
+            RADICAL_CARD,
+        ]
+        self.manager.db.add_cards(cards)
+
+        logging.info("Simulating review history")
+        scheduler = fsrs.Scheduler(enable_fuzzing=False)
+        review_time = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for card_idx, card in enumerate(cards):
+            fsrs_card = fsrs.Card()
+            for review_idx in range(20):
+                rating = fsrs.Rating((card_idx + review_idx) % 4 + 1)
+                fsrs_card, review_log = scheduler.review_card(
+                    fsrs_card, rating, review_datetime=review_time
+                )
+                self.manager.db.update_card_fsrs(
+                    card.card_id,
+                    fsrs_card,
+                    gaku.database.db_fsrs.get_review_log_entry(
+                        card.card_id, review_log
+                    ),
+                )
+                review_time = fsrs_card.due + timedelta(hours=review_idx)
+
+        logging.info("Computing the loss by reviewing cards with fsrs scheduler")
+        expected_losses, _ = replay_review_logs(
+            self.manager.db, [card.card_id for card in cards], scheduler
+        )
+        expected_loss = sum(expected_losses) / len(expected_losses)
+
+        history = gaku.fsrs_optimizer.ReviewHistory.from_database(self.manager.db)
+        assert history.num_loss_reviews == len(expected_losses)
+        loss = history.compute_loss(np.array(scheduler.parameters))
+        assert loss[0] == pytest.approx(expected_loss)
+
+        logging.info("Running the optimization in worker process")
+        self.manager.start_fsrs_optimization()
+        for _ in range(600):
+            status = self.manager.get_fsrs_optimization_status()
+            if not status.running:
+                break
+            time.sleep(0.1)
+        logging.info(f"Optimization status: {status}")
+        assert not status.running
+        assert status.error is None
+        assert status.num_reviews == len(expected_losses)
+        # there are not enough reviews for optimization, default parameters are kept
+        assert status.parameters == list(fsrs.fsrs.DEFAULT_PARAMETERS)
+        assert self.manager.fsrs_scheduler_file.exists()
+        assert self.manager.fsrs_scheduler.parameters == tuple(status.parameters)
+
+    def test_fsrs_optimization_from_test_sessions(self) -> None:
+        """Verify the review log written by test sessions continues each review
+        from the previous one and the loss matches the fsrs scheduler.
+        """
+        cards: list[gaku.card_types.TestCardTypes] = [
+            VOCAB_CARD,
+            KANJI_CARD,
+            RADICAL_CARD,
+        ]
+        self.manager.db.add_cards(cards)
+        card_ids = [card.card_id for card in cards]
+        scheduler = fsrs.Scheduler(enable_fuzzing=False)
+        self.manager.fsrs_scheduler = scheduler
+
+        num_answers = 0
+        for day in range(4):
+            logging.info(f"Answering all cards on day {day}")
+            test = self.manager.start_test_session(
+                gaku.api_types.StartTestRequest(
+                    num_cards=0, generate_extra_questions=False
+                )
+            )
+            next_card = test.get_test_question()
+            while next_card.next_question is not None:
+                answers = get_answer_for_question(next_card)
+                num_answers += 1
+                if num_answers % 3 == 0:
+                    test.answer_question({answer_id: "" for answer_id in answers})
+                response = test.answer_and_get_next(answers)
+                next_card = response.next_card
+
+            logging.info("Moving the reviews one day to the past")
+            with Session(self.manager.db.engine) as session:
+                for review in session.scalars(select(FSRSReviewLogTable)):
+                    review.review_datetime -= timedelta(days=1)
+                    if review.prior_last_review is not None:
+                        review.prior_last_review -= timedelta(days=1)
+                session.commit()
+            stored_cards = self.manager.db.get_fsrs_data_for_cards(card_ids)
+            for card_id, fsrs_card in stored_cards.items():
+                fsrs_card.due -= timedelta(days=1)
+                if fsrs_card.last_review is not None:
+                    fsrs_card.last_review -= timedelta(days=1)
+                self.manager.db.update_card_fsrs(card_id, fsrs_card)
+
+        ratings = [
+            review.rating
+            for card_id in card_ids
+            for review in self.manager.db.get_review_logs(card_id=card_id)
+        ]
+        logging.info(f"Review ratings: {ratings}")
+        assert fsrs.Rating.Again.value in ratings
+        assert fsrs.Rating.Good.value in ratings
+
+        logging.info("Verifying stored cards match reviewing the log again")
+        expected_losses, replayed_cards = replay_review_logs(
+            self.manager.db, card_ids, scheduler
+        )
+        stored_cards = self.manager.db.get_fsrs_data_for_cards(card_ids)
+        for card_id in card_ids:
+            replayed_card = replayed_cards[card_id]
+            assert stored_cards[card_id].state == replayed_card.state
+            assert stored_cards[card_id].step == replayed_card.step
+            assert stored_cards[card_id].stability == pytest.approx(
+                replayed_card.stability
+            )
+            assert stored_cards[card_id].difficulty == pytest.approx(
+                replayed_card.difficulty
+            )
+
+        history = gaku.fsrs_optimizer.ReviewHistory.from_database(self.manager.db)
+        assert history.num_cards == len(cards)
+        assert history.num_loss_reviews == len(expected_losses) > 0
+        loss = history.compute_loss(np.array(scheduler.parameters))
+        assert loss[0] == pytest.approx(sum(expected_losses) / len(expected_losses))
+
+    def test_start_weakest(self) -> None:
+        """Verify the weakest cards session picks cards
+        with the lowest retrievability matching the filter.
+        """
+
+        self.manager.db.add_cards([VOCAB_CARD, KANJI_CARD, RADICAL_CARD])
+
+        logging.info("Adding cards reviewed at different times")
+        now = datetime.now(timezone.utc)
+        scheduler = fsrs.Scheduler()
+        for card, days_ago in [(VOCAB_CARD, 30), (KANJI_CARD, 10), (RADICAL_CARD, 20)]:
+            fsrs_card, _ = scheduler.review_card(
+                fsrs.Card(),
+                fsrs.Rating.Good,
+                review_datetime=now - timedelta(days=days_ago),
+            )
+            self.manager.db.update_card_fsrs(card.card_id, fsrs_card)
+
+        weakest = self.manager.retrievability_engine.get_weakest_cards(num_cards=2)
+        assert weakest == [VOCAB_CARD.card_id, RADICAL_CARD.card_id]
+        retrievability = self.manager.retrievability_engine.get_retrievability(now)
+        vocab_idx = self.manager.retrievability_engine.card_index[VOCAB_CARD.card_id]
+        vocab_fsrs = self.manager.db.get_fsrs_data_for_card(VOCAB_CARD.card_id)
+        assert vocab_fsrs is not None
+        assert retrievability[vocab_idx] == pytest.approx(
+            vocab_fsrs.get_retrievability(now)
+        )
+
+        logging.info("Starting weakest cards session with filter")
+        test_setup = gaku.api_types.StartTestRequest(
+            card_types=[
+                gaku.card_types.CardType.KANJI,
+                gaku.card_types.CardType.RADICAL,
+            ],
+            num_cards=1,
+            generate_extra_questions=False,
+        )
+        test = self.manager.start_test_session_weakest(test_setup)
+        assert list(test.test_cards.keys()) == [RADICAL_CARD.card_id]
+
+    def test_workload_simulation(self) -> None:
+        """Verify the workload simulation schedules cards like the fsrs scheduler."""
+
+        self.manager.db.add_cards([VOCAB_CARD, KANJI_CARD])
+        vocab_fsrs = fsrs.Card()
+        vocab_fsrs.due = vocab_fsrs.due - timedelta(days=1)
+        self.manager.db.update_card_fsrs(VOCAB_CARD.card_id, vocab_fsrs)
+        scheduler = fsrs.Scheduler(enable_fuzzing=False)
+        kanji_fsrs, _ = scheduler.review_card(fsrs.Card(), fsrs.Rating.Easy)
+        self.manager.db.update_card_fsrs(KANJI_CARD.card_id, kanji_fsrs)
+
+        workload = self.manager.simulate_workload(new_cards_per_day=0, num_days=30)
+        assert len(workload) == 30
+        # the vocab card without review has no memory state, it is skipped
+        kanji_due_day = (
+            kanji_fsrs.due.astimezone().date() - datetime.now().date()
+        ).days
+        assert workload[kanji_due_day].num_due == 1
+        assert sum(day.num_due for day in workload[:kanji_due_day]) == 0
+
+        logging.info("Verifying new cards are scheduled as with fsrs scheduler")
+        new_fsrs = fsrs.Card()
+        review_time = datetime.now(timezone.utc)
+        for _ in scheduler.learning_steps:
+            new_fsrs, _ = scheduler.review_card(
+                new_fsrs, fsrs.Rating.Good, review_datetime=review_time
+            )
+        new_interval = (new_fsrs.due - review_time).days
+
+        workload = gaku.fsrs_simulator.simulate_workload(
+            scheduler=scheduler,
+            stability=np.empty(0),
+            difficulty=np.empty(0),
+            due_days=np.empty(0),
+            last_review_days=np.empty(0),
+            new_cards_per_day=10,
+            num_days=new_interval + 1,
+            review_seconds=6,
+        )
+        assert workload[0].num_new == 10
+        assert workload[0].num_reviews == 10 * len(scheduler.learning_steps)
+        assert workload[0].review_minutes == workload[0].num_reviews / 10
+        assert workload[new_interval - 1].num_due == 0
+        assert workload[new_interval].num_due == 10
+
+        logging.info("Verifying the simulation request is limited to a year")
+        with pytest.raises(pydantic.ValidationError):
+            gaku.api_types.WorkloadSimulationRequest(num_days=3650)
+        with pytest.raises(pydantic.ValidationError):
+            gaku.api_types.WorkloadSimulationRequest(new_cards_per_day=10000)
+
+    def test_reschedule(self) -> None:
+        """Verify rescheduling with another scheduler updates the due dates
+        only when not a dry run and can be resumed.
+        """
+
+        self.manager.db.add_cards([VOCAB_CARD, KANJI_CARD, RADICAL_CARD])
+        scheduler = fsrs.Scheduler()
+
+        logging.info("Adding vocab card with review log and kanji card without it")
+        review_time = datetime.now(timezone.utc) - timedelta(days=5)
+        vocab_fsrs = fsrs.Card()
+        for _ in range(3):
+            prior_fsrs = vocab_fsrs
+            vocab_fsrs, review_log = scheduler.review_card(
+                vocab_fsrs, fsrs.Rating.Good, review_datetime=review_time
+            )
+            self.manager.db.update_card_fsrs(
+                VOCAB_CARD.card_id,
+                vocab_fsrs,
+                gaku.database.db_fsrs.get_review_log_entry(
+                    VOCAB_CARD.card_id,
+                    review_log,
+                    prior_fsrs if prior_fsrs.last_review is not None else None,
+                ),
+            )
+            review_time += timedelta(minutes=10)
+        kanji_fsrs, _ = scheduler.review_card(fsrs.Card(), fsrs.Rating.Easy)
+        self.manager.db.update_card_fsrs(KANJI_CARD.card_id, kanji_fsrs)
+        # card in learning keeps its schedule
+        radical_fsrs, _ = scheduler.review_card(fsrs.Card(), fsrs.Rating.Good)
+        self.manager.db.update_card_fsrs(RADICAL_CARD.card_id, radical_fsrs)
+
+        self.manager.fsrs_scheduler = fsrs.Scheduler(desired_retention=0.95)
+        report = self.manager.reschedule_fsrs(dry_run=True)
+        logging.info(f"Dry run report: {report}")
+        assert report.num_cards == 3
+        assert report.num_changed == 2
+        assert report.num_replayed == 1
+        assert sum(report.due_before.values()) == 3
+        assert report.due_before != report.due_after
+        stored_fsrs = self.manager.db.get_fsrs_data_for_cards(
+            [VOCAB_CARD.card_id, KANJI_CARD.card_id]
+        )
+        assert stored_fsrs[VOCAB_CARD.card_id].due == vocab_fsrs.due
+        assert stored_fsrs[KANJI_CARD.card_id].due == kanji_fsrs.due
+
+        logging.info("Resuming rescheduling after the first card")
+        first_card_id = min(
+            VOCAB_CARD.card_id, KANJI_CARD.card_id, RADICAL_CARD.card_id
+        )
+        with self.manager.fsrs_reschedule_file.open("w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "last_card_id": first_card_id,
+                    "scheduler": self.manager.fsrs_scheduler.to_dict(),
+                },
+                f,
+            )
+        report = self.manager.reschedule_fsrs(dry_run=False)
+        logging.info(f"Resumed report: {report}")
+        assert report.resumed
+        assert report.num_cards == 2
+        assert not self.manager.fsrs_reschedule_file.exists()
+
+        report = self.manager.reschedule_fsrs(dry_run=False, resume=False)
+        assert report.num_cards == 3
+        stored_fsrs = self.manager.db.get_fsrs_data_for_cards(
+            [VOCAB_CARD.card_id, KANJI_CARD.card_id, RADICAL_CARD.card_id]
+        )
+        assert stored_fsrs[VOCAB_CARD.card_id].due < vocab_fsrs.due
+        assert stored_fsrs[KANJI_CARD.card_id].due < kanji_fsrs.due
+        assert stored_fsrs[RADICAL_CARD.card_id].due == radical_fsrs.due
+
+        logging.info(
+            "Verifying rescheduling again with the same scheduler changes nothing"
+        )
+        report = self.manager.reschedule_fsrs(dry_run=True)
+        assert report.num_changed == 0
+
+    def test_due_load_balancing(self) -> None:
+        """Verify cards reviewed together are spread to different days
+        within the fuzz range and the loads follow the database.
+        """
+
+        cards: list[gaku.card_types.TestCardTypes] = [
+            VOCAB_CARD,
+            KANJI_CARD,
+            RADICAL_CARD,
+        ]
+        self.manager.db.add_cards(cards)
+        balancer = self.manager.due_load_balancer
+        scheduler = fsrs.Scheduler()
+        review_time = datetime.now(timezone.utc)
+
+        unfuzzed_fsrs, _ = balancer.review_card(
+            fsrs.Scheduler(enable_fuzzing=False),
+            fsrs.Card(),
+            fsrs.Rating.Easy,
+            review_datetime=review_time,
+        )
+        interval_days = (unfuzzed_fsrs.due - review_time).days
+        min_interval, max_interval = gaku.load_balancer.get_fuzz_range(
+            interval_days, scheduler.maximum_interval
+        )
+        logging.info(f"Interval {interval_days}, range {min_interval}-{max_interval}")
+        assert max_interval - min_interval + 1 >= len(cards)
+
+        logging.info("Reviewing all cards at the same time")
+        intervals = []
+        for card in cards:
+            fsrs_card, _ = balancer.review_card(
+                scheduler, fsrs.Card(), fsrs.Rating.Easy, review_datetime=review_time
+            )
+            self.manager.db.update_card_fsrs(card.card_id, fsrs_card)
+            balancer.card_updated(None, fsrs_card.due)
+            intervals.append((fsrs_card.due - review_time).days)
+        logging.info(f"Balanced intervals: {intervals}")
+        assert intervals[0] == interval_days
+        assert len(set(intervals)) == len(cards)
+        assert all(min_interval <= interval <= max_interval for interval in intervals)
+
+        logging.info("Verifying loads were updated without reloading")
+        data_version = balancer.data_version
+        assert data_version == self.manager.db.fsrs_data_version
+        assert balancer.start is not None
+        expected_load = self.manager.db.get_num_due_by_day(balancer.start)
+        assert dict(+balancer.day_load) == expected_load
+
+    def test_due_load_after_mistake(self) -> None:
+        """Verify the loads follow the database when a card is reviewed
+        again after a mistake in the same session.
+        """
+        self.manager.db.add_cards([RADICAL_CARD])
+        balancer = self.manager.due_load_balancer
+        balancer.refresh()
+        test = self.manager.start_test_session_new_cards(
+            gaku.api_types.StartTestRequest()
+        )
+
+        logging.info("Answering wrong and then correctly until completed")
+        next_card = test.get_test_question()
+        assert next_card.next_question is not None
+        answers = get_answer_for_question(next_card)
+        test.answer_question({answer_id: "wrong" for answer_id in answers})
+        while next_card.next_question is not None:
+            response = test.answer_and_get_next(get_answer_for_question(next_card))
+            next_card = response.next_card
+        assert len(self.manager.db.get_review_logs(card_id=RADICAL_CARD.card_id)) == 2
+
+        logging.info("Verifying loads were updated without reloading")
+        assert balancer.data_version == self.manager.db.fsrs_data_version
+        assert balancer.start is not None
+        expected_load = self.manager.db.get_num_due_by_day(balancer.start)
+        assert dict(+balancer.day_load) == expected_load
@@ -1,6 +1,7 @@
 """Gaku tests focusing on generating imports and importing cards."""
 
 import logging
+from typing import Optional
 
 import gaku
 import gaku.api_types
@@ -155,3 +156,57 @@ class TestImport(TestSetup):
             "to be able to ..., can ...",
         ]
         assert set(meanings) == set(expected_meanings)
+
+    def test_vocab_list_import_matches_single_words(self) -> None:
+        """Verifies importing a list finds the same cards as importing the words
+        one by one, also for words already in the database.
+        """
+        test_vocab = ["日本", "日本人", "一日", "隙あり", "日本"]
+        manager = self.manager
+        manager.import_cards(manager.generate_vocab_import(["日本"]), sources=[])
+
+        def get_card_keys(
+            generated_import: gaku.api_types.GeneratedImports,
+        ) -> list[tuple[str, str, Optional[int], bool]]:
+            return sorted(
+                (
+                    card.card_type.value,
+                    card.writing,
+                    card.dictionary_id,
+                    card.card_id in generated_import.new_card_ids,
+                )
+                for card in generated_import.generated_cards.values()
+            )
+
+        list_import = manager.generate_vocab_import(test_vocab)
+        list_card_keys = get_card_keys(list_import)
+        logging.info(f"Cards generated for vocab list: {list_card_keys}")
+
+        single_card_keys: set[tuple[str, str, Optional[int], bool]] = set()
+        for vocab in test_vocab:
+            single_card_keys.update(
+                get_card_keys(manager.generate_vocab_import([vocab]))
+            )
+        assert set(list_card_keys) == single_card_keys
+        assert len(list_card_keys) == len(set(list_card_keys))
+
+    def test_vocab_list_import_shares_cards(self) -> None:
+        """Verifies kanji and radicals shared by words of the list
+        are generated only once and all new cards are part of the import.
+        """
+        test_vocab = ["日本", "日本人", "本日", "日本"]
+        manager = self.manager
+
+        generated_import = manager.generate_vocab_import(test_vocab)
+        cards = list(generated_import.generated_cards.values())
+        card_keys = [(card.card_type, card.writing) for card in cards]
+        logging.info(f"Cards generated for vocab list: {card_keys}")
+        assert len(card_keys) == len(set(card_keys))
+        assert (gaku.card_types.CardType.KANJI, "日") in card_keys
+
+        new_card_ids = generated_import.new_card_ids
+        assert len(new_card_ids) == len(set(new_card_ids))
+        assert set(new_card_ids) == set(generated_import.generated_cards)
+
+        manager.import_cards(generated_import, sources=[])
+        assert len(manager.db.get_cards_any_state()) == len(cards)
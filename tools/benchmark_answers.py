@@ -0,0 +1,68 @@
+"""Microbenchmark of checking answers of test questions."""
+
+import argparse
+import timeit
+
+from gaku.question import Answer, AnswerText, AnswerType, get_answer_matcher
+
+parser = argparse.ArgumentParser(description="Benchmark of answer checking")
+parser.add_argument(
+    "--num-checks",
+    type=int,
+    default=100000,
+    help="Number of checked answers",
+)
+
+
+def create_answers() -> list[Answer]:
+    """Creates answers similar to the answers of vocabulary and kanji cards."""
+    meanings = Answer(
+        answer_type=AnswerType.ROMAJI,
+        answers=[
+            AnswerText(answer_text="(to) eat", required=True),
+            AnswerText(answer_text="(to) consume"),
+            AnswerText(answer_text="(to) have a meal"),
+            AnswerText(answer_text="to devour ..."),
+        ],
+        header="Meanings",
+    )
+    readings = Answer(
+        answer_type=AnswerType.HIRAGANA,
+        answers=[
+            AnswerText(answer_text="たべる", required=True),
+            AnswerText(answer_text="くう"),
+        ],
+        header="Readings",
+    )
+    return [meanings, readings]
+
+
+def run_benchmark(num_checks: int) -> None:
+    """Measures the time of answer checks with and without cached matchers."""
+    answers = create_answers()
+    user_answers = {
+        answers[0].answer_id: "Eat, have a meal",
+        answers[1].answer_id: "たべる、くう",
+    }
+
+    def check_answers() -> None:
+        for answer in answers:
+            answer.check_answer(user_answers)
+
+    def check_answers_uncached() -> None:
+        # compiles the matchers for each check, as it was done before caching
+        get_answer_matcher.cache_clear()
+        check_answers()
+
+    num_runs = num_checks // len(answers)
+    for name, function in [
+        ("uncached", check_answers_uncached),
+        ("cached", check_answers),
+    ]:
+        seconds = min(timeit.repeat(function, number=num_runs, repeat=5))
+        print(f"{name}: {seconds / (num_runs * len(answers)) * 1e6:.2f} us per check")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    run_benchmark(args.num_checks)
@@ -0,0 +1,96 @@
+"""Benchmark of storing and loading test session snapshots."""
+
+import argparse
+import json
+import tempfile
+import timeit
+from pathlib import Path
+
+from gaku.card_types import AnswerText, VocabCard, VocabularyMeaningEntry
+from gaku.database import DbManager
+from gaku.session_journal import decode_snapshot, encode_snapshot
+from gaku.test_session import TestSession
+
+parser = argparse.ArgumentParser(description="Benchmark of test session snapshots")
+parser.add_argument(
+    "--num-cards",
+    type=int,
+    default=500,
+    help="Number of cards in the test session",
+)
+parser.add_argument(
+    "--num-answers",
+    type=int,
+    default=100,
+    help="Number of answered questions before the snapshot",
+)
+
+
+def create_cards(num_cards: int) -> list[VocabCard]:
+    """Creates vocabulary cards similar to the imported cards."""
+    return [
+        VocabCard(
+            writing=f"単語{index}",
+            readings=[AnswerText(answer_text=f"たんご{index}")],
+            meanings=[
+                VocabularyMeaningEntry(
+                    part_of_speech="noun (common) (futsuumeishi)",
+                    meanings=[
+                        AnswerText(answer_text=f"word {index}", required=True),
+                        AnswerText(answer_text="vocabulary"),
+                    ],
+                )
+            ],
+            note="note of the card",
+        )
+        for index in range(num_cards)
+    ]
+
+
+def run_benchmark(num_cards: int, num_answers: int) -> None:
+    """Compares size and load time of JSON and compact snapshots."""
+    db_dir = Path(tempfile.mkdtemp())
+    db = DbManager(f"sqlite:///{db_dir / 'cards.db'}")
+    db.create_database()
+    cards = create_cards(num_cards)
+    db.add_cards(cards)
+
+    test_session = TestSession(db=db, mark_answers=False)
+    test_session.load(db.get_cards_any_state())
+    for _ in range(num_answers):
+        next_question = test_session.get_test_question().next_question
+        if next_question is None:
+            break
+        test_session.mark_answer_correct(next_question.question_id)
+    test_session.get_test_question()
+
+    def dump_json() -> str:
+        return json.dumps(test_session.model_dump(mode="json"))
+
+    def dump_compact() -> bytes:
+        return encode_snapshot(test_session.dump_snapshot())
+
+    json_snapshot = dump_json()
+    compact_snapshot = dump_compact()
+
+    def load_json() -> TestSession:
+        return TestSession(db=db, **json.loads(json_snapshot))
+
+    def load_compact() -> TestSession:
+        return TestSession.load_snapshot(decode_snapshot(compact_snapshot), db=db)
+
+    print(f"json: {len(json_snapshot.encode('utf-8')) / 1024:.1f} kB")
+    print(f"compact: {len(compact_snapshot) / 1024:.1f} kB")
+    for name, function in [
+        ("json dump", dump_json),
+        ("compact dump", dump_compact),
+        ("json load", load_json),
+        ("compact load", load_compact),
+    ]:
+        seconds = min(timeit.repeat(function, number=1, repeat=5))
+        print(f"{name}: {seconds * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    run_benchmark(args.num_cards, args.num_answers)
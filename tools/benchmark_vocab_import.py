@@ -0,0 +1,121 @@
+"""Benchmark of generating and importing cards for vocabulary lists."""
+
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from gaku import GakuManager
+from gaku.db_dictionary import DictionaryManager
+from gaku.dictionary import DictionaryEntry, Kanji, Radical, VocabularyMeaning
+
+REPO_ROOT = Path(__file__).parent.parent
+# number of kanji and radicals in the generated dictionary
+NUM_KANJI = 2000
+NUM_RADICALS = 214
+
+parser = argparse.ArgumentParser(description="Benchmark of vocabulary list import")
+parser.add_argument(
+    "--num-lines",
+    type=int,
+    default=10000,
+    help="Number of lines of the largest imported list",
+)
+
+
+def get_word(index: int) -> str:
+    """Creates unique two kanji word for the index."""
+    return chr(0x4E00 + index % NUM_KANJI) + chr(0x4E00 + index // NUM_KANJI)
+
+
+def create_dictionary(resource_dir: Path, num_words: int) -> None:
+    """Creates dictionary with generated radicals, kanji and words."""
+    dictionary = DictionaryManager(f"sqlite:///{resource_dir / 'dictionary.db'}")
+    dictionary.create_database()
+    dictionary.add_radicals(
+        [
+            Radical(
+                id=index + 1,
+                stroke=1,
+                radical=chr(0x2F00 + index),
+                meaning=f"radical {index}, part",
+                reading_j="ぶしゅ",
+                reading_r=None,
+                position_j=None,
+                position_r=None,
+            )
+            for index in range(NUM_RADICALS)
+        ]
+    )
+    dictionary.add_kanji(
+        [
+            Kanji(
+                literal=chr(0x4E00 + index),
+                codepoints={},
+                ucs_codepoint=0x4E00 + index,
+                radicals={"classical": index % NUM_RADICALS + 1},
+                grade=None,
+                stroke_count=[1],
+                variants={},
+                frequency=None,
+                radical_names=[],
+                jlpt=None,
+                meanings=[f"kanji {index}, character"],
+                readings={"ja_on": ["カン"], "ja_kun": ["かん"]},
+                nanori=[],
+            )
+            for index in range(NUM_KANJI)
+        ]
+    )
+    dictionary.add_vocabulary(
+        [
+            DictionaryEntry(
+                ent_seq=index + 1,
+                kanji_elements=[get_word(index)],
+                reading_elements=["たんご"],
+                meanings=[
+                    VocabularyMeaning(
+                        part_of_speech="noun (common) (futsuumeishi)",
+                        meanings=[f"word {index}", "vocabulary"],
+                    )
+                ],
+            )
+            for index in range(num_words)
+        ]
+    )
+
+
+def run_benchmark(num_lines: int) -> None:
+    """Measures generating and importing of lists of increasing length."""
+    resource_dir = Path(tempfile.mkdtemp())
+    create_dictionary(resource_dir, num_lines)
+
+    for list_length in [num_lines // 100, num_lines // 10, num_lines]:
+        manager = GakuManager(
+            resource_dir=resource_dir,
+            userdata_dir=Path(tempfile.mkdtemp()),
+            gaku_root_dir=REPO_ROOT,
+        )
+        vocab_list = [f"{get_word(index)} - note" for index in range(list_length)]
+
+        start = time.perf_counter()
+        generated_import = manager.generate_vocab_import(vocab_list)
+        generate_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        manager.import_cards(generated_import, sources=[])
+        import_seconds = time.perf_counter() - start
+
+        print(
+            f"{list_length} lines, {len(generated_import.generated_cards)} cards: "
+            f"generate {generate_seconds:.2f} s "
+            f"({generate_seconds / list_length * 1000:.2f} ms per line), "
+            f"import {import_seconds:.2f} s "
+            f"({import_seconds / list_length * 1000:.2f} ms per line)"
+        )
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    run_benchmark(args.num_lines)